@@ -1,4 +1,7 @@
 # Vercel Configuration for 3D Asset Manager
+import time
+_import_started = time.perf_counter()
+
 import sys
 import os
 
@@ -7,9 +10,15 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 try:
     from app import create_app
+    from app.startup import StartupReport
+    
+    # Cold-start breakdown: package import time alongside create_app() phases,
+    # recorded before create_app() logs the report
+    report = StartupReport()
+    report.record('import', time.perf_counter() - _import_started)
     
     # Create the Flask app instance
-    app = create_app()
+    app = create_app(report)
     
 except Exception as e:
     print(f"Error creating Flask app: {e}")
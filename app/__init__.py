@@ -1,24 +1,144 @@
 from flask import Flask
 from flask_login import LoginManager
-from pymongo import MongoClient
-import gridfs
 import os
+import time
 from datetime import datetime
+from app import log
+from app.db import MongoConnection, LazyHandle, ensure_indexes, indexes_current
+from app.startup import StartupReport
 
-# Global variables for MongoDB
+logger = log.logger
+
+# Global variables for MongoDB (lazy handles, resolved on first use)
+mongo_connection = None
 mongo_client = None
 db = None
 fs = None
 login_manager = LoginManager()
 
-def create_app():
+def _env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _ensure_indexes_on_connect(connection):
+    """Build missing indexes on the first use of a lazily initialized connection"""
+    try:
+        if not indexes_current(connection.db):
+            ensure_indexes(connection.db)
+            logger.info("Database indexes created")
+    except Exception as e:
+        logger.warning("Index creation warning: %s", e)
+
+def create_app(report=None):
+    """Build the app; ``report`` lets an entry point add phases timed before this call"""
+    report = report or StartupReport()
+    phase_started = time.perf_counter()
     app = Flask(__name__)
+    from app.ingest import UploadRequest
+    app.request_class = UploadRequest
     
     # Configuration
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     app.config['MAX_CONTENT_LENGTH'] = 4 * 1024 * 1024  # 4MB (Vercel limit)
+    # Bodies of /api/upload/bulk only; Vercel caps every request body at 4.5 MB regardless
+    app.config['BULK_MAX_REQUEST_SIZE'] = int(os.environ.get(
+        'BULK_MAX_REQUEST_SIZE',
+        app.config['MAX_CONTENT_LENGTH'] if os.environ.get('VERCEL') else 256 * 1024 * 1024
+    ))
     app.config['ALLOWED_EXTENSIONS'] = {'obj', 'fbx', 'gltf', 'glb', 'dae', '3ds', 'ply', 'stl'}
     
+    # Platform stats: in-process cache TTL and reconciliation interval (seconds)
+    app.config['STATS_CACHE_TTL'] = int(os.environ.get('STATS_CACHE_TTL', 30))
+    app.config['STATS_RECONCILE_INTERVAL'] = int(os.environ.get('STATS_RECONCILE_INTERVAL', 3600))
+    
+    # Download counters are buffered and flushed in the background
+    app.config['DOWNLOAD_FLUSH_INTERVAL'] = float(os.environ.get('DOWNLOAD_FLUSH_INTERVAL', 5))
+    app.config['DOWNLOAD_FLUSH_THRESHOLD'] = int(os.environ.get('DOWNLOAD_FLUSH_THRESHOLD', 100))
+    # Serverless functions may be frozen before the background flush runs
+    app.config['DOWNLOAD_FLUSH_PER_REQUEST'] = _env_flag(
+        'DOWNLOAD_FLUSH_PER_REQUEST', default=bool(os.environ.get('VERCEL'))
+    )
+    
+    # In-memory search index is rebuilt once older than this (seconds)
+    app.config['SEARCH_INDEX_MAX_AGE'] = int(os.environ.get('SEARCH_INDEX_MAX_AGE', 300))
+    
+    # Facet counts for the unfiltered browse page are cached (seconds)
+    app.config['FACET_CACHE_TTL'] = int(os.environ.get('FACET_CACHE_TTL', 60))
+    
+    # Lazy init (default on Vercel): no ping and no index builds at startup
+    app.config['LAZY_INIT'] = _env_flag('LAZY_INIT', default=bool(os.environ.get('VERCEL')))
+    
+    # Maximum ids accepted by POST /api/models/batch
+    app.config['BATCH_MAX_IDS'] = int(os.environ.get('BATCH_MAX_IDS', 100))
+    
+    # Cursor batch size for the NDJSON catalog export
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+    
+    # Change feed entries younger than this are held back until concurrent writes settle
+    app.config['CHANGES_SETTLE_SECONDS'] = float(os.environ.get('CHANGES_SETTLE_SECONDS', 2))
+    
+    # Response cache for public listings/stats: memory (per process), mongo (shared) or none
+    app.config['RESPONSE_CACHE_BACKEND'] = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory').lower()
+    app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get('RESPONSE_CACHE_TTL', 30))
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 512))
+    
+    # Rendered model cards kept per process, keyed by model version
+    app.config['FRAGMENT_CACHE_MAX_ENTRIES'] = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 1024))
+    app.config['FRAGMENT_CACHE_TTL'] = int(os.environ.get('FRAGMENT_CACHE_TTL', 3600))
+    
+    # Invalidation bus source: auto, change_stream, capped or off (default off when lazy)
+    app.config['INVALIDATION_SOURCE'] = os.environ.get(
+        'INVALIDATION_SOURCE', 'off' if app.config['LAZY_INIT'] else 'auto'
+    ).lower()
+    app.config['INVALIDATION_LOG_SIZE'] = int(os.environ.get('INVALIDATION_LOG_SIZE', 1024 * 1024))
+    
+    # API JSON encoder: 'auto' uses orjson when installed, 'json' forces the stdlib
+    app.config['JSON_BACKEND'] = os.environ.get('JSON_BACKEND', 'auto').lower()
+    
+    # Bulk uploads: files per request, per-file size (archive members) and GridFS writer threads
+    app.config['BULK_UPLOAD_MAX_FILES'] = int(os.environ.get('BULK_UPLOAD_MAX_FILES', 500))
+    app.config['BULK_MAX_FILE_SIZE'] = int(os.environ.get('BULK_MAX_FILE_SIZE', 32 * 1024 * 1024))
+    app.config['BULK_UPLOAD_WORKERS'] = int(os.environ.get('BULK_UPLOAD_WORKERS', 4))
+    
+    # MongoDB connection pool per process
+    app.config['MONGO_MAX_POOL_SIZE'] = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+    app.config['MONGO_MIN_POOL_SIZE'] = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+    
+    # Logging: leveled and queued; JSON lines unless running in debug mode
+    app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'DEBUG' if app.debug else 'INFO').upper()
+    app.config['LOG_FORMAT'] = os.environ.get('LOG_FORMAT', 'text' if app.debug else 'json').lower()
+    log.configure(app)
+    
+    # Prometheus metrics at /api/metrics (per process)
+    app.config['METRICS_ENABLED'] = _env_flag('METRICS_ENABLED', default=True)
+    # Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; admins can also read them
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN') or None
+    from app import metrics
+    metrics.init_app(app)
+    
+    # Admin accounts (comma-separated usernames) and opt-in request profiling
+    app.config['ADMIN_USERNAMES'] = frozenset(
+        name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()
+    )
+    app.config['PROFILING_ENABLED'] = _env_flag('PROFILING_ENABLED', default=True)
+    app.config['PROFILE_TOP_N'] = int(os.environ.get('PROFILE_TOP_N', 30))
+    app.config['PROFILE_STORE_SIZE'] = int(os.environ.get('PROFILE_STORE_SIZE', 8 * 1024 * 1024))
+    from app import profiling
+    profiling.init_app(app)
+    
+    # Personal API tokens (HMAC-signed; key defaults to SECRET_KEY)
+    app.config['API_TOKEN_SECRET'] = os.environ.get('API_TOKEN_SECRET')
+    app.config['API_TOKEN_REVOCATION_TTL'] = int(os.environ.get('API_TOKEN_REVOCATION_TTL', 60))
+    
+    # Signed file URLs: valid SIGNED_URL_TTL to TTL + BUCKET seconds, stable within a bucket
+    app.config['SIGNED_URL_SECRET'] = os.environ.get('SIGNED_URL_SECRET')
+    app.config['SIGNED_URL_TTL'] = int(os.environ.get('SIGNED_URL_TTL', 6 * 3600))
+    app.config['SIGNED_URL_BUCKET'] = int(os.environ.get('SIGNED_URL_BUCKET', 3600))
+    
+    report.record('config', time.perf_counter() - phase_started)
+    
     # MongoDB Configuration
     mongo_uri = os.environ.get('MONGODB_URI')
     
@@ -34,14 +154,7 @@ def create_app():
         mongo_uri = mongo_uri.replace('Deep@0210', quote_plus('Deep@0210'))
     
     try:
-        global mongo_client, db, fs
-        
-        # Create MongoDB client with timeout
-        mongo_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=10000)
-        
-        # Test connection
-        mongo_client.admin.command('ping')
-        print("✅ MongoDB connection successful")
+        global mongo_connection, mongo_client, db, fs
         
         # Get database name from URI or use default
         if '/' in mongo_uri and '?' in mongo_uri:
@@ -50,61 +163,123 @@ def create_app():
         else:
             db_name = '3d_asset_manager'
         
-        # Connect to specific database
-        db = mongo_client[db_name]
-        fs = gridfs.GridFS(db)
+        # The client is created on first use; nothing here touches the network
+        # Pool sizes apply per process, i.e. per worker under a prefork server
+        pool_options = {'maxPoolSize': app.config['MONGO_MAX_POOL_SIZE']}
+        if app.config['MONGO_MIN_POOL_SIZE']:
+            pool_options['minPoolSize'] = app.config['MONGO_MIN_POOL_SIZE']
+        listener_factories = [log.mongo_listener]
+        if app.config['METRICS_ENABLED']:
+            listener_factories.append(metrics.mongo_listeners)
+        # Lazy deployments check the index version once per process, on first use
+        on_connect = [_ensure_indexes_on_connect] if app.config['LAZY_INIT'] else []
+        mongo_connection = MongoConnection(mongo_uri, db_name, listener_factories=listener_factories,
+                                           on_connect=on_connect, serverSelectionTimeoutMS=10000,
+                                           **pool_options)
+        mongo_client = LazyHandle(mongo_connection, 'client')
+        db = LazyHandle(mongo_connection, 'db')
+        fs = LazyHandle(mongo_connection, 'fs')
         
         # Store database references in app config
+        app.config['MONGODB_CONNECTION'] = mongo_connection
         app.config['MONGODB_CLIENT'] = mongo_client
         app.config['MONGODB_DB'] = db
         app.config['GRIDFS'] = fs
         
-        print(f"✅ Database '{db_name}' connected")
+        if not app.config['LAZY_INIT']:
+            with report.phase('mongo_ping'):
+                mongo_connection.ping()
+            logger.info("MongoDB connection successful", extra={'database': db_name})
         
     except Exception as e:
-        print(f"❌ MongoDB connection failed: {e}")
+        logger.error("MongoDB connection failed: %s", e)
         raise Exception(f"Database connection failed: {e}")
     
-    # Initialize Flask-Login
-    login_manager.init_app(app)
-    login_manager.login_view = 'auth.login'
-    login_manager.login_message = 'Please log in to access this page.'
-    login_manager.login_message_category = 'info'
+    with report.phase('extensions'):
+        # Initialize Flask-Login
+        login_manager.init_app(app)
+        login_manager.login_view = 'auth.login'
+        login_manager.login_message = 'Please log in to access this page.'
+        login_manager.login_message_category = 'info'
+        
+        # Write-behind download counters
+        from app.counters import download_counter
+        download_counter.init_app(app)
+        
+        # Versioned response cache for public listings and stats
+        from app.cache import response_cache
+        response_cache.init_app(app)
+        
+        # Cross-worker invalidation of the in-process caches
+        from app.invalidation import invalidation_bus
+        invalidation_bus.init_app(app)
+        
+        # Cached model card fragments (model_card() in templates)
+        from app import fragments
+        fragments.init_app(app)
+        
+        # signed_file_url() in templates
+        from app import signed_urls
+        signed_urls.init_app(app)
+        
+        # User loader for Flask-Login
+        from app.models import User
+        @login_manager.user_loader
+        def load_user(user_id):
+            try:
+                return User.get_by_id(user_id)
+            except Exception as e:
+                logger.error("User loader error: %s", e)
+                return None
+        
+        # Bearer API tokens: verified by signature, no user lookup
+        from app import tokens
+        tokens.init_app(app)
+        login_manager.request_loader(lambda request: tokens.user_from_request())
+        
+    # Register blueprints
+    with report.phase('blueprints'):
+        from app.auth import auth_bp
+        from app.main import main_bp
+        from app.api import api_bp
+        
+        app.register_blueprint(auth_bp, url_prefix='/auth')
+        app.register_blueprint(main_bp)
+        app.register_blueprint(api_bp, url_prefix='/api')
     
-    # User loader for Flask-Login
-    from app.models import User
-    @login_manager.user_loader
-    def load_user(user_id):
-        try:
-            return User.get_by_id(user_id)
-        except Exception as e:
-            print(f"User loader error: {e}")
-            return None
+    @app.cli.command('reconcile-stats')
+    def reconcile_stats_command():
+        """Recompute the materialized platform and per-user statistics"""
+        from app import stats
+        print(f"✅ Platform stats reconciled: {stats.reconcile()}")
+        
+        # Per-user counters are re-aggregated lazily on each user's next visit
+        result = db.users.update_many({'stats': {'$exists': True}}, {'$unset': {'stats': ''}})
+        print(f"✅ Per-user stats reset for {result.modified_count} users")
     
-    # Register blueprints
-    from app.auth import auth_bp
-    from app.main import main_bp
-    from app.api import api_bp
+    @app.cli.command('backfill-changes')
+    def backfill_changes_command():
+        """Give existing model documents a change feed sequence number"""
+        from app import changes
+        print(f"✅ Change sequence assigned to {changes.backfill()} models")
     
-    app.register_blueprint(auth_bp, url_prefix='/auth')
-    app.register_blueprint(main_bp)
-    app.register_blueprint(api_bp, url_prefix='/api')
+    @app.cli.command('create-indexes')
+    def create_indexes_command():
+        """Create or update the MongoDB indexes"""
+        ensure_indexes(db)
+        print("✅ Database indexes created")
     
-    # Create indexes for better performance
-    try:
-        with app.app_context():
-            # User indexes
-            db.users.create_index("username", unique=True)
-            db.users.create_index("email", unique=True)
-            
-            # Model indexes
-            db.models.create_index("user_id")
-            db.models.create_index("is_public")
-            db.models.create_index("upload_date")
-            db.models.create_index([("name", "text"), ("description", "text")])
-            
-            print("✅ Database indexes created")
-    except Exception as e:
-        print(f"⚠️ Index creation warning: {e}")
+    # Eager mode builds indexes at startup; lazy deployments build them on the
+    # first database access unless `flask create-indexes` already has
+    if not app.config['LAZY_INIT']:
+        try:
+            with report.phase('indexes'):
+                ensure_indexes(db)
+            logger.info("Database indexes created")
+        except Exception as e:
+            logger.warning("Index creation warning: %s", e)
+    
+    app.config['STARTUP_REPORT'] = report
+    logger.info(report.summary(), extra={'startup': report.as_dict()})
     
     return app
@@ -1,78 +1,285 @@
-from flask import Blueprint, jsonify, request, current_app, make_response
+from flask import Blueprint, jsonify, request, current_app, make_response, Response, stream_with_context
+from werkzeug.utils import secure_filename
 from flask_login import current_user, login_required
 from app.models import Model3D, User
+from app.search import search_index
+from app import changes, export, ingest, metrics, profiling, serializers, signed_urls, tokens
+from app.auth import admin_required
+from app.cache import cached_response
+from app.counters import download_counter
 from bson.objectid import ObjectId
+import hmac
 import io
+import logging
+import zipfile
+
+logger = logging.getLogger(__name__)
 
 api_bp = Blueprint('api', __name__)
 
+UPLOAD_RESPONSE_FIELDS = ('id', 'name', 'description', 'file_format', 'file_size',
+                          'original_filename', 'is_public', 'upload_date')
+
+MIME_TYPES = {
+    'glb': 'model/gltf-binary',
+    'gltf': 'application/json',
+    'obj': 'text/plain',
+    'fbx': 'application/octet-stream',
+    'dae': 'application/xml',
+    '3ds': 'application/octet-stream',
+    'ply': 'application/octet-stream',
+    'stl': 'application/octet-stream'
+}
+
 @api_bp.route('/test')
 def test_api():
     """Simple test endpoint to verify API is working"""
+    report = current_app.config.get('STARTUP_REPORT')
     return jsonify({
         'status': 'success',
         'message': 'API is working!',
-        'timestamp': str(Model3D().upload_date)
+        'timestamp': str(Model3D().upload_date),
+        'startup': report.as_dict() if report else None
     })
 
+def _user_listing():
+    """True for per-user listings, which are never served from the shared cache"""
+    return request.args.get('user_only', 'false').lower() == 'true' and current_user.is_authenticated
+
 @api_bp.route('/models')
+@cached_response('api.models', bypass=_user_listing)
 def list_models():
-    """List models with pagination and search"""
+    """List models with pagination, search and ?fields= sparse fieldsets"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)  # Max 100 per page
         search = request.args.get('search', '').strip()
         user_only = request.args.get('user_only', 'false').lower() == 'true'
+        fields = serializers.parse_fields(request.args.get('fields'))
+        projection = serializers.projection(fields)
         
         if user_only and current_user.is_authenticated:
             # Get user's models
-            models, total = Model3D.get_user_models(current_user.id, page=page, per_page=per_page)
+            documents, total = Model3D.get_user_documents(current_user.id, page=page, per_page=per_page,
+                                                          projection=projection)
         else:
             # Get public models
-            models, total = Model3D.get_public_models(page=page, per_page=per_page, search=search if search else None)
-        
-        # Convert models to JSON-serializable format
-        models_data = []
-        for model in models:
-            owner = User.get_by_id(model.user_id)
-            models_data.append({
-                'id': model.id,
-                'name': model.name,
-                'description': model.description,
-                'file_format': model.file_format,
-                'file_size': model.file_size,
-                'original_filename': model.original_filename,
-                'is_public': model.is_public,
-                'upload_date': model.upload_date.isoformat() if model.upload_date else None,
-                'download_count': model.download_count,
-                'owner': {
-                    'id': owner.id if owner else None,
-                    'username': owner.username if owner else 'Unknown'
-                }
-            })
-        
-        # Calculate pagination info
-        total_pages = (total + per_page - 1) // per_page
+            documents, total = Model3D.get_public_documents(page=page, per_page=per_page,
+                                                            search=search if search else None,
+                                                            projection=projection)
         
-        return jsonify({
-            'models': models_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': total_pages,
-                'has_prev': page > 1,
-                'has_next': page < total_pages
-            }
+        # One $in lookup for all owners on the page
+        owners = User.get_usernames(document.get('user_id') for document in documents) if 'owner' in fields else None
+        
+        return serializers.json_response({
+            'models': [serializers.serialize_model(document, fields, owners) for document in documents],
+            'pagination': serializers.pagination(page, per_page, total)
         })
         
     except Exception as e:
-        print(f"API list models error: {e}")
+        logger.error("API list models error: %s", e)
         return jsonify({'error': 'Failed to retrieve models'}), 500
 
+@api_bp.route('/models/export.ndjson')
+def export_catalog():
+    """Stream every public model's metadata as newline-delimited JSON"""
+    try:
+        fields = serializers.parse_fields(request.args.get('fields'))
+        batch_size = current_app.config['EXPORT_BATCH_SIZE']
+        documents = Model3D.iter_public_documents(projection=serializers.projection(fields),
+                                                  batch_size=batch_size)
+        
+        response = Response(stream_with_context(export.stream_ndjson(documents, fields, batch_size)),
+                            mimetype='application/x-ndjson')
+        response.headers['Content-Disposition'] = 'attachment; filename="models.ndjson"'
+        return response
+        
+    except Exception as e:
+        logger.error("API catalog export error: %s", e)
+        return jsonify({'error': 'Export failed'}), 500
+
+@api_bp.route('/models/changes')
+def model_changes():
+    """Public catalog changes since a token, for mirrors and caches"""
+    try:
+        try:
+            since = changes.parse_token(request.args.get('since'))
+        except ValueError:
+            return jsonify({'error': 'Invalid since token'}), 400
+        
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        fields = serializers.parse_fields(request.args.get('fields'))
+        entries, has_more = changes.read(since, limit, projection=serializers.projection(fields))
+        
+        upserts = [document for _, op, document in entries if op == 'upsert']
+        owners = User.get_usernames(document.get('user_id') for document in upserts) if 'owner' in fields else None
+        
+        results = []
+        for seq, op, document in entries:
+            change = {'seq': seq, 'op': op, 'updated_at': document['updated_at']}
+            if op == 'upsert':
+                change['id'] = str(document['_id'])
+                change['model'] = serializers.serialize_model(document, fields, owners)
+            else:
+                change['id'] = document['model_id']
+            results.append(change)
+        
+        return serializers.json_response({
+            'changes': results,
+            'next': str(entries[-1][0] if entries else since),
+            'has_more': has_more
+        })
+        
+    except Exception as e:
+        logger.error("API model changes error: %s", e)
+        return jsonify({'error': 'Failed to retrieve changes'}), 500
+
+@api_bp.route('/models/batch', methods=['POST'])
+def batch_models():
+    """Fetch metadata for many models in one request, in request order"""
+    try:
+        payload = request.get_json(silent=True) or {}
+        ids = payload.get('ids')
+        max_ids = current_app.config['BATCH_MAX_IDS']
+        
+        if not isinstance(ids, list) or not ids:
+            return jsonify({'error': 'Provide a non-empty "ids" list.'}), 400
+        
+        if len(ids) > max_ids:
+            return jsonify({'error': f'Too many ids. Maximum is {max_ids} per request.'}), 400
+        
+        fields = request.args.get('fields') or payload.get('fields')
+        if isinstance(fields, list) and all(isinstance(field, str) for field in fields):
+            fields = ','.join(fields)
+        elif fields is not None and not isinstance(fields, str):
+            return jsonify({'error': '"fields" must be a comma-separated string or a list of names.'}), 400
+        fields = serializers.parse_fields(fields)
+        
+        valid_ids = {str(model_id) for model_id in ids if ObjectId.is_valid(str(model_id))}
+        
+        # One $in for the models and one for their owners
+        models = Model3D.get_by_ids(valid_ids)
+        owners = User.get_usernames(model.user_id for model in models.values())
+        
+        viewer_id = current_user.id if current_user.is_authenticated else None
+        
+        results = []
+        for model_id in ids:
+            model_id = str(model_id)
+            model = models.get(model_id)
+            
+            if model_id not in valid_ids:
+                results.append({'id': model_id, 'error': 'Invalid model id', 'status': 400})
+            elif not model:
+                results.append({'id': model_id, 'error': 'Model not found', 'status': 404})
+            elif not model.is_public and model.user_id != viewer_id:
+                results.append({'id': model_id, 'error': 'Access denied', 'status': 403})
+            else:
+                results.append({
+                    'id': model.id,
+                    'status': 200,
+                    'model': serializers.serialize_model(model, fields, owners)
+                })
+        
+        return serializers.json_response({'results': results})
+        
+    except Exception as e:
+        logger.error("API batch models error: %s", e)
+        return jsonify({'error': 'Failed to retrieve models'}), 500
+
+@api_bp.route('/download/bundle', methods=['GET', 'POST'])
+def download_bundle():
+    """Download several models as one streamed ZIP archive"""
+    try:
+        if request.method == 'POST':
+            ids = (request.get_json(silent=True) or {}).get('ids') or []
+        else:
+            ids = [model_id for model_id in request.args.get('ids', '').split(',') if model_id]
+        
+        max_ids = current_app.config['BATCH_MAX_IDS']
+        if not ids:
+            return jsonify({'error': 'Provide the model ids to bundle.'}), 400
+        if len(ids) > max_ids:
+            return jsonify({'error': f'Too many ids. Maximum is {max_ids} per bundle.'}), 400
+        
+        ids = list(dict.fromkeys(str(model_id) for model_id in ids))
+        models = Model3D.get_by_ids(ids)
+        viewer_id = current_user.id if current_user.is_authenticated else None
+        
+        # Check everything up front; once streaming starts we can't send an error
+        errors = {}
+        for model_id in ids:
+            model = models.get(model_id)
+            if not model:
+                errors[model_id] = 'Model not found'
+            elif not model.is_public and model.user_id != viewer_id:
+                errors[model_id] = 'Access denied'
+        if errors:
+            status = 404 if 'Model not found' in errors.values() else 403
+            return jsonify({'error': 'Some models cannot be bundled', 'models': errors}), status
+        
+        ordered = [models[model_id] for model_id in ids]
+        for model in ordered:
+            model.increment_download_count()
+        
+        response = Response(stream_with_context(export.stream_zip(ordered)), mimetype='application/zip')
+        response.headers['Content-Disposition'] = 'attachment; filename="models.zip"'
+        return response
+        
+    except Exception as e:
+        logger.error("API bundle download error: %s", e)
+        return jsonify({'error': 'Bundle download failed'}), 500
+
+@api_bp.route('/user/export')
+@login_required
+def export_user_library():
+    """Stream the current user's whole library as a ZIP archive"""
+    try:
+        models = Model3D.iter_user_models(current_user.id)
+        filename = f'{secure_filename(current_user.username) or "library"}-models.zip'
+        
+        response = Response(stream_with_context(export.stream_zip(models)), mimetype='application/zip')
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+        
+    except Exception as e:
+        logger.error("API user export error: %s", e)
+        return jsonify({'error': 'Export failed'}), 500
+
+def _signed_file_response(model_id, as_attachment):
+    """Serve a file for a signed URL: no model lookup, cacheable until the link expires"""
+    file_id, remaining = signed_urls.verify(model_id, request.args)
+    if not file_id:
+        return jsonify({'error': 'Link is invalid or has expired'}), 403
+    
+    try:
+        grid_out = current_app.config['GRIDFS'].get(ObjectId(file_id))
+        file_data = grid_out.read()
+    except Exception as e:
+        logger.debug("Signed file not found", extra={'model_id': model_id, 'file_id': file_id, 'error': str(e)})
+        return jsonify({'error': 'File not found'}), 404
+    
+    metadata = grid_out.metadata or {}
+    filename = metadata.get('original_filename') or grid_out.filename or 'model'
+    file_format = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if as_attachment:
+        download_counter.increment(model_id, owner_id=metadata.get('uploaded_by'))
+    
+    response = make_response(file_data)
+    response.headers['Content-Type'] = MIME_TYPES.get(file_format, 'application/octet-stream')
+    response.headers['Content-Length'] = str(len(file_data))
+    if as_attachment:
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Same bytes for everyone holding the URL; GridFS files never change
+    response.headers['Cache-Control'] = f'public, max-age={remaining}, immutable'
+    response.set_etag(file_id)
+    return response.make_conditional(request)
+
 @api_bp.route('/download/<model_id>')
 def download_model(model_id):
     """Download model file"""
+    if signed_urls.is_signed(request.args):
+        return _signed_file_response(model_id, as_attachment=True)
     try:
         model = Model3D.get_by_id(model_id)
         
@@ -93,19 +300,7 @@ def download_model(model_id):
         # Increment download counter
         model.increment_download_count()
         
-        # Determine MIME type
-        mime_types = {
-            'glb': 'model/gltf-binary',
-            'gltf': 'application/json',
-            'obj': 'text/plain',
-            'fbx': 'application/octet-stream',
-            'dae': 'application/xml',
-            '3ds': 'application/octet-stream',
-            'ply': 'application/octet-stream',
-            'stl': 'application/octet-stream'
-        }
-        
-        mimetype = mime_types.get(model.file_format.lower(), 'application/octet-stream')
+        mimetype = MIME_TYPES.get(model.file_format.lower(), 'application/octet-stream')
         
         # Create response
         response = make_response(file_data)
@@ -116,12 +311,14 @@ def download_model(model_id):
         return response
         
     except Exception as e:
-        print(f"API download error: {e}")
+        logger.error("API download error: %s", e)
         return jsonify({'error': 'Download failed'}), 500
 
 @api_bp.route('/view/<model_id>')
 def view_model(model_id):
     """Serve model file for 3D viewing (not as download)"""
+    if signed_urls.is_signed(request.args):
+        return _signed_file_response(model_id, as_attachment=False)
     try:
         model = Model3D.get_by_id(model_id)
         
@@ -139,19 +336,7 @@ def view_model(model_id):
         if not file_data:
             return jsonify({'error': 'File not found'}), 404
         
-        # Determine MIME type
-        mime_types = {
-            'glb': 'model/gltf-binary',
-            'gltf': 'application/json',
-            'obj': 'text/plain',
-            'fbx': 'application/octet-stream',
-            'dae': 'application/xml',
-            '3ds': 'application/octet-stream',
-            'ply': 'application/octet-stream',
-            'stl': 'application/octet-stream'
-        }
-        
-        mimetype = mime_types.get(model.file_format.lower(), 'application/octet-stream')
+        mimetype = MIME_TYPES.get(model.file_format.lower(), 'application/octet-stream')
         
         # Create response for viewing (not download)
         response = make_response(file_data)
@@ -162,7 +347,7 @@ def view_model(model_id):
         return response
         
     except Exception as e:
-        print(f"API view error: {e}")
+        logger.error("API view error: %s", e)
         return jsonify({'error': 'View failed'}), 500
 
 @api_bp.route('/model/<model_id>', methods=['DELETE'])
@@ -185,20 +370,144 @@ def delete_model(model_id):
         return jsonify({'message': 'Model deleted successfully'})
         
     except Exception as e:
-        print(f"API delete error: {e}")
+        logger.error("API delete error: %s", e)
         return jsonify({'error': 'Delete failed'}), 500
 
 @api_bp.route('/stats')
+@cached_response('api.stats')
 def get_stats():
     """Get platform statistics"""
     try:
         stats = Model3D.get_stats()
-        return jsonify(stats)
+        return serializers.json_response(stats)
         
     except Exception as e:
-        print(f"API stats error: {e}")
+        logger.error("API stats error: %s", e)
         return jsonify({'error': 'Failed to retrieve statistics'}), 500
 
+def _metrics_token_valid():
+    """True if the request carries ``Authorization: Bearer <METRICS_TOKEN>``"""
+    expected = current_app.config['METRICS_TOKEN']
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if not expected or scheme.lower() != 'bearer':
+        return False
+    return hmac.compare_digest(token.strip().encode('utf-8'), expected.encode('utf-8'))
+
+@api_bp.route('/metrics')
+def get_metrics():
+    """Prometheus metrics for this process (scrape token or admin login)"""
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    if not _metrics_token_valid():
+        if not current_user.is_authenticated:
+            return jsonify({'error': 'Authentication required'}), 401
+        if not current_user.is_admin:
+            return jsonify({'error': 'Admin access required'}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def _token_payload(record):
+    record['id'] = record.pop('_id')
+    record.pop('token_hash', None)
+    return record
+
+@api_bp.route('/tokens', methods=['GET'])
+@login_required
+def list_tokens():
+    """The current user's API tokens (never the token values)"""
+    try:
+        records = [_token_payload(record) for record in tokens.list_for_user(current_user.id)]
+        return serializers.json_response({'tokens': records})
+    except Exception as e:
+        logger.error("API tokens error: %s", e)
+        return jsonify({'error': 'Failed to retrieve tokens'}), 500
+
+@api_bp.route('/tokens', methods=['POST'])
+@login_required
+def create_token():
+    """Create a personal API token; the value is only returned here"""
+    # A token cannot mint further tokens
+    if getattr(current_user, 'api_token_id', None):
+        return jsonify({'error': 'Log in with a password to create tokens'}), 403
+    
+    payload = request.get_json(silent=True) or request.form
+    name = (payload.get('name') or '').strip()
+    if not name:
+        return jsonify({'error': 'Please provide a name for the token.'}), 400
+    try:
+        expires_in_days = int(payload['expires_in_days']) if payload.get('expires_in_days') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'expires_in_days must be a whole number'}), 400
+    if expires_in_days is not None and expires_in_days <= 0:
+        return jsonify({'error': 'expires_in_days must be positive'}), 400
+    
+    try:
+        token, record = tokens.create(current_user, name, expires_in_days)
+        logger.info("API token created", extra={'token_id': record['_id'], 'user': current_user.username})
+        return serializers.json_response({'token': token, **_token_payload(record)}, status=201)
+    except Exception as e:
+        logger.error("API token create error: %s", e)
+        return jsonify({'error': 'Failed to create token'}), 500
+
+@api_bp.route('/tokens/<token_id>', methods=['DELETE'])
+@login_required
+def revoke_token(token_id):
+    """Revoke one of the current user's API tokens"""
+    try:
+        if not tokens.revoke(current_user.id, token_id):
+            return jsonify({'error': 'Token not found'}), 404
+        logger.info("API token revoked", extra={'token_id': token_id, 'user': current_user.username})
+        return jsonify({'message': 'Token revoked'})
+    except Exception as e:
+        logger.error("API token revoke error: %s", e)
+        return jsonify({'error': 'Failed to revoke token'}), 500
+
+def _profile_payload(document):
+    document['id'] = str(document.pop('_id'))
+    return document
+
+@api_bp.route('/admin/profiles')
+@admin_required
+def list_profiles():
+    """Newest request profiles (summaries; fetch one for functions and allocations)"""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 200)
+        profiles = [_profile_payload(document) for document in profiling.recent(limit)]
+        return serializers.json_response({'profiles': profiles})
+    except Exception as e:
+        logger.error("API profiles error: %s", e)
+        return jsonify({'error': 'Failed to retrieve profiles'}), 500
+
+@api_bp.route('/admin/profiles/<profile_id>')
+@admin_required
+def get_profile(profile_id):
+    """A stored request profile"""
+    if not ObjectId.is_valid(profile_id):
+        return jsonify({'error': 'Profile not found'}), 404
+    document = profiling.get(ObjectId(profile_id))
+    if not document:
+        return jsonify({'error': 'Profile not found'}), 404
+    return serializers.json_response(_profile_payload(document))
+
+@api_bp.route('/search/suggest')
+def search_suggest():
+    """Autocomplete suggestions for the catalog search box"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', 8, type=int), 20)
+        
+        search_index.ensure_built()
+        suggestions = search_index.suggest(query, limit=limit)
+        
+        return jsonify({
+            'query': query,
+            'terms': suggestions['terms'],
+            'models': suggestions['models']
+        })
+        
+    except Exception as e:
+        logger.error("API search suggest error: %s", e)
+        return jsonify({'error': 'Failed to retrieve suggestions'}), 500
+
 @api_bp.route('/user/models')
 @login_required
 def get_user_models():
@@ -206,75 +515,52 @@ def get_user_models():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 20, type=int), 100)
+        fields = serializers.parse_fields(
+            request.args.get('fields'),
+            default=tuple(field for field in serializers.MODEL_FIELDS if field != 'owner')
+        )
         
-        models, total = Model3D.get_user_models(current_user.id, page=page, per_page=per_page)
-        
-        models_data = []
-        for model in models:
-            models_data.append({
-                'id': model.id,
-                'name': model.name,
-                'description': model.description,
-                'file_format': model.file_format,
-                'file_size': model.file_size,
-                'original_filename': model.original_filename,
-                'is_public': model.is_public,
-                'upload_date': model.upload_date.isoformat() if model.upload_date else None,
-                'download_count': model.download_count
-            })
-        
-        total_pages = (total + per_page - 1) // per_page
+        documents, total = Model3D.get_user_documents(current_user.id, page=page, per_page=per_page,
+                                                      projection=serializers.projection(fields))
+        owners = {current_user.id: current_user.username}
         
-        return jsonify({
-            'models': models_data,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': total_pages,
-                'has_prev': page > 1,
-                'has_next': page < total_pages
-            }
+        return serializers.json_response({
+            'models': [serializers.serialize_model(document, fields, owners) for document in documents],
+            'pagination': serializers.pagination(page, per_page, total)
         })
         
     except Exception as e:
-        print(f"API user models error: {e}")
+        logger.error("API user models error: %s", e)
         return jsonify({'error': 'Failed to retrieve user models'}), 500
 
 @api_bp.route('/upload', methods=['POST'])
 @login_required
 def upload_model():
     """API endpoint for uploading 3D models"""
-    print("🔄 Upload API called - Starting processing...")
-    
     try:
-        # Log request info
-        print(f"📋 Request method: {request.method}")
-        print(f"📋 Content length: {request.content_length}")
-        print(f"📋 Form keys: {list(request.form.keys())}")
-        print(f"📋 Files keys: {list(request.files.keys())}")
-        print(f"📋 Current user: {current_user.username if current_user.is_authenticated else 'Not authenticated'}")
+        logger.debug("Upload API called", extra={
+            'content_length': request.content_length,
+            'form_keys': list(request.form.keys()),
+            'file_keys': list(request.files.keys()),
+            'user': current_user.username
+        })
         
         # Get form data
         name = request.form.get('name', '').strip()
         description = request.form.get('description', '').strip()
         is_public = request.form.get('is_public') == 'true'  # Note: 'true' for JSON boolean
         
-        print(f"📋 Form data - Name: {name}, Description: {description[:50] if description else 'None'}, Public: {is_public}")
-        
         # Get uploaded file
         file = request.files.get('file')
         
         if not file or file.filename == '':
-            print("❌ No file provided")
+            logger.debug("Upload rejected: no file provided")
             return jsonify({'error': 'Please select a file to upload.'}), 400
         
         if not name:
-            print("❌ No name provided")
+            logger.debug("Upload rejected: no name provided")
             return jsonify({'error': 'Please provide a name for your model.'}), 400
         
-        print(f"📋 File info - Name: {file.filename}, Content-Type: {file.content_type}")
-        
         # Import secure_filename
         from werkzeug.utils import secure_filename
         
@@ -282,27 +568,22 @@ def upload_model():
         filename = secure_filename(file.filename)
         file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
         
-        print(f"📋 File extension: {file_extension}")
-        
         allowed_extensions = current_app.config['ALLOWED_EXTENSIONS']
         if file_extension not in allowed_extensions:
-            print(f"❌ Invalid file extension: {file_extension}")
+            logger.debug("Upload rejected: invalid file extension", extra={'extension': file_extension})
             return jsonify({'error': f'File type not supported. Allowed: {", ".join(allowed_extensions)}'}), 400
         
         # Read file content
-        print("📋 Reading file content...")
         file_content = file.read()
         file_size = len(file_content)
         
-        print(f"📋 File size: {file_size} bytes ({file_size / (1024*1024):.2f} MB)")
-        
         # Check file size (4MB limit for Vercel)
         if file_size > current_app.config['MAX_CONTENT_LENGTH']:
-            print(f"❌ File too large: {file_size} > {current_app.config['MAX_CONTENT_LENGTH']}")
+            logger.debug("Upload rejected: file too large", extra={'file_size': file_size})
             return jsonify({'error': 'File too large. Maximum size is 4MB for Vercel deployment.'}), 400
+        metrics.upload_sizes.observe(file_size, 'single')
         
         # Store file in GridFS
-        print("📋 Storing file in GridFS...")
         fs = current_app.config['GRIDFS']
         gridfs_file_id = fs.put(
             file_content,
@@ -315,10 +596,7 @@ def upload_model():
             }
         )
         
-        print(f"📋 GridFS file ID: {gridfs_file_id}")
-        
         # Create model record
-        print("📋 Creating model record...")
         model = Model3D(
             name=name,
             description=description,
@@ -331,26 +609,51 @@ def upload_model():
         )
         
         model.save()
-        print(f"📋 Model saved with ID: {model.id}")
+        logger.info("Model uploaded", extra={
+            'model_id': model.id,
+            'file_format': file_extension,
+            'file_size': file_size,
+            'gridfs_file_id': str(gridfs_file_id)
+        })
         
         # Return success response with model data
-        return jsonify({
+        return serializers.json_response({
             'success': True,
             'message': f'Model "{name}" uploaded successfully!',
-            'model': {
-                'id': model.id,
-                'name': model.name,
-                'description': model.description,
-                'file_format': model.file_format,
-                'file_size': model.file_size,
-                'original_filename': model.original_filename,
-                'is_public': model.is_public,
-                'upload_date': model.upload_date.isoformat() if model.upload_date else None
-            }
-        }), 201
+            'model': serializers.serialize_model(model, UPLOAD_RESPONSE_FIELDS)
+        }, status=201)
         
-    except Exception as e:
-        print(f"❌ API upload error: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("API upload error")
+        return jsonify({'error': 'Upload failed. Please try again.'}), 500
+
+@api_bp.route('/upload/bulk', methods=['POST'])
+@login_required
+def upload_bulk():
+    """Upload several model files, or ZIP archives of them, in one request"""
+    try:
+        description = request.form.get('description', '').strip()
+        is_public = request.form.get('is_public') == 'true'
+        
+        entries = ingest.collect_entries(request.files.getlist('files') + request.files.getlist('file'))
+        if not entries:
+            return jsonify({'error': 'Please select files or a ZIP archive to upload.'}), 400
+        
+        max_files = current_app.config['BULK_UPLOAD_MAX_FILES']
+        if len(entries) > max_files:
+            return jsonify({'error': f'Too many files. Maximum is {max_files} per upload.'}), 400
+        
+        results = ingest.ingest(entries, current_user.id, description=description, is_public=is_public)
+        created = sum(1 for result in results if result['status'] == 'created')
+        
+        return jsonify({
+            'success': created > 0,
+            'message': f'{created} of {len(results)} files uploaded.',
+            'results': results
+        }), 201 if created else 400
+        
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'The archive could not be read.'}), 400
+    except Exception:
+        logger.exception("API bulk upload error")
         return jsonify({'error': 'Upload failed. Please try again.'}), 500
@@ -0,0 +1,352 @@
+"""ASGI application serving the read-only ``/api/*`` routes asynchronously.
+
+Metadata queries go through Motor and GridFS files are streamed chunk by chunk
+from an ``AsyncIOMotorGridFSBucket``, so a slow client holds a coroutine rather
+than a worker thread. Every other path (pages, auth, uploads, deletes) is
+passed through to the regular Flask app, which also provides configuration,
+the session cookie format, the login loaders, the response cache and the
+download counter buffer.
+
+A session cookie is decoded in place; a bearer token or remember-me cookie is
+resolved by running Flask-Login against the request in a worker thread.
+
+Run with ``uvicorn asgi:app``.
+"""
+import logging
+import time
+
+from bson.objectid import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags, quote_etag
+
+from app import create_app, serializers, signed_urls
+from app.api import MIME_TYPES
+from app.cache import etag_for, make_key, response_cache
+from app.counters import download_counter
+
+logger = logging.getLogger(__name__)
+
+
+class APIResponse(JSONResponse):
+    """JSON response encoded by the shared serializer (datetimes, ObjectIds, orjson)"""
+
+    backend = 'auto'
+
+    def render(self, content):
+        return serializers.encode(content, self.backend)
+
+
+def _int_arg(request, name, default):
+    try:
+        return int(request.query_params.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class AsyncAPI:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        connection = flask_app.config['MONGODB_CONNECTION']
+        options = dict(connection.client_options)
+        if flask_app.config['METRICS_ENABLED']:
+            from app import metrics
+            options['event_listeners'] = metrics.mongo_listeners()
+        self.client = AsyncIOMotorClient(connection.uri, **options)
+        self.db = self.client[connection.db_name]
+        self.bucket = AsyncIOMotorGridFSBucket(self.db)
+        self.session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.session_cookie = flask_app.config.get('SESSION_COOKIE_NAME', 'session')
+        self.remember_cookie = flask_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')
+
+    def session_user_id(self, request):
+        """User id from the Flask-Login session cookie, if any"""
+        cookie = request.cookies.get(self.session_cookie)
+        if not cookie or self.session_serializer is None:
+            return None
+        try:
+            lifetime = self.flask_app.permanent_session_lifetime.total_seconds()
+            session = self.session_serializer.loads(cookie, max_age=lifetime)
+        except Exception:
+            return None
+        return session.get('_user_id')
+
+    def flask_login_user_id(self, request):
+        """User id as Flask-Login resolves it (bearer token, remember-me cookie)"""
+        from flask_login import current_user
+
+        with self.flask_app.test_request_context(
+            request.url.path, query_string=request.url.query, headers=list(request.headers.items())
+        ):
+            user = current_user._get_current_object()
+            return user.id if user.is_authenticated else None
+
+    async def current_user_id(self, request):
+        user_id = self.session_user_id(request)
+        if user_id:
+            return user_id
+        if 'authorization' in request.headers or self.remember_cookie in request.cookies:
+            return await run_in_threadpool(self.flask_login_user_id, request)
+        return None
+
+    def _call_cache(self, method, *args):
+        with self.flask_app.app_context():
+            return method(*args)
+
+    async def _cache(self, method, *args):
+        # The mongo backend does blocking I/O; the memory backend is cheap enough inline
+        if response_cache.backend.shared:
+            return await run_in_threadpool(self._call_cache, method, *args)
+        return self._call_cache(method, *args)
+
+    async def cached(self, request, name, render):
+        """``render()``'s response through the shared response cache, with ETag and 304"""
+        if not response_cache.enabled:
+            return await render()
+
+        key = make_key(name, request.query_params)
+        entry, version = await self._cache(response_cache.get, key)
+        state = 'HIT'
+        if entry is None:
+            response = await render()
+            if response.status_code != 200:
+                return response
+            entry = {'body': response.body, 'mimetype': response.media_type, 'etag': etag_for(response.body)}
+            await self._cache(response_cache.set, key, entry, version)
+            state = 'MISS'
+
+        headers = {'ETag': quote_etag(entry['etag']), 'X-Cache': state}
+        if parse_etags(request.headers.get('if-none-match')).contains(entry['etag']):
+            return Response(status_code=304, headers=headers)
+        return Response(entry['body'], media_type=entry['mimetype'], headers=headers)
+
+    async def load_model(self, model_id):
+        if not ObjectId.is_valid(model_id):
+            return None
+        return await self.db.models.find_one({'_id': ObjectId(model_id)})
+
+    async def owner_names(self, user_ids):
+        object_ids = [ObjectId(user_id) for user_id in set(user_ids) if user_id and ObjectId.is_valid(user_id)]
+        if not object_ids:
+            return {}
+        cursor = self.db.users.find({'_id': {'$in': object_ids}}, {'username': 1})
+        return {str(user['_id']): user['username'] async for user in cursor}
+
+    def search_ids(self, search):
+        """Rank public model ids with the shared in-memory search index"""
+        from app.search import search_index
+
+        with self.flask_app.app_context():
+            search_index.ensure_built()
+            return search_index.search(search)
+
+    async def test(self, request):
+        return JSONResponse({
+            'status': 'success',
+            'message': 'Async API is working!',
+            'timestamp': time.time()
+        })
+
+    async def list_models(self, request):
+        user_only = request.query_params.get('user_only', 'false').lower() == 'true'
+        user_id = await self.current_user_id(request) if user_only else None
+        if user_id:
+            # Per-user listings never go through the shared cache
+            return await self.render_models(request, user_id)
+        return await self.cached(request, 'api.models', lambda: self.render_models(request, None))
+
+    async def render_models(self, request, user_id):
+        try:
+            page = max(_int_arg(request, 'page', 1), 1)
+            per_page = min(_int_arg(request, 'per_page', 20), 100)
+            fields = serializers.parse_fields(request.query_params.get('fields'))
+            projection = serializers.projection(fields)
+
+            search = request.query_params.get('search', '').strip()
+
+            if search and not user_id:
+                ranked_ids = await run_in_threadpool(self.search_ids, search)
+                total = len(ranked_ids)
+                page_ids = ranked_ids[(page - 1) * per_page:page * per_page]
+                cursor = self.db.models.find({'_id': {'$in': [ObjectId(model_id) for model_id in page_ids]}}, projection)
+                by_id = {str(document['_id']): document async for document in cursor}
+                documents = [by_id[model_id] for model_id in page_ids if model_id in by_id]
+            else:
+                query = {'user_id': user_id} if user_id else {'is_public': True}
+                total = await self.db.models.count_documents(query)
+                cursor = (self.db.models.find(query, projection)
+                          .sort('upload_date', -1)
+                          .skip((page - 1) * per_page)
+                          .limit(per_page))
+                documents = await cursor.to_list(length=per_page)
+            owners = await self.owner_names(document.get('user_id') for document in documents) if 'owner' in fields else None
+
+            return APIResponse({
+                'models': [serializers.serialize_model(document, fields, owners) for document in documents],
+                'pagination': serializers.pagination(page, per_page, total)
+            })
+
+        except Exception as e:
+            logger.error("Async API list models error: %s", e)
+            return JSONResponse({'error': 'Failed to retrieve models'}, status_code=500)
+
+    async def user_models(self, request):
+        user_id = await self.current_user_id(request)
+        if not user_id:
+            return JSONResponse({'error': 'Authentication required'}, status_code=401)
+        try:
+            page = max(_int_arg(request, 'page', 1), 1)
+            per_page = min(_int_arg(request, 'per_page', 20), 100)
+            fields = serializers.parse_fields(
+                request.query_params.get('fields'),
+                default=tuple(field for field in serializers.MODEL_FIELDS if field != 'owner')
+            )
+            query = {'user_id': user_id}
+            total = await self.db.models.count_documents(query)
+            cursor = (self.db.models.find(query, serializers.projection(fields))
+                      .sort('upload_date', -1)
+                      .skip((page - 1) * per_page)
+                      .limit(per_page))
+            documents = await cursor.to_list(length=per_page)
+            return APIResponse({
+                'models': [serializers.serialize_model(document, fields) for document in documents],
+                'pagination': serializers.pagination(page, per_page, total)
+            })
+        except Exception as e:
+            logger.error("Async API user models error: %s", e)
+            return JSONResponse({'error': 'Failed to retrieve user models'}, status_code=500)
+
+    async def stats(self, request):
+        return await self.cached(request, 'api.stats', self.render_stats)
+
+    async def render_stats(self):
+        try:
+            from app import stats
+
+            def read_stats():
+                with self.flask_app.app_context():
+                    return stats.get_platform_stats()
+
+            # Served from the in-process cache; misses touch one document
+            return APIResponse(await run_in_threadpool(read_stats))
+        except Exception as e:
+            logger.error("Async API stats error: %s", e)
+            return JSONResponse({'error': 'Failed to retrieve statistics'}, status_code=500)
+
+    async def _open_file(self, request, model_id):
+        """Resolve a model and its GridFS stream, or return an error response"""
+        model_data = await self.load_model(model_id)
+        if not model_data:
+            return None, None, JSONResponse({'error': 'Model not found'}, status_code=404)
+
+        if not model_data.get('is_public'):
+            if model_data.get('user_id') != await self.current_user_id(request):
+                return None, None, JSONResponse({'error': 'Access denied'}, status_code=403)
+
+        file_id = model_data.get('gridfs_file_id')
+        try:
+            grid_out = await self.bucket.open_download_stream(ObjectId(file_id))
+        except Exception:
+            return None, None, JSONResponse({'error': 'File not found'}, status_code=404)
+
+        return model_data, grid_out, None
+
+    async def _open_signed(self, request, model_id):
+        """GridFS stream and seconds of validity for a signed URL, or an error response"""
+        with self.flask_app.app_context():
+            file_id, remaining = signed_urls.verify(model_id, request.query_params)
+        if not file_id:
+            return None, 0, JSONResponse({'error': 'Link is invalid or has expired'}, status_code=403)
+        try:
+            grid_out = await self.bucket.open_download_stream(ObjectId(file_id))
+        except Exception:
+            return None, 0, JSONResponse({'error': 'File not found'}, status_code=404)
+        return grid_out, remaining, None
+
+    async def _signed(self, request, as_attachment):
+        model_id = request.path_params['model_id']
+        grid_out, remaining, error = await self._open_signed(request, model_id)
+        if error:
+            return error
+
+        metadata = grid_out.metadata or {}
+        filename = metadata.get('original_filename') or grid_out.filename or 'model'
+        file_format = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        headers = {
+            'Content-Length': str(grid_out.length),
+            'Cache-Control': f'public, max-age={remaining}, immutable',
+            'ETag': f'"{grid_out._id}"',
+        }
+        if as_attachment:
+            download_counter.increment(model_id, owner_id=metadata.get('uploaded_by'))
+            headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return StreamingResponse(self._chunks(grid_out), headers=headers,
+                                 media_type=MIME_TYPES.get(file_format, 'application/octet-stream'))
+
+    @staticmethod
+    async def _chunks(grid_out):
+        while True:
+            chunk = await grid_out.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    async def view(self, request):
+        if signed_urls.is_signed(request.query_params):
+            return await self._signed(request, as_attachment=False)
+        model_data, grid_out, error = await self._open_file(request, request.path_params['model_id'])
+        if error:
+            return error
+
+        mimetype = MIME_TYPES.get((model_data.get('file_format') or '').lower(), 'application/octet-stream')
+        return StreamingResponse(self._chunks(grid_out), media_type=mimetype, headers={
+            'Content-Length': str(grid_out.length),
+            'Cache-Control': 'public, max-age=3600'
+        })
+
+    async def download(self, request):
+        if signed_urls.is_signed(request.query_params):
+            return await self._signed(request, as_attachment=True)
+        model_data, grid_out, error = await self._open_file(request, request.path_params['model_id'])
+        if error:
+            return error
+
+        download_counter.increment(str(model_data['_id']), owner_id=model_data.get('user_id'))
+
+        mimetype = MIME_TYPES.get((model_data.get('file_format') or '').lower(), 'application/octet-stream')
+        return StreamingResponse(self._chunks(grid_out), media_type=mimetype, headers={
+            'Content-Length': str(grid_out.length),
+            'Content-Disposition': f'attachment; filename="{model_data.get("original_filename")}"'
+        })
+
+
+def create_asgi_app(flask_app=None):
+    """Build the ASGI app; unmatched paths fall through to the Flask app"""
+    flask_app = flask_app or create_app()
+    api = AsyncAPI(flask_app)
+    APIResponse.backend = flask_app.config['JSON_BACKEND']
+
+    flask_wsgi = WSGIMiddleware(flask_app)
+    routes = [
+        Route('/api/async/test', api.test),
+        Route('/api/models', api.list_models),
+        Route('/api/user/models', api.user_models),
+        Route('/api/stats', api.stats),
+        Route('/api/view/{model_id}', api.view),
+        # Bundles are built by the Flask view; keep them from matching {model_id}
+        Route('/api/download/bundle', flask_wsgi, methods=['GET', 'POST']),
+        Route('/api/download/{model_id}', api.download),
+        Mount('/', app=flask_wsgi)
+    ]
+
+    async def shutdown():
+        api.client.close()
+        download_counter.flush()
+
+    asgi_app = Starlette(routes=routes, on_shutdown=[shutdown])
+    asgi_app.state.flask_app = flask_app
+    return asgi_app
@@ -0,0 +1,244 @@
+"""Response cache for public listings and statistics.
+
+Entries are keyed by a route name plus its normalized query string and by the
+current cache version. ``Model3D.save`` and ``Model3D.delete`` bump the version,
+so every entry written before a change simply stops matching and ages out; no
+key scanning is needed. Entries also expire after ``RESPONSE_CACHE_TTL``
+seconds, which bounds staleness of values that change without a bump (download
+counts).
+
+Backends (``RESPONSE_CACHE_BACKEND``):
+
+* ``memory`` - per-process LRU of ``RESPONSE_CACHE_MAX_ENTRIES`` entries.
+* ``mongo`` - the ``response_cache`` collection, shared by every worker, with
+  a TTL index and the version kept in the same collection. Each entry records
+  the version it was computed under, and one ``$in`` query reads the entry and
+  the current version together.
+* ``none`` - caching disabled.
+
+Cached JSON responses carry an ``ETag`` and answer ``If-None-Match`` with 304.
+Memory caches in other workers are cleared through ``app.invalidation``.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, request
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = '__version__'
+
+
+class MemoryBackend:
+    """Per-process LRU with per-entry expiry"""
+
+    shared = False
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """(value or None, current version)"""
+        with self._lock:
+            version = self._version
+            key = f'{version}:{key}'
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, version
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None, version
+            self._entries.move_to_end(key)
+            return value, version
+
+    def set(self, key, value, ttl, version):
+        with self._lock:
+            key = f'{version}:{key}'
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def version(self):
+        return self._version
+
+    def bump(self):
+        with self._lock:
+            self._version += 1
+            # Old-version entries can never match again; free them now
+            self._entries.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class MongoBackend:
+    """Entries in a MongoDB collection shared by all workers"""
+
+    shared = True
+
+    def __init__(self, collection_name='response_cache'):
+        self.collection_name = collection_name
+
+    @property
+    def collection(self):
+        return current_app.config['MONGODB_DB'][self.collection_name]
+
+    def get(self, key):
+        """(value or None, current version) in a single round-trip"""
+        documents = {document['_id']: document
+                     for document in self.collection.find({'_id': {'$in': [VERSION_KEY, key]}})}
+        version = documents.get(VERSION_KEY, {}).get('version', 0)
+        entry = documents.get(key)
+        if entry is None or entry.get('version') != version or entry['expires_at'] <= datetime.utcnow():
+            return None, version
+        return entry['value'], version
+
+    def set(self, key, value, ttl, version):
+        self.collection.replace_one(
+            {'_id': key},
+            {'value': value, 'version': version, 'expires_at': datetime.utcnow() + timedelta(seconds=ttl)},
+            upsert=True
+        )
+
+    def bump(self):
+        self.collection.update_one({'_id': VERSION_KEY}, {'$inc': {'version': 1}}, upsert=True)
+
+    def clear(self):
+        self.collection.delete_many({})
+
+
+class ResponseCache:
+    """Versioned cache in front of a backend chosen at ``init_app``"""
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 30
+
+    def init_app(self, app):
+        name = app.config['RESPONSE_CACHE_BACKEND']
+        if name == 'memory':
+            self.backend = MemoryBackend(app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        elif name == 'mongo':
+            self.backend = MongoBackend()
+        elif name == 'none':
+            self.backend = None
+        else:
+            raise ValueError(f'Unknown RESPONSE_CACHE_BACKEND: {name}')
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def get(self, key):
+        """``(value, version)``; value is None on a miss, version None if the cache is unusable"""
+        if not self.enabled:
+            return None, None
+        try:
+            value, version = self.backend.get(key)
+        except Exception as e:
+            logger.error("Response cache read error: %s", e)
+            return None, None
+        metrics.cache_lookup('response', hit=value is not None)
+        return value, version
+
+    def set(self, key, value, version, ttl=None):
+        """Store ``value`` under the version returned by the ``get`` that missed.
+
+        An entry computed while a change was being made is then tagged with the
+        old version and never served after the bump.
+        """
+        if not self.enabled or version is None:
+            return
+        try:
+            self.backend.set(key, value, ttl or self.ttl, version)
+        except Exception as e:
+            logger.error("Response cache write error: %s", e)
+
+    def get_or_set(self, key, compute, ttl=None):
+        """Cached value for ``key``, computing and storing it on a miss"""
+        value, version = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value, version, ttl)
+        return value
+
+    def bump(self):
+        """Invalidate every entry (called whenever a model changes)"""
+        if not self.enabled:
+            return
+        try:
+            self.backend.bump()
+        except Exception as e:
+            logger.error("Response cache invalidation error: %s", e)
+
+    def invalidate_local(self):
+        """Drop this process's entries after a change made elsewhere.
+
+        A shared backend was already bumped by the process that made the change.
+        """
+        if self.enabled and not self.backend.shared:
+            self.backend.bump()
+
+
+def make_key(name, args=None):
+    """Cache key for a route: ``name`` plus the sorted, non-empty query arguments"""
+    args = request.args if args is None else args
+    items = sorted((key, value) for key in args for value in args.getlist(key) if value != '')
+    return f'{name}?{urlencode(items)}'
+
+
+def etag_for(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+def cached_response(name, bypass=None):
+    """Cache a view's successful JSON body; ``bypass()`` returning True skips the cache"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not response_cache.enabled or request.method != 'GET' or (bypass and bypass()):
+                return view(*args, **kwargs)
+
+            key = make_key(name)
+            entry, version = response_cache.get(key)
+            if entry is not None:
+                response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+                response.set_etag(entry['etag'])
+                response.headers['X-Cache'] = 'HIT'
+                return response.make_conditional(request)
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                body = response.get_data()
+                etag, _ = response.get_etag()
+                etag = etag or etag_for(body)
+                response_cache.set(key, {
+                    'body': body,
+                    'mimetype': response.mimetype,
+                    'etag': etag
+                }, version)
+                # Same validator on a miss as on a hit, so the first response is revalidatable too
+                response.set_etag(etag)
+                response.headers['X-Cache'] = 'MISS'
+                return response.make_conditional(request)
+            return response
+        return wrapper
+    return decorator
+
+
+response_cache = ResponseCache()
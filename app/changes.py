@@ -0,0 +1,120 @@
+"""Incremental change feed for the public catalog.
+
+Every write to a model document stamps it with ``updated_at`` and a
+``change_seq`` taken from a single counter document, so the sequence grows
+monotonically across all processes. A model that is deleted or made private
+leaves a tombstone in ``model_tombstones`` carrying its own sequence number.
+Reading the feed is two index range scans (``change_seq > since``) merged in
+sequence order; the last sequence returned is the token for the next call.
+
+Sequence numbers are reserved just before the write that uses them, so a slow
+writer can commit a lower number after a faster one. Entries younger than
+``CHANGES_SETTLE_SECONDS`` are held back so a token never skips past a write
+that is still in flight.
+"""
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from flask import current_app
+
+SEQUENCE_ID = 'model_changes'
+
+
+def _db():
+    return current_app.config['MONGODB_DB']
+
+
+def reserve(count=1, db=None):
+    """Reserve ``count`` consecutive sequence numbers; returns the first"""
+    from pymongo import ReturnDocument
+
+    db = db if db is not None else _db()
+    counter = db.sequences.find_one_and_update(
+        {'_id': SEQUENCE_ID},
+        {'$inc': {'value': count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['value'] - count + 1
+
+
+def stamps(count, db=None):
+    """``count`` fresh ``{'change_seq', 'updated_at'}`` dicts, in sequence order"""
+    if not count:
+        return []
+    first = reserve(count, db)
+    now = datetime.utcnow()
+    return [{'change_seq': first + offset, 'updated_at': now} for offset in range(count)]
+
+
+def stamp(db=None):
+    """Fields to ``$set`` on a model document that has just changed"""
+    return stamps(1, db)[0]
+
+
+def tombstone(model_id, user_id=None, db=None):
+    """Record that a model left the public catalog (deleted or made private)"""
+    db = db if db is not None else _db()
+    db.model_tombstones.insert_one(dict(stamp(db), model_id=str(model_id), user_id=user_id))
+
+
+def parse_token(token):
+    """Sequence number from a ``since`` token; raises ValueError if malformed"""
+    if token in (None, ''):
+        return 0
+    since = int(token)
+    if since < 0:
+        raise ValueError('negative token')
+    return since
+
+
+def read(since, limit, projection=None):
+    """Changes after ``since`` in sequence order.
+
+    Returns ``(entries, has_more)``; each entry is ``(seq, op, document)`` where
+    ``op`` is ``'upsert'`` (a public model document) or ``'delete'`` (a
+    tombstone).
+    """
+    db = _db()
+    if projection is not None:
+        projection = dict(projection, change_seq=1, updated_at=1)
+
+    models = list(db.models.find({'is_public': True, 'change_seq': {'$gt': since}}, projection)
+                  .sort('change_seq', 1)
+                  .limit(limit + 1))
+    tombstones = list(db.model_tombstones.find({'change_seq': {'$gt': since}})
+                      .sort('change_seq', 1)
+                      .limit(limit + 1))
+
+    entries = sorted(
+        [(document['change_seq'], 'upsert', document) for document in models]
+        + [(document['change_seq'], 'delete', document) for document in tombstones],
+        key=lambda entry: entry[0]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Stop at the first entry that may still have an older write in flight
+    settled_before = datetime.utcnow() - timedelta(seconds=current_app.config['CHANGES_SETTLE_SECONDS'])
+    for index, (_, _, document) in enumerate(entries):
+        if document['updated_at'] > settled_before:
+            return entries[:index], True
+    return entries, has_more
+
+
+def backfill(batch_size=500):
+    """Stamp model documents written before the change feed existed"""
+    from pymongo import UpdateOne
+
+    db = _db()
+    stamped = 0
+    while True:
+        ids = [document['_id'] for document in
+               db.models.find({'change_seq': {'$exists': False}}, {'_id': 1}).limit(batch_size)]
+        if not ids:
+            return stamped
+        db.models.bulk_write([
+            UpdateOne({'_id': ObjectId(model_id)}, {'$set': fields})
+            for model_id, fields in zip(ids, stamps(len(ids), db))
+        ], ordered=False)
+        stamped += len(ids)
@@ -0,0 +1,241 @@
+"""Write-behind buffering of download counters.
+
+Downloads only bump an in-process counter; a background thread coalesces the
+pending increments per model and writes them with one unordered ``bulk_write``
+every ``DOWNLOAD_FLUSH_INTERVAL`` seconds, or sooner once
+``DOWNLOAD_FLUSH_THRESHOLD`` increments are pending. The owners' per-user
+download totals and the platform total are updated in the same flush.
+Remaining counts are flushed at interpreter shutdown.
+
+A flush has three stages - models, owners, platform total - and a failure
+re-queues only what that stage did not write, so a retry never applies an
+increment twice. Increments for models deleted before the flush are dropped
+everywhere, since the reconciled totals no longer include those models.
+
+With ``DOWNLOAD_FLUSH_PER_REQUEST`` (the default on Vercel, where a frozen or
+recycled function would never run the background thread or atexit) pending
+counts are written at the end of every request instead.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from bson.objectid import ObjectId
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadCounterBuffer:
+    def __init__(self, app=None):
+        self.app = None
+        self.flush_interval = 5.0
+        self.flush_threshold = 100
+        self.per_request = False
+        self._reset()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the buffer to an app and register the shutdown flush"""
+        if self.app is None:
+            atexit.register(self.flush)
+        self.app = app
+        self.flush_interval = app.config.get('DOWNLOAD_FLUSH_INTERVAL', self.flush_interval)
+        self.flush_threshold = app.config.get('DOWNLOAD_FLUSH_THRESHOLD', self.flush_threshold)
+        self.per_request = app.config.get('DOWNLOAD_FLUSH_PER_REQUEST', self.per_request)
+        if self.per_request:
+            app.teardown_request(self._flush_after_request)
+        app.extensions['download_counter'] = self
+
+    def _reset(self):
+        # Model increments and their owners, plus owner/platform increments
+        # whose model stage already succeeded but whose own stage failed
+        self._pending = Counter()
+        self._owners = {}
+        self._pending_owner_stats = Counter()
+        self._pending_platform = 0
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def increment(self, model_id, amount=1, owner_id=None):
+        """Record a download without touching MongoDB"""
+        with self._lock:
+            self._pending[model_id] += amount
+            if owner_id:
+                self._owners[model_id] = owner_id
+            self._pending_total += amount
+            threshold_reached = self._pending_total >= self.flush_threshold
+
+        if self.per_request:
+            return
+        self._ensure_thread()
+        if threshold_reached:
+            self._wakeup.set()
+
+    def pending(self, model_id):
+        """Increments for a model that have not been written yet"""
+        with self._lock:
+            return self._pending.get(model_id, 0)
+
+    def flush(self):
+        """Write pending increments; returns the number of models updated"""
+        if self.app is None:
+            return 0
+
+        with self._flush_lock:
+            with self._lock:
+                batch, owners = self._pending, self._owners
+                owner_stats, platform = self._pending_owner_stats, self._pending_platform
+                self._pending = Counter()
+                self._owners = {}
+                self._pending_owner_stats = Counter()
+                self._pending_platform = 0
+                self._pending_total = 0
+
+            if not batch and not owner_stats and not platform:
+                return 0
+
+            with self.app.app_context():
+                db = self.app.config['MONGODB_DB']
+                applied, failed = self._flush_models(db, batch)
+                if failed:
+                    self._requeue(batch={model_id: batch[model_id] for model_id in failed},
+                                  owners={model_id: owners[model_id] for model_id in failed if model_id in owners})
+
+                for model_id, count in applied.items():
+                    if model_id in owners:
+                        owner_stats[owners[model_id]] += count
+                    platform += count
+
+                failed_owners = self._flush_owners(db, owner_stats)
+                if failed_owners:
+                    self._requeue(owner_stats={owner_id: owner_stats[owner_id] for owner_id in failed_owners})
+
+                from app import stats
+                if platform and not stats.bump(total_downloads=platform):
+                    self._requeue(platform=platform)
+
+            return len(applied)
+
+    def _flush_models(self, db, batch):
+        """(applied increments, failed model ids) of the models stage"""
+        if not batch:
+            return {}, []
+
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+
+        try:
+            candidates = [ObjectId(model_id) for model_id in batch if ObjectId.is_valid(model_id)]
+            existing = {str(document['_id']) for document in
+                        db.models.find({'_id': {'$in': candidates}}, {'_id': 1})}
+        except Exception as e:
+            logger.error("Download counter flush error: %s", e)
+            return {}, list(batch)
+
+        # Downloads of models deleted since are dropped, not retried forever
+        model_ids = [model_id for model_id in batch if model_id in existing]
+        if not model_ids:
+            return {}, []
+
+        from app import changes
+
+        try:
+            operations = [
+                UpdateOne(
+                    {'_id': ObjectId(model_id)},
+                    {'$inc': {'download_count': batch[model_id]}, '$set': fields}
+                )
+                for model_id, fields in zip(model_ids, changes.stamps(len(model_ids), db))
+            ]
+            db.models.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: every operation not listed in writeErrors was applied
+            failed = {model_ids[error['index']] for error in e.details.get('writeErrors', [])}
+            logger.error("Download counter flush: %d of %d model updates failed (%d modified)",
+                         len(failed), len(model_ids), e.details.get('nModified', 0))
+            return {model_id: batch[model_id] for model_id in model_ids if model_id not in failed}, list(failed)
+        except Exception as e:
+            logger.error("Download counter flush error: %s", e)
+            return {}, model_ids
+
+        return {model_id: batch[model_id] for model_id in model_ids}, []
+
+    def _flush_owners(self, db, owner_stats):
+        """Owner ids whose ``stats.total_downloads`` update failed"""
+        if not owner_stats:
+            return []
+
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+
+        owner_ids = [owner_id for owner_id in owner_stats if ObjectId.is_valid(owner_id)]
+        if not owner_ids:
+            return []
+        try:
+            # Applied before a backfill too; see User.get_stats
+            db.users.bulk_write([
+                UpdateOne(
+                    {'_id': ObjectId(owner_id)},
+                    {'$inc': {'stats.total_downloads': owner_stats[owner_id]}}
+                )
+                for owner_id in owner_ids
+            ], ordered=False)
+        except BulkWriteError as e:
+            logger.error("Download counter flush: owner stats update failed: %s", e)
+            return [owner_ids[error['index']] for error in e.details.get('writeErrors', [])]
+        except Exception as e:
+            logger.error("Download counter flush: owner stats update failed: %s", e)
+            return owner_ids
+        return []
+
+    def _requeue(self, batch=None, owners=None, owner_stats=None, platform=0):
+        """Put back the part of a flush that was not written, for the next flush"""
+        with self._lock:
+            if batch:
+                self._pending.update(batch)
+                self._pending_total += sum(batch.values())
+                for model_id, owner_id in (owners or {}).items():
+                    self._owners.setdefault(model_id, owner_id)
+            if owner_stats:
+                self._pending_owner_stats.update(owner_stats)
+            self._pending_platform += platform
+
+    def _flush_after_request(self, exc=None):
+        if self._pending or self._pending_owner_stats or self._pending_platform:
+            self.flush()
+
+    def after_fork(self):
+        """Start clean in a forked worker: fresh locks, no inherited counts"""
+        self._reset()
+
+    def _ensure_thread(self):
+        # Threads do not survive fork(), so each process starts its own flusher
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='download-counter-flush', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+download_counter = DownloadCounterBuffer()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=download_counter.after_fork)
@@ -0,0 +1,161 @@
+"""MongoDB connection handling.
+
+``MongoConnection`` creates the PyMongo client, database and GridFS handles on
+first use, so importing the app and calling ``create_app()`` does no network
+I/O (not even the SRV lookup of a ``mongodb+srv://`` URI) and does not import
+PyMongo itself. ``app.config['MONGODB_DB']`` and friends hold proxies that
+resolve through the connection, so call sites keep using them unchanged.
+
+Callbacks in ``on_connect`` run once each time a client is created, which is
+how lazily initialized deployments build their indexes on first use.
+
+PyMongo clients are not fork-safe. Every connection forgets its client in a
+forked child, so a prefork server that preloads the app gets a fresh client
+(and pool) per worker on first use.
+"""
+import os
+import threading
+import weakref
+
+_connections = weakref.WeakSet()
+
+
+class MongoConnection:
+    def __init__(self, uri, db_name, listener_factories=(), on_connect=(), **client_options):
+        self.uri = uri
+        self.db_name = db_name
+        self.client_options = client_options
+        # Called when the client is created, so PyMongo is still imported lazily
+        self.listener_factories = list(listener_factories)
+        self.on_connect = list(on_connect)
+        self._client = None
+        self._db = None
+        self._fs = None
+        self._lock = threading.Lock()
+        _connections.add(self)
+
+    @property
+    def connected(self):
+        return self._client is not None
+
+    def _connect(self):
+        with self._lock:
+            if self._client is not None:
+                return
+            from pymongo import MongoClient
+            import gridfs
+
+            options = dict(self.client_options)
+            listeners = []
+            for factory in self.listener_factories:
+                created = factory()
+                listeners.extend(created if isinstance(created, (list, tuple)) else [created])
+            if listeners:
+                options['event_listeners'] = listeners
+            client = MongoClient(self.uri, **options)
+            self._db = client[self.db_name]
+            self._fs = gridfs.GridFS(self._db)
+            self._client = client
+        # Outside the lock: callbacks use the handles themselves
+        for callback in self.on_connect:
+            callback(self)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._connect()
+        return self._client
+
+    @property
+    def db(self):
+        if self._client is None:
+            self._connect()
+        return self._db
+
+    @property
+    def fs(self):
+        if self._client is None:
+            self._connect()
+        return self._fs
+
+    def ping(self):
+        self.client.admin.command('ping')
+
+    def reset(self):
+        """Forget the current client so the next access creates a new one"""
+        with self._lock:
+            self._client = None
+            self._db = None
+            self._fs = None
+
+    def after_fork(self):
+        # The parent's client (and possibly its lock) must not be used here
+        self._lock = threading.Lock()
+        self.reset()
+
+
+def _reset_connections_after_fork():
+    for connection in list(_connections):
+        connection.after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_connections_after_fork)
+
+
+class LazyHandle:
+    """Forward attribute and item access to ``getattr(connection, name)``"""
+
+    def __init__(self, connection, name):
+        object.__setattr__(self, '_connection', connection)
+        object.__setattr__(self, '_name', name)
+
+    def _resolve(self):
+        return getattr(self._connection, self._name)
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __getitem__(self, key):
+        return self._resolve()[key]
+
+    def __repr__(self):
+        state = 'connected' if self._connection.connected else 'not connected'
+        return f'<Lazy {self._name} {self._connection.db_name!r} ({state})>'
+
+
+# Bump whenever ensure_indexes changes, so lazy deployments build the new indexes
+INDEX_VERSION = 1
+INDEX_MARKER = {'_id': 'indexes'}
+
+
+def indexes_current(db):
+    """True if ``ensure_indexes`` already ran for this ``INDEX_VERSION``"""
+    marker = db.app_meta.find_one(INDEX_MARKER)
+    return bool(marker) and marker.get('version', 0) >= INDEX_VERSION
+
+
+def ensure_indexes(db):
+    """Create the indexes the app relies on (idempotent)"""
+    # User indexes
+    db.users.create_index("username", unique=True)
+    db.users.create_index("email", unique=True)
+
+    # Model indexes
+    db.models.create_index("user_id")
+    db.models.create_index("is_public")
+    db.models.create_index("upload_date")
+    db.models.create_index([("is_public", 1), ("upload_date", -1)])
+    db.models.create_index([("name", "text"), ("description", "text")])
+
+    # Change feed: public models and tombstones scanned by sequence
+    db.models.create_index([("is_public", 1), ("change_seq", 1)])
+    db.model_tombstones.create_index("change_seq")
+
+    # API token records listed per user
+    db.api_tokens.create_index("user_id")
+
+    # Shared response cache entries expire on their own
+    db.response_cache.create_index("expires_at", expireAfterSeconds=0)
+
+    db.app_meta.update_one(INDEX_MARKER, {'$set': {'version': INDEX_VERSION}}, upsert=True)
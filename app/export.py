@@ -0,0 +1,116 @@
+"""Streaming exports: ZIP archives of model files and NDJSON metadata dumps.
+
+GridFS chunks are written straight into a ``zipfile`` opened on a write-only
+buffer that is drained after every chunk, so an archive of any size is sent
+with memory bounded by a single GridFS chunk. Formats that are already
+compressed are stored rather than deflated.
+
+NDJSON dumps read one cursor batch at a time and emit a line per document, so
+memory stays bounded by the batch size however large the catalog is.
+"""
+import logging
+import zipfile
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+from bson.objectid import ObjectId
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app import serializers
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+# Binary glTF and FBX embed their own compression; deflating them again only costs CPU
+STORED_FORMATS = {'glb', 'fbx'}
+
+
+class _StreamBuffer:
+    """Minimal write-only file object that zipfile can stream into"""
+
+    def __init__(self):
+        self._chunks = deque()
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        while self._chunks:
+            yield self._chunks.popleft()
+
+
+def _archive_name(model, used_names):
+    base = secure_filename(model.original_filename or '') or f'{model.id}.{model.file_format}'
+    name = base
+    stem, dot, extension = base.rpartition('.')
+    counter = 1
+    while name in used_names:
+        counter += 1
+        name = f'{stem}-{counter}{dot}{extension}' if dot else f'{base}-{counter}'
+    used_names.add(name)
+    return name
+
+
+def stream_zip(models, prefix=''):
+    """Yield a ZIP archive of the given models' files, chunk by chunk"""
+    fs = current_app.config['GRIDFS']
+    buffer = _StreamBuffer()
+    used_names = set()
+
+    with zipfile.ZipFile(buffer, mode='w', allowZip64=True) as archive:
+        for model in models:
+            if not model.gridfs_file_id:
+                continue
+            try:
+                grid_out = fs.get(ObjectId(model.gridfs_file_id))
+            except Exception as e:
+                logger.warning("Export skipped %s: %s", model.id, e)
+                continue
+
+            info = zipfile.ZipInfo(
+                prefix + _archive_name(model, used_names),
+                date_time=(model.upload_date or datetime.utcnow()).timetuple()[:6]
+            )
+            if (model.file_format or '').lower() in STORED_FORMATS:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            info.file_size = grid_out.length
+
+            with archive.open(info, mode='w', force_zip64=True) as entry:
+                while True:
+                    chunk = grid_out.readchunk()
+                    if not chunk:
+                        break
+                    entry.write(chunk)
+                    yield from buffer.drain()
+
+            yield from buffer.drain()
+
+    # Central directory
+    yield from buffer.drain()
+
+
+def stream_ndjson(documents, fields, batch_size=500):
+    """Yield newline-delimited JSON for model documents, one chunk per batch"""
+    documents = iter(documents)
+    while True:
+        batch = list(islice(documents, batch_size))
+        if not batch:
+            break
+        owners = User.get_usernames(document.get('user_id') for document in batch) if 'owner' in fields else None
+        yield b''.join(
+            serializers.dumps(serializers.serialize_model(document, fields, owners)) + b'\n'
+            for document in batch
+        )
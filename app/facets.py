@@ -0,0 +1,246 @@
+"""Faceted browsing of public models.
+
+A browse request runs one ``$facet`` aggregation that returns the page of
+items, the total count and the counts for every facet together. Facet counts
+for the unfiltered catalog are cached in-process for ``FACET_CACHE_TTL``
+seconds and dropped whenever a model is saved or deleted.
+
+A search narrows the aggregation to the top ``MAX_SEARCH_RESULTS`` ranked ids,
+so the ``$in`` list stays small; totals and facet counts of a search cover
+those hits. The aggregation returns only the ids that pass the filters, and the
+page is cut from the ranking in Python and fetched by id.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from flask import current_app
+
+from app import metrics
+
+# (key, label, lower bound inclusive, upper bound exclusive) in bytes
+SIZE_BUCKETS = [
+    ('small', 'Under 100 KB', 0, 100 * 1024),
+    ('medium', '100 KB - 1 MB', 100 * 1024, 1024 * 1024),
+    ('large', '1 - 4 MB', 1024 * 1024, 4 * 1024 * 1024),
+    ('huge', 'Over 4 MB', 4 * 1024 * 1024, None),
+]
+
+# (key, label, age); periods are cumulative ("uploaded within the last ...")
+UPLOAD_PERIODS = [
+    ('day', 'Last 24 hours', timedelta(days=1)),
+    ('week', 'Last 7 days', timedelta(days=7)),
+    ('month', 'Last 30 days', timedelta(days=30)),
+    ('year', 'Last year', timedelta(days=365)),
+]
+
+MAX_OWNER_FACETS = 10
+MAX_SEARCH_RESULTS = 1000
+FILTER_KEYS = ('format', 'size', 'period', 'owner')
+
+_cache = {'value': None, 'expires': 0.0}
+_cache_lock = threading.Lock()
+
+
+def invalidate_cache():
+    """Drop cached facet counts (called on model save/delete)"""
+    with _cache_lock:
+        _cache['value'] = None
+        _cache['expires'] = 0.0
+
+
+def parse_filters(args):
+    """Extract recognised facet filters from request args"""
+    filters = {}
+    for key in FILTER_KEYS:
+        value = (args.get(key) or '').strip()
+        if value:
+            filters[key] = value.lower() if key == 'format' else value
+    return filters
+
+
+def build_match(filters, ranked_ids=None):
+    """Translate facet filters into a $match document"""
+    match = {'is_public': True}
+
+    if 'format' in filters:
+        match['file_format'] = filters['format']
+
+    size = next((bucket for bucket in SIZE_BUCKETS if bucket[0] == filters.get('size')), None)
+    if size:
+        _, _, lower, upper = size
+        match['file_size'] = {'$gte': lower}
+        if upper is not None:
+            match['file_size']['$lt'] = upper
+
+    period = next((item for item in UPLOAD_PERIODS if item[0] == filters.get('period')), None)
+    if period:
+        match['upload_date'] = {'$gte': datetime.utcnow() - period[2]}
+
+    if 'owner' in filters:
+        match['user_id'] = filters['owner']
+
+    if ranked_ids is not None:
+        match['_id'] = {'$in': [ObjectId(model_id) for model_id in ranked_ids]}
+
+    return match
+
+
+def _facet_stages(now):
+    # Sizes at or above the last boundary fall into the open-ended default bucket
+    size_boundaries = [lower for _, _, lower, _ in SIZE_BUCKETS]
+    period_boundaries = sorted(now - age for _, _, age in UPLOAD_PERIODS)
+    period_boundaries.append(now + timedelta(days=1))
+
+    return {
+        'formats': [
+            {'$group': {'_id': '$file_format', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1, '_id': 1}}
+        ],
+        'sizes': [
+            {'$bucket': {
+                'groupBy': '$file_size',
+                'boundaries': size_boundaries,
+                'default': 'huge',
+                'output': {'count': {'$sum': 1}}
+            }}
+        ],
+        'periods': [
+            {'$bucket': {
+                'groupBy': '$upload_date',
+                'boundaries': period_boundaries,
+                'default': 'older',
+                'output': {'count': {'$sum': 1}}
+            }}
+        ],
+        'owners': [
+            {'$group': {'_id': '$user_id', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1, '_id': 1}},
+            {'$limit': MAX_OWNER_FACETS}
+        ]
+    }
+
+
+def _parse_facets(result, now):
+    # $bucket ids are the lower boundaries, plus the 'huge' default bucket
+    bucket_keys = {lower: key for key, _, lower, _ in SIZE_BUCKETS}
+    bucket_keys['huge'] = 'huge'
+    size_counts = {}
+    for row in result.get('sizes', []):
+        key = bucket_keys.get(row['_id'])
+        if key:
+            size_counts[key] = size_counts.get(key, 0) + row['count']
+
+    # $bucket gives disjoint age bands; periods are cumulative
+    bands = {}
+    for row in result.get('periods', []):
+        if row['_id'] != 'older':
+            bands[row['_id']] = row['count']
+    period_counts = {}
+    for key, _, age in UPLOAD_PERIODS:
+        cutoff = now - age
+        period_counts[key] = sum(count for start, count in bands.items() if start >= cutoff)
+
+    return {
+        'format': [
+            {'value': row['_id'], 'label': (row['_id'] or 'unknown').upper(), 'count': row['count']}
+            for row in result.get('formats', [])
+        ],
+        'size': [
+            {'value': key, 'label': label, 'count': size_counts[key]}
+            for key, label, _, _ in SIZE_BUCKETS if size_counts.get(key)
+        ],
+        'period': [
+            {'value': key, 'label': label, 'count': period_counts[key]}
+            for key, label, _ in UPLOAD_PERIODS if period_counts.get(key)
+        ],
+        'owner': [
+            {'value': row['_id'], 'label': row['_id'], 'count': row['count']}
+            for row in result.get('owners', [])
+        ]
+    }
+
+
+def _label_owners(db, facets, documents):
+    """Resolve owner usernames for facets and items with one $in query"""
+    user_ids = {entry['value'] for entry in facets['owner']}
+    user_ids.update(document.get('user_id') for document in documents)
+    object_ids = [ObjectId(user_id) for user_id in user_ids if user_id and ObjectId.is_valid(user_id)]
+
+    usernames = {}
+    if object_ids:
+        for user in db.users.find({'_id': {'$in': object_ids}}, {'username': 1}):
+            usernames[str(user['_id'])] = user['username']
+
+    for entry in facets['owner']:
+        entry['label'] = usernames.get(entry['value'], 'Unknown')
+    return usernames
+
+
+def _ranked_page(db, ranked_ids, matched, page, per_page):
+    """Documents of one page of ``ranked_ids``, counting only the ``matched`` ones"""
+    matched_ids = {str(document['_id']) for document in matched}
+    start = (page - 1) * per_page
+    page_ids = [model_id for model_id in ranked_ids if model_id in matched_ids][start:start + per_page]
+    if not page_ids:
+        return []
+    by_id = {
+        str(document['_id']): document
+        for document in db.models.find({'_id': {'$in': [ObjectId(model_id) for model_id in page_ids]}})
+    }
+    return [by_id[model_id] for model_id in page_ids if model_id in by_id]
+
+
+def browse(filters, page=1, per_page=12, ranked_ids=None):
+    """Run the faceted browse aggregation.
+
+    Returns ``(documents, total, facets, usernames)``. When ``ranked_ids`` is
+    given (a search), only those models are considered and items keep that order.
+    """
+    db = current_app.config['MONGODB_DB']
+    now = datetime.utcnow().replace(microsecond=0)
+
+    use_cache = not filters and ranked_ids is None
+    cached_facets = None
+    if use_cache:
+        with _cache_lock:
+            if _cache['value'] is not None and _cache['expires'] > time.monotonic():
+                cached_facets = _cache['value']
+        metrics.cache_lookup('facets', hit=cached_facets is not None)
+
+    if ranked_ids is not None:
+        # Only the matching ids; relevance order and the page are applied below
+        ranked_ids = ranked_ids[:MAX_SEARCH_RESULTS]
+        item_stages = [{'$project': {'_id': 1}}]
+    else:
+        item_stages = [{'$sort': {'upload_date': -1}}, {'$skip': (page - 1) * per_page}, {'$limit': per_page}]
+
+    facet_stages = {'items': item_stages, 'total': [{'$count': 'count'}]}
+    if cached_facets is None:
+        facet_stages.update(_facet_stages(now))
+
+    pipeline = [
+        {'$match': build_match(filters, ranked_ids)},
+        {'$facet': facet_stages}
+    ]
+    result = next(iter(db.models.aggregate(pipeline)), {})
+
+    documents = result.get('items', [])
+    total = result['total'][0]['count'] if result.get('total') else 0
+    if ranked_ids is not None:
+        documents = _ranked_page(db, ranked_ids, documents, page, per_page)
+
+    if cached_facets is None:
+        facets = _parse_facets(result, now)
+    else:
+        facets = {key: [dict(entry) for entry in entries] for key, entries in cached_facets.items()}
+
+    usernames = _label_owners(db, facets, documents)
+
+    if use_cache and cached_facets is None:
+        with _cache_lock:
+            _cache['value'] = facets
+            _cache['expires'] = time.monotonic() + current_app.config.get('FACET_CACHE_TTL', 60)
+
+    return documents, total, facets, usernames
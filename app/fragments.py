@@ -0,0 +1,81 @@
+"""Cached rendering of page fragments and whole anonymous pages.
+
+Model cards are rendered once per model version: the cache key includes the
+model's ``change_seq``, which every save, visibility change and download flush
+advances, so an edited model simply misses and re-renders, and the expiry of
+the signed preview URL the card embeds. Entries for old versions fall out of
+the LRU.
+
+Anonymous visitors all see the same homepage and browse pages, so those are
+cached whole in the response cache, keyed by their query string and dropped on
+the same version bump as the listing data.
+"""
+from functools import wraps
+
+from flask import current_app, g, render_template, session
+from flask_login import current_user
+from markupsafe import Markup
+
+from app import metrics, signed_urls
+from app.cache import MemoryBackend, make_key, response_cache
+
+# variant -> (viewer element id prefix, preview loader function in the page)
+CARD_VARIANTS = {
+    'browse': ('viewer-', 'load3DModel'),
+    'recent': ('viewer-recent-', 'loadRecentModel'),
+}
+
+_fragments = MemoryBackend()
+
+
+def init_app(app):
+    _fragments.max_entries = app.config['FRAGMENT_CACHE_MAX_ENTRIES']
+    _fragments.clear()
+    app.jinja_env.globals['model_card'] = model_card
+
+
+def model_card(model, variant='browse'):
+    """Rendered card HTML for a model, from the fragment cache when possible"""
+    viewer_prefix, load_function = CARD_VARIANTS[variant]
+    # The signed preview URL in the card changes with its expiry bucket
+    key = (f'{variant}:{model.id}:{model.change_seq}:{getattr(model, "owner_username", None)}'
+           f':{signed_urls.expiry()}')
+
+    html, version = _fragments.get(key)
+    metrics.cache_lookup('fragment', hit=html is not None)
+    if html is None:
+        html = render_template('_model_card.html', model=model,
+                               viewer_prefix=viewer_prefix, load_function=load_function)
+        _fragments.set(key, html, current_app.config['FRAGMENT_CACHE_TTL'], version)
+    return Markup(html)
+
+
+def skip_page_cache():
+    """Keep the current response out of the page cache (e.g. an error fallback)"""
+    g.skip_page_cache = True
+
+
+def cached_page(name):
+    """Serve a page to anonymous visitors from the response cache"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Logged-in pages and pending flash messages are per visitor
+            if current_user.is_authenticated or session.get('_flashes') or not response_cache.enabled:
+                return view(*args, **kwargs)
+
+            key = make_key(name)
+            entry, version = response_cache.get(key)
+            if entry is not None:
+                response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+                response.headers['X-Cache'] = 'HIT'
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                cacheable = not (g.get('skip_page_cache') or session.modified)
+                if response.status_code == 200 and cacheable:
+                    response_cache.set(key, {'body': response.get_data(), 'mimetype': response.mimetype}, version)
+                    response.headers['X-Cache'] = 'MISS'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
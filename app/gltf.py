@@ -0,0 +1,174 @@
+"""Pack a glTF asset and its external resources into a single GLB.
+
+Buffers and images referenced by URI (relative files or base64 ``data:`` URIs)
+are copied into one binary chunk. Every original buffer and image starts on a
+4-byte boundary, and bufferViews are rebased onto the packed buffer, so the
+viewer gets one self-contained binary instead of several fetches.
+
+Uploads are untrusted, so the parts of the document the packer touches are
+validated first and any malformed input surfaces as ``GltfPackError``.
+"""
+import base64
+import binascii
+import json
+import struct
+from urllib.parse import unquote
+
+GLB_MAGIC = b'glTF'
+GLB_VERSION = 2
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+IMAGE_MIME_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'ktx2': 'image/ktx2',
+}
+
+
+class GltfPackError(ValueError):
+    pass
+
+
+def _pad(length, alignment=4):
+    return (alignment - length % alignment) % alignment
+
+
+def _load_uri(uri, resolve):
+    """Return (bytes, mime type or None) for a buffer/image URI"""
+    if uri.startswith('data:'):
+        header, _, payload = uri.partition(',')
+        mime_type = header[5:].split(';')[0] or None
+        if ';base64' not in header:
+            return unquote(payload).encode('latin-1'), mime_type
+        return base64.b64decode(payload, validate=True), mime_type
+
+    path = unquote(uri)
+    data = resolve(path)
+    if data is None:
+        raise GltfPackError(f'Missing companion file: {path}')
+    extension = path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+    return data, IMAGE_MIME_TYPES.get(extension)
+
+
+def _items(gltf, key):
+    """``gltf[key]`` checked to be a list of objects (empty if absent)"""
+    items = gltf.get(key, [])
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise GltfPackError(f'glTF "{key}" must be a list of objects')
+    return items
+
+
+def _index(value, count, what):
+    # bool is an int subclass, and negative indexes would silently wrap around
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value < count:
+        raise GltfPackError(f'Invalid {what} index: {value!r}')
+    return value
+
+
+def _length(value, what):
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise GltfPackError(f'Invalid {what}: {value!r}')
+    return value
+
+
+def _validate(gltf):
+    if not isinstance(gltf, dict):
+        raise GltfPackError('glTF JSON must be an object')
+    for key in ('buffers', 'bufferViews', 'images'):
+        _items(gltf, key)
+    for item in gltf.get('buffers', []) + gltf.get('images', []):
+        if not isinstance(item.get('uri', ''), str):
+            raise GltfPackError('glTF URIs must be strings')
+
+
+def external_uris(gltf):
+    """Relative (non data:) URIs a glTF document depends on"""
+    _validate(gltf)
+    uris = []
+    for item in gltf.get('buffers', []) + gltf.get('images', []):
+        uri = item.get('uri')
+        if uri and not uri.startswith('data:'):
+            uris.append(unquote(uri))
+    return uris
+
+
+def pack_glb(gltf_bytes, resolve):
+    """Build GLB bytes from glTF JSON; ``resolve(path)`` returns companion file bytes or None"""
+    try:
+        gltf = json.loads(gltf_bytes.decode('utf-8-sig'))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise GltfPackError(f'Invalid glTF JSON: {e}')
+
+    _validate(gltf)
+    try:
+        return _pack(gltf, resolve)
+    except GltfPackError:
+        raise
+    except (KeyError, IndexError, TypeError, AttributeError, binascii.Error, ValueError) as e:
+        raise GltfPackError(f'Malformed glTF: {e}')
+
+
+def _pack(gltf, resolve):
+    binary = bytearray()
+
+    def append(data):
+        binary.extend(b'\x00' * _pad(len(binary)))
+        offset = len(binary)
+        binary.extend(data)
+        return offset
+
+    # Buffers: concatenate, remembering where each one starts
+    buffer_offsets = []
+    for buffer in gltf.get('buffers', []):
+        uri = buffer.get('uri')
+        if uri is None:
+            raise GltfPackError('glTF buffer without a URI cannot be packed')
+        data, _ = _load_uri(uri, resolve)
+        byte_length = _length(buffer.get('byteLength', len(data)), 'buffer byteLength')
+        if len(data) < byte_length:
+            raise GltfPackError(f'glTF buffer {uri[:64]} has {len(data)} of its {byte_length} bytes')
+        buffer_offsets.append(append(data[:byte_length]))
+
+    for view in gltf.get('bufferViews', []):
+        if 'buffer' not in view:
+            raise GltfPackError('glTF bufferView without a buffer')
+        buffer_index = _index(view['buffer'], len(buffer_offsets), 'buffer')
+        byte_offset = _length(view.get('byteOffset', 0), 'bufferView byteOffset')
+        view['byteOffset'] = buffer_offsets[buffer_index] + byte_offset
+        view['buffer'] = 0
+
+    # Images referenced by URI become bufferViews of the packed buffer
+    for image in gltf.get('images', []):
+        uri = image.pop('uri', None)
+        if uri is None:
+            continue
+        data, mime_type = _load_uri(uri, resolve)
+        gltf.setdefault('bufferViews', []).append({
+            'buffer': 0,
+            'byteOffset': append(data),
+            'byteLength': len(data)
+        })
+        image['bufferView'] = len(gltf['bufferViews']) - 1
+        image['mimeType'] = image.get('mimeType') or mime_type or 'image/png'
+
+    if binary:
+        gltf['buffers'] = [{'byteLength': len(binary)}]
+        binary.extend(b'\x00' * _pad(len(binary)))
+    else:
+        gltf.pop('buffers', None)
+
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_chunk += b' ' * _pad(len(json_chunk))
+
+    total_length = 12 + 8 + len(json_chunk) + (8 + len(binary) if binary else 0)
+    parts = [
+        GLB_MAGIC + struct.pack('<II', GLB_VERSION, total_length),
+        struct.pack('<II', len(json_chunk), CHUNK_JSON),
+        json_chunk
+    ]
+    if binary:
+        parts += [struct.pack('<II', len(binary), CHUNK_BIN), bytes(binary)]
+    return b''.join(parts)
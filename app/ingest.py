@@ -0,0 +1,325 @@
+"""Bulk ingest of model files.
+
+A bulk upload may carry several files, ZIP archives, or both. Archive entries
+are read straight from the archive without being extracted to disk. Each entry
+is checked by extension, size and file signature, then streamed into GridFS by
+a bounded thread pool. The model documents for everything that was stored are
+created with one ``insert_many``.
+
+A ``.gltf`` file uploaded together with its companions (``.bin`` buffers and
+textures, in the same archive or the same request) is packed into a single GLB
+before it is stored; the companions are consumed rather than stored separately,
+and are reported as packed only once the GLB itself has been stored.
+
+The bulk endpoint accepts request bodies up to ``BULK_MAX_REQUEST_SIZE`` rather
+than the global ``MAX_CONTENT_LENGTH``. On Vercel both are capped by the
+platform's 4.5 MB body limit, so there ``BULK_MAX_FILE_SIZE`` only matters for
+archive members, which are checked by their uncompressed size.
+"""
+import io
+import logging
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import Request, current_app
+from werkzeug.utils import secure_filename
+
+from app import metrics
+from app.gltf import GltfPackError, pack_glb
+from app.models import Model3D
+
+logger = logging.getLogger(__name__)
+
+GRIDFS_WRITE_SIZE = 255 * 1024
+BULK_ENDPOINT = 'api.upload_bulk'
+
+
+class UploadRequest(Request):
+    """Request class that lets the bulk upload endpoint take larger bodies"""
+
+    @property
+    def max_content_length(self):
+        # The URL is matched before the body is parsed, so the endpoint is known here
+        if self.endpoint == BULK_ENDPOINT:
+            return current_app.config['BULK_MAX_REQUEST_SIZE']
+        return super().max_content_length
+
+# Leading bytes every file of a format must start with (after whitespace for text)
+SIGNATURES = {
+    'glb': (b'glTF',),
+    'gltf': (b'{',),
+    'ply': (b'ply',),
+    'fbx': (b'Kaydara FBX Binary', b';'),
+    '3ds': (b'\x4d\x4d',),
+}
+
+
+class IngestEntry:
+    """A single file to ingest, either an uploaded file or an archive member"""
+
+    def __init__(self, filename, size, opener, source=None, path=None):
+        self.filename = filename
+        self.size = size
+        self.opener = opener
+        self.source = source
+        self.path = path or filename
+        self.error = None
+        # Files packed into this one (a GLB built from a glTF)
+        self.companions = []
+
+    @property
+    def extension(self):
+        name = secure_filename(self.filename)
+        return name.rsplit('.', 1)[1].lower() if '.' in name else ''
+
+    def open(self):
+        return self.opener()
+
+
+def _uploaded_entry(file):
+    def opener():
+        file.stream.seek(0)
+        return file.stream
+
+    file.stream.seek(0, os.SEEK_END)
+    size = file.stream.tell()
+    file.stream.seek(0)
+    return IngestEntry(file.filename, size, opener)
+
+
+def _archive_entries(file):
+    archive = zipfile.ZipFile(file.stream)
+    entries = []
+    for info in archive.infolist():
+        basename = info.filename.rsplit('/', 1)[-1]
+        if info.is_dir() or not basename or basename.startswith('.') or info.filename.startswith('__MACOSX/'):
+            continue
+        entries.append(IngestEntry(
+            basename,
+            info.file_size,
+            lambda info=info: archive.open(info),
+            source=file.filename,
+            path=info.filename
+        ))
+    return entries
+
+
+def collect_entries(files):
+    """Expand uploaded files (and any ZIP archives among them) into entries"""
+    entries = []
+    for file in files:
+        if not file or not file.filename:
+            continue
+        if file.filename.lower().endswith('.zip'):
+            entries.extend(_archive_entries(file))
+        else:
+            entries.append(_uploaded_entry(file))
+    return entries
+
+
+def _read(entry):
+    if entry.size > current_app.config['BULK_MAX_FILE_SIZE']:
+        raise GltfPackError(f'{entry.filename} is too large.')
+    return entry.open().read()
+
+
+def pack_gltf_entries(entries):
+    """Replace each glTF and its companions with one packed GLB entry.
+
+    The consumed companions are listed on the packed entry's ``companions``.
+    """
+    if not any(entry.extension == 'gltf' for entry in entries):
+        return entries
+
+    by_path = {(entry.source, entry.path): entry for entry in entries}
+    by_name = {(entry.source, posixpath.basename(entry.path).lower()): entry for entry in entries}
+    consumed = set()
+    packed = {}
+
+    for entry in entries:
+        if entry.extension != 'gltf':
+            continue
+        directory = posixpath.dirname(entry.path)
+        glb_name = entry.filename.rsplit('.', 1)[0] + '.glb'
+
+        used = []
+
+        def resolve(path, entry=entry, directory=directory, used=used):
+            companion = (by_path.get((entry.source, posixpath.normpath(posixpath.join(directory, path))))
+                         or by_name.get((entry.source, posixpath.basename(path).lower())))
+            if companion is None:
+                return None
+            used.append(companion)
+            return _read(companion)
+
+        try:
+            data = pack_glb(_read(entry), resolve)
+        except GltfPackError as e:
+            entry.error = str(e)
+            continue
+
+        consumed.update(id(companion) for companion in used)
+
+        packed[id(entry)] = glb = IngestEntry(
+            glb_name,
+            len(data),
+            lambda data=data: io.BytesIO(data),
+            source=entry.source,
+            path=posixpath.join(directory, glb_name)
+        )
+        glb.companions = list({id(companion): companion for companion in used}.values())
+
+    return [packed.get(id(entry), entry) for entry in entries if id(entry) not in consumed]
+
+
+def _companion_results(entries, results):
+    """Results for packed companions, following the outcome of their GLB"""
+    outcomes = {}
+    for entry, result in zip(entries, results):
+        for companion in entry.companions:
+            # A companion shared by several glTFs counts as packed if any GLB was stored
+            if id(companion) not in outcomes or result['status'] == 'created':
+                outcomes[id(companion)] = (companion, entry.filename, result['status'])
+
+    reported = []
+    for companion, glb_name, status in outcomes.values():
+        result = {'filename': companion.filename, 'source': companion.source, 'into': glb_name}
+        if status == 'created':
+            result['status'] = 'packed'
+        else:
+            result.update(status=status, error=f'Packed into {glb_name}, which was not stored.')
+        reported.append(result)
+    return reported
+
+
+def check_signature(extension, head):
+    signatures = SIGNATURES.get(extension)
+    if not signatures:
+        return True
+    head = head.lstrip(b'\xef\xbb\xbf \t\r\n') if extension == 'gltf' else head
+    return head.startswith(signatures)
+
+
+def validate_entry(entry):
+    """Return an error message for an entry, or None if it is acceptable"""
+    if entry.error:
+        return entry.error
+    allowed_extensions = current_app.config['ALLOWED_EXTENSIONS']
+    if entry.extension not in allowed_extensions:
+        return f'File type not supported. Allowed: {", ".join(sorted(allowed_extensions))}'
+    if not entry.size:
+        return 'File is empty.'
+    if entry.size > current_app.config['BULK_MAX_FILE_SIZE']:
+        return 'File too large.'
+    return None
+
+
+def _store(fs, entry, user_id, upload_date):
+    """Stream one entry into GridFS; returns (file_id, size)"""
+    stream = entry.open()
+    head = stream.read(64)
+    if not check_signature(entry.extension, head):
+        raise ValueError(f'Not a valid {entry.extension.upper()} file.')
+
+    grid_in = fs.new_file(
+        filename=secure_filename(entry.filename),
+        metadata={
+            'original_filename': entry.filename,
+            'uploaded_by': user_id,
+            'upload_date': upload_date
+        }
+    )
+    size = 0
+    try:
+        chunk = head
+        while chunk:
+            grid_in.write(chunk)
+            size += len(chunk)
+            chunk = stream.read(GRIDFS_WRITE_SIZE)
+        grid_in.close()
+    except BaseException:
+        # Remove the chunks written so far rather than committing a truncated file
+        try:
+            grid_in.abort()
+        except Exception as e:
+            logger.error("Error removing partial GridFS file %s: %s", grid_in._id, e)
+        raise
+    return grid_in._id, size
+
+
+def ingest(entries, user_id, description='', is_public=True):
+    """Validate, store and register entries; returns per-file results"""
+    fs = current_app.config['GRIDFS']
+    upload_date = datetime.utcnow()
+    entries = pack_gltf_entries(entries)
+    results = [{'filename': entry.filename, 'source': entry.source} for entry in entries]
+
+    accepted = []
+    for index, entry in enumerate(entries):
+        error = validate_entry(entry)
+        if error:
+            results[index].update(status='rejected', error=error)
+        else:
+            accepted.append(index)
+
+    workers = current_app.config['BULK_UPLOAD_WORKERS']
+    stored = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            index: executor.submit(_store, fs, entries[index], user_id, upload_date)
+            for index in accepted
+        }
+        for index, future in futures.items():
+            try:
+                file_id, size = future.result()
+            except ValueError as e:
+                results[index].update(status='rejected', error=str(e))
+                continue
+            except Exception as e:
+                logger.error("Bulk upload GridFS error for %s: %s", entries[index].filename, e)
+                results[index].update(status='failed', error='Could not store file.')
+                continue
+            stored.append((index, file_id, size))
+            metrics.upload_sizes.observe(size, 'bulk')
+
+    models = []
+    for index, file_id, size in stored:
+        entry = entries[index]
+        stem = entry.filename.rsplit('.', 1)[0]
+        models.append(Model3D(
+            name=stem.replace('_', ' ').strip() or entry.filename,
+            description=description,
+            file_format=entry.extension,
+            file_size=size,
+            original_filename=entry.filename,
+            user_id=user_id,
+            is_public=is_public,
+            upload_date=upload_date,
+            gridfs_file_id=str(file_id)
+        ))
+
+    try:
+        Model3D.insert_many(models)
+    except Exception:
+        # Don't leave orphaned files behind if the documents could not be written
+        for _, file_id, _ in stored:
+            try:
+                fs.delete(file_id)
+            except Exception as e:
+                logger.error("Error deleting file from GridFS: %s", e)
+        raise
+
+    for (index, _, _), model in zip(stored, models):
+        results[index].update(status='created', model={
+            'id': model.id,
+            'name': model.name,
+            'file_format': model.file_format,
+            'file_size': model.file_size,
+            'original_filename': model.original_filename,
+            'is_public': model.is_public
+        })
+
+    return results + _companion_results(entries, results)
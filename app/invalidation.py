@@ -0,0 +1,285 @@
+"""Cross-worker cache invalidation.
+
+Each worker keeps in-process caches (platform stats, facet counts, the memory
+response cache, the search index). A change handled by one worker is invisible
+to the others until their TTLs run out. The invalidation bus closes that gap:
+a background thread per process listens for changes to ``models``, ``users``
+and ``api_tokens`` and fans every event out to the registered handlers.
+
+Two sources are supported (``INVALIDATION_SOURCE``):
+
+* ``change_stream`` - a MongoDB change stream on the database, filtered to
+  those collections. Needs a replica set or sharded cluster (Atlas is one).
+* ``capped`` - writers append a small event to the ``invalidation_events``
+  capped collection and every worker tails it with a tailable cursor. Works on
+  a standalone ``mongod``.
+
+``auto`` (the default) picks the change stream when the server reports a
+replica set and the capped log otherwise; ``off`` disables the bus, which is
+the default under ``LAZY_INIT`` (serverless functions have no long-lived
+threads). Updates that only touch counters (download counts, per-user stats,
+change feed stamps) are not treated as invalidations.
+
+Each process has already updated its own caches when it writes, so it skips
+its own events: capped-log events carry the writer's ``origin``, and in change
+stream mode ``publish`` remembers the ``(collection, id)`` of each local write
+for ``LOCAL_WRITE_TTL`` seconds so the matching change event is dropped once.
+Bulk writes use ``publish_many``, a single capped-log event whose ``ids`` list
+replaces ``id``, so other workers clear their caches once per batch.
+
+Whenever the listener (re)starts it may have missed events, so it first sends
+a ``reset`` event that clears every cache. To try the change stream locally,
+start a single-node replica set (``mongod --replSet rs0`` then
+``rs.initiate()`` in ``mongosh``) and point ``MONGODB_URI`` at it.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ('models', 'users', 'api_tokens')
+EVENTS_COLLECTION = 'invalidation_events'
+
+# Change events normally arrive within milliseconds; a remembered local write
+# that never produced one (a no-op update) stops masking the document after this
+LOCAL_WRITE_TTL = 10.0
+
+# Updates limited to these fields never change what the caches hold
+COUNTER_FIELDS = {
+    'models': ('download_count', 'change_seq', 'updated_at'),
+    'users': ('stats',),
+}
+
+
+def _counter_only(collection, updated_fields):
+    prefixes = COUNTER_FIELDS.get(collection, ())
+    return bool(updated_fields) and all(
+        field.split('.', 1)[0] in prefixes for field in updated_fields
+    )
+
+
+def event_from_change(change):
+    """Bus event for a change stream document, or None if it can be ignored"""
+    collection = change.get('ns', {}).get('coll')
+    if collection not in WATCHED_COLLECTIONS:
+        return None
+
+    op = change.get('operationType')
+    if op == 'update':
+        description = change.get('updateDescription') or {}
+        if not description.get('removedFields') and _counter_only(collection, description.get('updatedFields')):
+            return None
+    elif op not in ('insert', 'replace', 'delete'):
+        return {'collection': None, 'op': 'reset', 'id': None}
+
+    document_key = change.get('documentKey') or {}
+    return {'collection': collection, 'op': op, 'id': str(document_key.get('_id'))}
+
+
+class InvalidationBus:
+    def __init__(self):
+        self.app = None
+        self.source = 'off'
+        self.retry_interval = 5.0
+        self._handlers = []
+        self._mode = None
+        self._origin = uuid.uuid4().hex
+        self._local_writes = {}
+        self._local_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self.app = app
+        self.source = app.config['INVALIDATION_SOURCE']
+        self._mode = None
+        app.extensions['invalidation_bus'] = self
+        if self.source != 'off':
+            app.before_request(self._ensure_thread)
+
+    def register(self, handler):
+        """Call ``handler(event)`` for every invalidation event"""
+        self._handlers.append(handler)
+        return handler
+
+    @property
+    def mode(self):
+        """The source in use: 'change_stream', 'capped' or 'off'"""
+        if self._mode is None:
+            self._mode = self._detect_mode()
+        return self._mode
+
+    def _detect_mode(self):
+        if self.source != 'auto':
+            return self.source
+        try:
+            hello = current_app.config['MONGODB_DB'].command('hello')
+        except Exception as e:
+            logger.error("Invalidation bus could not inspect the deployment: %s", e)
+            return 'capped'
+        return 'change_stream' if hello.get('setName') or hello.get('msg') == 'isdbgrid' else 'capped'
+
+    def publish(self, collection, op, document_id):
+        """Announce a change; only the capped log needs explicit events"""
+        if self.source == 'off':
+            return
+        if self.mode == 'change_stream':
+            self._remember_local(collection, document_id)
+            return
+        self._append({'collection': collection, 'op': op, 'id': str(document_id) if document_id else None})
+
+    def publish_many(self, collection, op, document_ids):
+        """Announce the same change to several documents as one capped-log event"""
+        document_ids = [str(document_id) for document_id in document_ids if document_id]
+        if self.source == 'off' or not document_ids:
+            return
+        if self.mode == 'change_stream':
+            for document_id in document_ids:
+                self._remember_local(collection, document_id)
+            return
+        self._append({'collection': collection, 'op': op, 'id': None, 'ids': document_ids})
+
+    def _append(self, event):
+        try:
+            current_app.config['MONGODB_DB'][EVENTS_COLLECTION].insert_one(
+                dict(event, origin=self._origin, at=datetime.utcnow())
+            )
+        except Exception as e:
+            logger.error("Invalidation publish error: %s", e)
+
+    def _remember_local(self, collection, document_id):
+        if not document_id:
+            return
+        key = (collection, str(document_id))
+        now = time.monotonic()
+        with self._local_lock:
+            count, _ = self._local_writes.get(key, (0, 0.0))
+            self._local_writes[key] = (count + 1, now + LOCAL_WRITE_TTL)
+            for stale in [key for key, (_, expires) in self._local_writes.items() if expires <= now]:
+                del self._local_writes[stale]
+
+    def is_local(self, event):
+        """True (once per remembered write) if a change event stems from this process"""
+        key = (event['collection'], event['id'])
+        with self._local_lock:
+            entry = self._local_writes.pop(key, None)
+            if entry is None:
+                return False
+            count, expires = entry
+            if expires <= time.monotonic():
+                return False
+            if count > 1:
+                self._local_writes[key] = (count - 1, expires)
+            return True
+
+    def dispatch(self, event):
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error("Invalidation handler %s failed: %s", getattr(handler, '__name__', handler), e)
+
+    def after_fork(self):
+        self._origin = uuid.uuid4().hex
+        self._local_writes = {}
+        self._local_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Threads do not survive fork(), so each process starts its own listener
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='invalidation-bus', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    # Anything may have changed while we were not listening
+                    self.dispatch({'collection': None, 'op': 'reset', 'id': None})
+                    if self.mode == 'change_stream':
+                        self._watch()
+                    else:
+                        self._tail()
+            except Exception as e:
+                logger.error("Invalidation bus error: %s", e)
+            time.sleep(self.retry_interval)
+
+    def _watch(self):
+        db = current_app.config['MONGODB_DB']
+        pipeline = [{'$match': {'ns.coll': {'$in': list(WATCHED_COLLECTIONS)}}}]
+        with db.watch(pipeline) as stream:
+            for change in stream:
+                event = event_from_change(change)
+                if event and (event['op'] == 'reset' or not self.is_local(event)):
+                    self.dispatch(event)
+
+    def _tail(self):
+        from pymongo import CursorType
+        from pymongo.errors import CollectionInvalid
+
+        db = current_app.config['MONGODB_DB']
+        if EVENTS_COLLECTION not in db.list_collection_names():
+            try:
+                db.create_collection(EVENTS_COLLECTION, capped=True,
+                                     size=current_app.config['INVALIDATION_LOG_SIZE'])
+            except CollectionInvalid:
+                pass
+        events = db[EVENTS_COLLECTION]
+
+        # A tailable cursor on an empty capped collection dies at once
+        latest = events.find_one(sort=[('$natural', -1)])
+        if latest is None:
+            events.insert_one({'collection': None, 'op': 'start', 'origin': self._origin, 'at': datetime.utcnow()})
+            latest = events.find_one(sort=[('$natural', -1)])
+
+        cursor = events.find({'_id': {'$gt': latest['_id']}}, cursor_type=CursorType.TAILABLE_AWAIT)
+        while cursor.alive:
+            for event in cursor:
+                if event.get('origin') == self._origin or event.get('op') == 'start':
+                    continue
+                message = {'collection': event.get('collection'), 'op': event['op'], 'id': event.get('id')}
+                if 'ids' in event:
+                    message['ids'] = event['ids']
+                self.dispatch(message)
+
+
+def _local_caches(event):
+    """Drop the in-process caches a model or user change can affect"""
+    if event['collection'] not in (None, 'models', 'users'):
+        return
+
+    from app import facets, stats
+    from app.cache import response_cache
+    from app.search import search_index
+
+    stats.invalidate_cache()
+    facets.invalidate_cache()
+    response_cache.invalidate_local()
+
+    if event['op'] == 'reset':
+        search_index.invalidate()
+    elif event['collection'] == 'models':
+        for model_id in event.get('ids') or [event['id']]:
+            search_index.reload_model(model_id)
+
+
+invalidation_bus = InvalidationBus()
+invalidation_bus.register(_local_caches)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=invalidation_bus.after_fork)
@@ -0,0 +1,185 @@
+"""Structured, non-blocking logging and per-request timing.
+
+Everything under the ``app`` logger goes through a ``QueueHandler``; a
+``QueueListener`` thread does the actual formatting and writing, so a request
+thread never blocks on stdout. Records are written as one JSON object per line
+(``LOG_FORMAT=json``, the default outside debug mode) or as plain text, and any
+``extra`` fields are included.
+
+Every request ends with one ``request`` record carrying the route, method,
+status, latency, the number and total duration of MongoDB commands it issued
+and the bytes sent. Streamed responses (downloads, exports) are logged when the
+stream closes, with the bytes actually written. ``LOG_LEVEL`` defaults to
+DEBUG in debug mode and INFO otherwise, which silences the step-by-step
+handler output in production.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import g, request
+
+logger = logging.getLogger('app')
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_queue = None
+
+# MongoDB commands issued by the current thread's request
+_commands = threading.local()
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+
+def configure(app):
+    """Route ``app.*`` loggers through the queue and add the request hooks"""
+    global _listener, _queue
+
+    level = app.config['LOG_LEVEL']
+    formatter = JSONFormatter() if app.config['LOG_FORMAT'] == 'json' else TextFormatter()
+
+    if _listener is None:
+        _queue = queue.SimpleQueue()
+        stream = logging.StreamHandler(sys.stdout)
+        _listener = logging.handlers.QueueListener(_queue, stream)
+        _listener.start()
+        atexit.register(_listener.stop)
+        logger.addHandler(logging.handlers.QueueHandler(_queue))
+        logger.propagate = False
+
+    for handler in _listener.handlers:
+        handler.setFormatter(formatter)
+    logger.setLevel(level)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+
+def _restart_listener_after_fork():
+    # The listener thread does not survive fork(); records would pile up unread
+    if _listener is not None:
+        _listener._thread = None
+        _listener.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
+def _record_command(duration_micros):
+    if getattr(_commands, 'active', False):
+        _commands.count += 1
+        _commands.micros += duration_micros
+
+
+def mongo_listener():
+    """A PyMongo CommandListener feeding the per-request command counts"""
+    from pymongo import monitoring
+
+    class RequestCommandListener(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            _record_command(event.duration_micros)
+
+        def failed(self, event):
+            _record_command(event.duration_micros)
+
+    return RequestCommandListener()
+
+
+def mongo_usage():
+    """(command count, total microseconds) for the current request so far"""
+    return getattr(_commands, 'count', 0), getattr(_commands, 'micros', 0)
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    _commands.active = True
+    _commands.count = 0
+    _commands.micros = 0
+
+
+class _CountingIterable:
+    """Wrap a streamed body to count the bytes actually sent"""
+
+    def __init__(self, iterable):
+        self.iterable = iterable
+        self.bytes_sent = 0
+
+    def __iter__(self):
+        for chunk in self.iterable:
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        if hasattr(self.iterable, 'close'):
+            self.iterable.close()
+
+
+def _finish_request(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+
+    fields = {
+        'route': request.url_rule.rule if request.url_rule else request.path,
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'status': response.status_code,
+    }
+    body = None
+    if response.is_streamed:
+        body = response.response = _CountingIterable(response.response)
+
+    def emit():
+        fields['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        fields['mongo_calls'] = getattr(_commands, 'count', 0)
+        fields['mongo_ms'] = round(getattr(_commands, 'micros', 0) / 1000, 2)
+        fields['bytes'] = body.bytes_sent if body is not None else response.calculate_content_length()
+        _commands.active = False
+        logger.info('request', extra=fields)
+
+    if body is None:
+        emit()
+    else:
+        response.call_on_close(emit)
+    return response
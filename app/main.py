@@ -1,42 +1,47 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
+from app import facets, fragments
+from app.cache import make_key, response_cache
 from app.models import Model3D, User
 from werkzeug.utils import secure_filename
 import io
+import logging
 from bson.objectid import ObjectId
 
+logger = logging.getLogger(__name__)
+
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
+@fragments.cached_page('main.index.page')
 def index():
     try:
-        print("🔄 Loading homepage...")
-        
-        # Get recent public models
-        recent_models, total_public = Model3D.get_public_models(page=1, per_page=6)
+        # Get recent public models and their owners (cached until a model changes)
+        def load_recent():
+            documents, total = Model3D.get_public_documents(page=1, per_page=6)
+            usernames = User.get_usernames(document.get('user_id') for document in documents)
+            return {'documents': documents, 'total': total, 'usernames': usernames}
         
-        print(f"📋 Found {total_public} public models for homepage")
+        recent = response_cache.get_or_set('main.index', load_recent)
         
-        # Add owner username to each model
-        for model in recent_models:
-            user = User.get_by_id(model.user_id)
-            model.owner_username = user.username if user else 'Unknown'
-            print(f"   Model: {model.name} by {model.owner_username}")
+        recent_models = []
+        for model_data in recent['documents']:
+            model = Model3D.from_document(model_data)
+            model.owner_username = recent['usernames'].get(model.user_id, 'Unknown')
+            recent_models.append(model)
         
         # Get statistics
         stats = Model3D.get_stats()
-        print(f"📊 Stats: {stats}")
         
         return render_template('index.html', 
                              recent_models=recent_models,
                              total_models=stats['public_models'],
                              total_users=stats['total_users'],
                              total_downloads=stats['total_downloads'])
-    except Exception as e:
-        print(f"Index page error: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Index page error")
         # Fallback values if database query fails
+        fragments.skip_page_cache()
         return render_template('index.html', 
                              recent_models=[],
                              total_models=0,
@@ -48,62 +53,43 @@ def index():
 def dashboard():
     """User dashboard"""
     try:
-        print(f"🔄 Dashboard for user: {current_user.id} ({current_user.username})")
-        
         user_models, total_user_models = Model3D.get_user_models(current_user.id, page=1, per_page=10)
         
-        print(f"📋 Found {total_user_models} models for user {current_user.id}")
-        for i, model in enumerate(user_models[:3]):
-            print(f"   Model {i+1}: {model.name} (Public: {model.is_public})")
-        
-        # Calculate user stats
-        total_downloads = sum(model.download_count for model in user_models)
-        public_models = sum(1 for model in user_models if model.is_public)
+        # Per-user counters cover all of the user's models, not just this page
+        user_stats = User.get_stats(current_user.id)
         
         return render_template('dashboard.html', 
                              user_models=user_models,
-                             total_models=total_user_models,
-                             total_downloads=total_downloads,
-                             public_models=public_models)
+                             total_models=user_stats['model_count'],
+                             total_downloads=user_stats['total_downloads'],
+                             public_models=user_stats['public_count'],
+                             bytes_stored=user_stats['bytes_stored'])
     except Exception as e:
-        print(f"Dashboard error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Dashboard error")
         return render_template('dashboard.html', 
                              user_models=[],
                              total_models=0,
                              total_downloads=0,
                              public_models=0,
+                             bytes_stored=0,
                              error=str(e))
 
 @main_bp.route('/browse')
+@fragments.cached_page('main.browse.page')
 def browse():
-    """Browse public models"""
+    """Browse public models with faceted filtering"""
     try:
-        print("🔄 Loading browse page...")
-        
         search = request.args.get('search', '').strip()
         page = request.args.get('page', 1, type=int)
+        filters = facets.parse_filters(request.args)
         
-        print(f"📋 Browse params - Page: {page}, Search: '{search}'")
-        
-        # Get public models with pagination
-        models, total = Model3D.get_public_models(page=page, per_page=12, search=search if search else None)
-        
-        print(f"📋 Found {total} public models")
+        logger.debug("Browse", extra={'page': page, 'search': search, 'filters': filters})
         
-        # Add owner username to each model
-        for model in models:
-            user = User.get_by_id(model.user_id)
-            model.owner_username = user.username if user else 'Unknown'
-        
-        for i, model in enumerate(models[:3]):
-            print(f"   Public Model {i+1}: {model.name} by {model.owner_username} (ID: {model.id})")
-        
-        # Calculate pagination info
-        total_pages = (total + 11) // 12  # Ceiling division
-        has_prev = page > 1
-        has_next = page < total_pages
+        # Page of items, total and facet counts come back from one aggregation
+        models, total, facet_counts = Model3D.browse_public_models(
+            filters=filters, search=search if search else None, page=page, per_page=12,
+            cache_key=make_key('main.browse')
+        )
         
         # Create pagination object-like structure
         class Pagination:
@@ -117,16 +103,27 @@ def browse():
                 self.has_next = page < self.pages
                 self.prev_num = page - 1 if self.has_prev else None
                 self.next_num = page + 1 if self.has_next else None
+            
+            def iter_pages(self, left_edge=2, left_current=2, right_current=4, right_edge=2):
+                last = 0
+                for num in range(1, self.pages + 1):
+                    if (num <= left_edge
+                            or self.page - left_current - 1 < num < self.page + right_current
+                            or num > self.pages - right_edge):
+                        if last + 1 != num:
+                            yield None
+                        yield num
+                        last = num
         
         pagination = Pagination(models, total, page, 12)
         
-        return render_template('browse.html', models=pagination, search=search)
+        return render_template('browse.html', models=pagination, search=search,
+                               facets=facet_counts, filters=filters)
         
-    except Exception as e:
-        print(f"❌ Browse error: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Browse error")
         # Return empty pagination on error
+        fragments.skip_page_cache()
         class EmptyPagination:
             items = []
             total = 0
@@ -137,39 +134,33 @@ def browse():
             prev_num = None
             next_num = None
         
-        return render_template('browse.html', models=EmptyPagination(), search='')
+        return render_template('browse.html', models=EmptyPagination(), search='',
+                               facets={}, filters={})
 
 @main_bp.route('/model/<model_id>')
 def model_detail(model_id):
     """View model details"""
     try:
-        print(f"🔄 Loading model detail for ID: {model_id}")
-        
         model = Model3D.get_by_id(model_id)
         if not model:
-            print(f"❌ Model not found: {model_id}")
+            logger.debug("Model not found", extra={'model_id': model_id})
             flash('Model not found.', 'error')
             return redirect(url_for('main.browse'))
         
-        print(f"✅ Model found: {model.name} (Public: {model.is_public})")
-        
         # Check access permissions
         if not model.is_public:
             if not current_user.is_authenticated or model.user_id != current_user.id:
-                print(f"❌ Access denied for model: {model_id}")
+                logger.debug("Access denied for model", extra={'model_id': model_id})
                 flash('You do not have permission to view this model.', 'error')
                 return redirect(url_for('main.browse'))
         
         # Get model owner info
         owner = User.get_by_id(model.user_id)
-        print(f"✅ Owner found: {owner.username if owner else 'Unknown'}")
         
         return render_template('model_detail.html', model=model, owner=owner)
         
-    except Exception as e:
-        print(f"❌ Model detail error: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Model detail error")
         flash('Error loading model details.', 'error')
         return redirect(url_for('main.browse'))
 
@@ -244,7 +235,7 @@ def upload():
             return redirect(url_for('main.model_detail', model_id=model.id))
             
         except Exception as e:
-            print(f"Upload error: {e}")
+            logger.error("Upload error: %s", e)
             flash('Upload failed. Please try again.', 'error')
             return render_template('upload.html')
     
@@ -255,19 +246,21 @@ def upload():
 def profile():
     """User profile page"""
     try:
-        user_models, total = Model3D.get_user_models(current_user.id)
+        user_stats = User.get_stats(current_user.id)
         stats = {
-            'total_models': total,
-            'public_models': sum(1 for model in user_models if model.is_public),
-            'total_downloads': sum(model.download_count for model in user_models)
+            'total_models': user_stats['model_count'],
+            'public_models': user_stats['public_count'],
+            'total_downloads': user_stats['total_downloads'],
+            'bytes_stored': user_stats['bytes_stored']
         }
         
         return render_template('profile.html', user=current_user, stats=stats)
         
     except Exception as e:
-        print(f"Profile error: {e}")
+        logger.error("Profile error: %s", e)
         return render_template('profile.html', user=current_user, stats={
             'total_models': 0,
             'public_models': 0,
-            'total_downloads': 0
+            'total_downloads': 0,
+            'bytes_stored': 0
         })
@@ -0,0 +1,245 @@
+"""In-process metrics in the Prometheus text format, served at ``/api/metrics``.
+
+Collected:
+
+* ``http_requests_total`` and ``http_request_duration_seconds`` per endpoint
+* ``mongodb_commands_total`` / ``mongodb_command_duration_seconds`` per
+  command, from a PyMongo ``CommandListener``, and connection pool gauges from
+  a ``ConnectionPoolListener``
+* ``gridfs_bytes_read_total`` / ``gridfs_bytes_written_total``, measured on
+  the ``fs.chunks`` commands the same listener sees
+* ``cache_requests_total`` by cache and result, for hit ratios
+* ``upload_size_bytes`` for single and bulk uploads
+
+Updating a metric is a dict lookup and an addition under a lock, cheap enough
+to leave on. Values are per process; with several workers each one is scraped
+(or summed) separately, and ``process_id`` identifies the worker.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMAND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(9))  # 1 KB .. 64 MB
+
+GRIDFS_CHUNKS = 'fs.chunks'
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values = defaultdict(float)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            if not self.labels and not self._values:
+                lines.append(f'{self.name} 0')
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value:g}')
+        return lines
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = self.header()
+        names = self.labels + ('le',)
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f'{self.name}_bucket{_format_labels(names, label_values + (le,))} {cumulative}')
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f'{self.name}_sum{labels} {total:g}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+http_requests = Counter('http_requests_total', 'HTTP requests by endpoint, method and status',
+                        ('endpoint', 'method', 'status'))
+http_latency = Histogram('http_request_duration_seconds', 'HTTP request latency by endpoint',
+                         ('endpoint',), LATENCY_BUCKETS)
+mongo_commands = Counter('mongodb_commands_total', 'MongoDB commands by name and outcome',
+                         ('command', 'outcome'))
+mongo_latency = Histogram('mongodb_command_duration_seconds', 'MongoDB command duration by name',
+                          ('command',), COMMAND_BUCKETS)
+pool_checked_out = Gauge('mongodb_pool_connections_checked_out', 'Pooled connections currently in use')
+pool_connections = Gauge('mongodb_pool_connections', 'Open pooled connections')
+pool_checkout_failures = Counter('mongodb_pool_checkout_failures_total', 'Failed connection checkouts')
+gridfs_read = Counter('gridfs_bytes_read_total', 'Bytes read from GridFS chunks')
+gridfs_written = Counter('gridfs_bytes_written_total', 'Bytes written to GridFS chunks')
+cache_requests = Counter('cache_requests_total', 'Cache lookups by cache and result (hit/miss)',
+                         ('cache', 'result'))
+upload_sizes = Histogram('upload_size_bytes', 'Uploaded file sizes', ('kind',), SIZE_BUCKETS)
+
+REGISTRY = [
+    http_requests, http_latency, mongo_commands, mongo_latency, pool_checked_out, pool_connections,
+    pool_checkout_failures, gridfs_read, gridfs_written, cache_requests, upload_sizes,
+]
+
+
+def cache_lookup(cache, hit):
+    cache_requests.inc(cache, 'hit' if hit else 'miss')
+
+
+def render():
+    lines = [
+        '# HELP process_id Operating system process id of this worker',
+        '# TYPE process_id gauge',
+        f'process_id {os.getpid()}',
+    ]
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _chunk_bytes(documents):
+    return sum(len(document.get('data', b'')) for document in documents or ())
+
+
+def mongo_listeners():
+    """PyMongo command and pool listeners feeding the MongoDB and GridFS metrics"""
+    from pymongo import monitoring
+
+    class CommandMetrics(monitoring.CommandListener):
+        def __init__(self):
+            self._chunk_queries = {}
+
+        def started(self, event):
+            command = event.command
+            if event.command_name == 'insert' and command.get('insert') == GRIDFS_CHUNKS:
+                gridfs_written.inc(amount=_chunk_bytes(command.get('documents')))
+            elif ((event.command_name == 'find' and command.get('find') == GRIDFS_CHUNKS)
+                  or (event.command_name == 'getMore' and command.get('collection') == GRIDFS_CHUNKS)):
+                self._chunk_queries[event.request_id] = True
+
+        def succeeded(self, event):
+            mongo_commands.inc(event.command_name, 'success')
+            mongo_latency.observe(event.duration_micros / 1e6, event.command_name)
+            if self._chunk_queries.pop(event.request_id, False):
+                cursor = event.reply.get('cursor', {})
+                gridfs_read.inc(amount=_chunk_bytes(cursor.get('firstBatch') or cursor.get('nextBatch')))
+
+        def failed(self, event):
+            mongo_commands.inc(event.command_name, 'failure')
+            mongo_latency.observe(event.duration_micros / 1e6, event.command_name)
+            self._chunk_queries.pop(event.request_id, None)
+
+    class PoolMetrics(monitoring.ConnectionPoolListener):
+        def pool_created(self, event):
+            pass
+
+        def pool_ready(self, event):
+            pass
+
+        def pool_cleared(self, event):
+            pass
+
+        def pool_closed(self, event):
+            pass
+
+        def connection_created(self, event):
+            pool_connections.inc()
+
+        def connection_ready(self, event):
+            pass
+
+        def connection_closed(self, event):
+            pool_connections.dec()
+
+        def connection_check_out_started(self, event):
+            pass
+
+        def connection_check_out_failed(self, event):
+            pool_checkout_failures.inc()
+
+        def connection_checked_out(self, event):
+            pool_checked_out.inc()
+
+        def connection_checked_in(self, event):
+            pool_checked_out.dec()
+
+    return [CommandMetrics(), PoolMetrics()]
+
+
+def init_app(app):
+    """Time every request (the registry is served by the api blueprint)"""
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get('metrics_started')
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            http_requests.inc(endpoint, request.method, response.status_code)
+            http_latency.observe(time.perf_counter() - started, endpoint)
+        return response
+
@@ -1,9 +1,19 @@
+import logging
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from bson.objectid import ObjectId
 from datetime import datetime
 from flask import current_app
-import gridfs
+from app import changes, facets, stats
+from app.cache import response_cache
+from app.counters import download_counter
+from app.invalidation import invalidation_bus
+from app.search import search_index
+
+logger = logging.getLogger(__name__)
+
+# Per-user counters kept on the user document under ``stats``
+USER_STAT_FIELDS = ('model_count', 'public_count', 'total_downloads', 'bytes_stored')
 
 class User(UserMixin):
     def __init__(self, username=None, email=None, password_hash=None, _id=None, created_at=None):
@@ -20,7 +30,12 @@ class User(UserMixin):
     def check_password(self, password):
         """Check password against hash"""
         return check_password_hash(self.password_hash, password)
-    
+
+    @property
+    def is_admin(self):
+        """Admins are listed by username in ADMIN_USERNAMES"""
+        return self.username in current_app.config.get('ADMIN_USERNAMES', ())
+
     def save(self):
         """Save user to MongoDB"""
         db = current_app.config['MONGODB_DB']
@@ -42,9 +57,77 @@ class User(UserMixin):
             # Create new user
             result = db.users.insert_one(user_data)
             self.id = str(result.inserted_id)
+            stats.bump(total_users=1)
         
+        invalidation_bus.publish('users', 'update', self.id)
         return self
     
+    @staticmethod
+    def bump_stats(user_id, **deltas):
+        """Apply deltas to a user's denormalized counters.
+        
+        Applied whether or not the counters have been backfilled yet; the
+        backfill in ``get_stats`` adds to whatever has accumulated meanwhile.
+        """
+        deltas = {f'stats.{key}': value for key, value in deltas.items() if value}
+        if not user_id or not deltas:
+            return
+        
+        try:
+            db = current_app.config['MONGODB_DB']
+            db.users.update_one({'_id': ObjectId(user_id)}, {'$inc': deltas})
+        except Exception as e:
+            logger.error("User stats update error: %s", e)
+    
+    @staticmethod
+    def compute_stats(user_id):
+        """Aggregate a user's counters from their models (uses the user_id index)"""
+        db = current_app.config['MONGODB_DB']
+        pipeline = [
+            {'$match': {'user_id': user_id}},
+            {'$group': {
+                '_id': None,
+                'model_count': {'$sum': 1},
+                'public_count': {'$sum': {'$cond': ['$is_public', 1, 0]}},
+                'total_downloads': {'$sum': '$download_count'},
+                'bytes_stored': {'$sum': '$file_size'}
+            }}
+        ]
+        result = list(db.models.aggregate(pipeline))
+        stats = {field: 0 for field in USER_STAT_FIELDS}
+        if result:
+            stats.update({field: result[0].get(field) or 0 for field in USER_STAT_FIELDS})
+        return stats
+    
+    @staticmethod
+    def get_stats(user_id):
+        """Get a user's model count, public count, downloads and bytes stored"""
+        from pymongo import ReturnDocument
+        
+        db = current_app.config['MONGODB_DB']
+        user_data = db.users.find_one({'_id': ObjectId(user_id)}, {'stats': 1}) or {}
+        baseline = user_data.get('stats') or {}
+        
+        if 'reconciled_at' not in baseline:
+            # First read: aggregate once and move the counters by the difference
+            # from what was read before counting, so concurrent bumps are kept
+            stats = User.compute_stats(user_id)
+            user_data = db.users.find_one_and_update(
+                {'_id': ObjectId(user_id), 'stats.reconciled_at': {'$exists': False}},
+                {
+                    '$inc': {f'stats.{field}': stats[field] - baseline.get(field, 0) for field in USER_STAT_FIELDS},
+                    '$set': {'stats.reconciled_at': datetime.utcnow()}
+                },
+                projection={'stats': 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if user_data is None:
+                # Another request backfilled (or the user is gone)
+                user_data = db.users.find_one({'_id': ObjectId(user_id)}, {'stats': 1}) or {}
+        
+        user_stats = user_data.get('stats') or {}
+        return {field: user_stats.get(field, 0) for field in USER_STAT_FIELDS}
+    
     @staticmethod
     def get_by_id(user_id):
         """Get user by ID"""
@@ -61,9 +144,22 @@ class User(UserMixin):
                     created_at=user_data.get('created_at')
                 )
         except Exception as e:
-            print(f"Error getting user by ID: {e}")
+            logger.error("Error getting user by ID: %s", e)
         return None
     
+    @staticmethod
+    def get_usernames(user_ids):
+        """Map user ids to usernames with a single $in query"""
+        object_ids = [ObjectId(user_id) for user_id in set(user_ids) if user_id and ObjectId.is_valid(user_id)]
+        if not object_ids:
+            return {}
+        
+        db = current_app.config['MONGODB_DB']
+        return {
+            str(user_data['_id']): user_data['username']
+            for user_data in db.users.find({'_id': {'$in': object_ids}}, {'username': 1})
+        }
+    
     @staticmethod
     def get_by_username(username):
         """Get user by username"""
@@ -99,7 +195,7 @@ class User(UserMixin):
 class Model3D:
     def __init__(self, name=None, description=None, file_format=None, file_size=None,
                  original_filename=None, user_id=None, is_public=True, _id=None,
-                 upload_date=None, download_count=0, gridfs_file_id=None):
+                 upload_date=None, download_count=0, gridfs_file_id=None, change_seq=None):
         self.name = name
         self.description = description
         self.file_format = file_format
@@ -111,12 +207,14 @@ class Model3D:
         self.upload_date = upload_date or datetime.utcnow()
         self.download_count = download_count
         self.gridfs_file_id = gridfs_file_id
+        # Change feed sequence as last read; also versions cached card fragments
+        self.change_seq = change_seq
+        # Visibility as last persisted, used to keep the public counter in step
+        self._stored_is_public = is_public if _id else None
     
-    def save(self):
-        """Save model to MongoDB"""
-        db = current_app.config['MONGODB_DB']
-        
-        model_data = {
+    def to_document(self):
+        """Fields stored in the models collection"""
+        return {
             'name': self.name,
             'description': self.description,
             'file_format': self.file_format,
@@ -128,6 +226,14 @@ class Model3D:
             'download_count': self.download_count,
             'gridfs_file_id': self.gridfs_file_id
         }
+    
+    def save(self):
+        """Save model to MongoDB"""
+        db = current_app.config['MONGODB_DB']
+        
+        model_data = self.to_document()
+        model_data.update(changes.stamp(db))
+        self.change_seq = model_data['change_seq']
         
         if self.id:
             # Update existing model
@@ -135,13 +241,74 @@ class Model3D:
                 {'_id': ObjectId(self.id)},
                 {'$set': model_data}
             )
+            if self._stored_is_public is not None and self._stored_is_public != self.is_public:
+                stats.bump(public_models=1 if self.is_public else -1)
+                User.bump_stats(self.user_id, public_count=1 if self.is_public else -1)
+                if not self.is_public:
+                    changes.tombstone(self.id, self.user_id, db)
         else:
             # Create new model
             result = db.models.insert_one(model_data)
             self.id = str(result.inserted_id)
+            stats.bump(total_models=1, public_models=1 if self.is_public else 0)
+            User.bump_stats(
+                self.user_id,
+                model_count=1,
+                public_count=1 if self.is_public else 0,
+                bytes_stored=self.file_size or 0
+            )
+        
+        self._stored_is_public = self.is_public
+        facets.invalidate_cache()
+        response_cache.bump()
+        invalidation_bus.publish('models', 'update', self.id)
+        
+        if search_index.is_built:
+            owner = db.users.find_one({'_id': ObjectId(self.user_id)}, {'username': 1}) if self.user_id else None
+            search_index.add_model(self, owner_username=owner['username'] if owner else None)
         
         return self
     
+    @staticmethod
+    def insert_many(models):
+        """Create several new models with a single insert_many"""
+        if not models:
+            return []
+        
+        db = current_app.config['MONGODB_DB']
+        documents = [
+            dict(model.to_document(), **fields)
+            for model, fields in zip(models, changes.stamps(len(models), db))
+        ]
+        result = db.models.insert_many(documents)
+        
+        per_user = {}
+        for model, document, inserted_id in zip(models, documents, result.inserted_ids):
+            model.id = str(inserted_id)
+            model.change_seq = document['change_seq']
+            model._stored_is_public = model.is_public
+            counts = per_user.setdefault(model.user_id, {'model_count': 0, 'public_count': 0, 'bytes_stored': 0})
+            counts['model_count'] += 1
+            counts['public_count'] += 1 if model.is_public else 0
+            counts['bytes_stored'] += model.file_size or 0
+        
+        stats.bump(
+            total_models=len(models),
+            public_models=sum(1 for model in models if model.is_public)
+        )
+        for user_id, counts in per_user.items():
+            User.bump_stats(user_id, **counts)
+        facets.invalidate_cache()
+        response_cache.bump()
+        invalidation_bus.publish_many('models', 'insert', [model.id for model in models])
+        
+        if search_index.is_built:
+            usernames = User.get_usernames(per_user)
+            for model in models:
+                search_index.add_model(model, owner_username=usernames.get(model.user_id))
+        
+        return models
+    
     def delete(self):
         """Delete model and associated file from MongoDB"""
         db = current_app.config['MONGODB_DB']
@@ -152,18 +319,33 @@ class Model3D:
             try:
                 fs.delete(ObjectId(self.gridfs_file_id))
             except Exception as e:
-                print(f"Error deleting file from GridFS: {e}")
+                logger.error("Error deleting file from GridFS: %s", e)
         
         # Delete model document
-        db.models.delete_one({'_id': ObjectId(self.id)})
+        result = db.models.delete_one({'_id': ObjectId(self.id)})
+        if result.deleted_count:
+            stats.bump(
+                total_models=-1,
+                public_models=-1 if self.is_public else 0,
+                total_downloads=-(self.download_count or 0)
+            )
+            User.bump_stats(
+                self.user_id,
+                model_count=-1,
+                public_count=-1 if self.is_public else 0,
+                total_downloads=-(self.download_count or 0),
+                bytes_stored=-(self.file_size or 0)
+            )
+            if self.is_public:
+                changes.tombstone(self.id, self.user_id, db)
+        search_index.remove_model(self.id)
+        facets.invalidate_cache()
+        response_cache.bump()
+        invalidation_bus.publish('models', 'delete', self.id)
     
     def increment_download_count(self):
-        """Increment download counter"""
-        db = current_app.config['MONGODB_DB']
-        db.models.update_one(
-            {'_id': ObjectId(self.id)},
-            {'$inc': {'download_count': 1}}
-        )
+        """Increment download counter (written behind by the counter buffer)"""
+        download_counter.increment(self.id, owner_id=self.user_id)
         self.download_count += 1
     
     def get_file_data(self):
@@ -174,7 +356,7 @@ class Model3D:
                 grid_out = fs.get(ObjectId(self.gridfs_file_id))
                 return grid_out.read()
         except Exception as e:
-            print(f"Error reading file from GridFS: {e}")
+            logger.error("Error reading file from GridFS: %s", e)
         return None
     
     def get_file_size_formatted(self):
@@ -194,6 +376,24 @@ class Model3D:
         """Get file extension (alias for file_format for template compatibility)"""
         return self.file_format
     
+    @staticmethod
+    def from_document(model_data):
+        """Build a Model3D from a models collection document"""
+        return Model3D(
+            name=model_data['name'],
+            description=model_data['description'],
+            file_format=model_data['file_format'],
+            file_size=model_data['file_size'],
+            original_filename=model_data['original_filename'],
+            user_id=model_data['user_id'],
+            is_public=model_data['is_public'],
+            _id=model_data['_id'],
+            upload_date=model_data.get('upload_date'),
+            download_count=model_data.get('download_count', 0),
+            gridfs_file_id=model_data.get('gridfs_file_id'),
+            change_seq=model_data.get('change_seq')
+        )
+    
     @staticmethod
     def get_by_id(model_id):
         """Get model by ID"""
@@ -202,107 +402,146 @@ class Model3D:
             model_data = db.models.find_one({'_id': ObjectId(model_id)})
             
             if model_data:
-                return Model3D(
-                    name=model_data['name'],
-                    description=model_data['description'],
-                    file_format=model_data['file_format'],
-                    file_size=model_data['file_size'],
-                    original_filename=model_data['original_filename'],
-                    user_id=model_data['user_id'],
-                    is_public=model_data['is_public'],
-                    _id=model_data['_id'],
-                    upload_date=model_data.get('upload_date'),
-                    download_count=model_data.get('download_count', 0),
-                    gridfs_file_id=model_data.get('gridfs_file_id')
-                )
+                return Model3D.from_document(model_data)
         except Exception as e:
-            print(f"Error getting model by ID: {e}")
+            logger.error("Error getting model by ID: %s", e)
         return None
     
+    @staticmethod
+    def get_by_ids(model_ids):
+        """Get several models with a single $in query, keyed by ID"""
+        object_ids = [ObjectId(model_id) for model_id in set(model_ids) if ObjectId.is_valid(model_id)]
+        if not object_ids:
+            return {}
+        
+        db = current_app.config['MONGODB_DB']
+        return {
+            str(model_data['_id']): Model3D.from_document(model_data)
+            for model_data in db.models.find({'_id': {'$in': object_ids}})
+        }
+    
     @staticmethod
     def get_public_models(page=1, per_page=20, search=None):
         """Get public models with pagination"""
+        documents, total = Model3D.get_public_documents(page=page, per_page=per_page, search=search)
+        model_objects = [Model3D.from_document(model_data) for model_data in documents]
+        
+        return model_objects, total
+    
+    @staticmethod
+    def get_public_documents(page=1, per_page=20, search=None, projection=None):
+        """Get raw public model documents with pagination, optionally projected"""
         db = current_app.config['MONGODB_DB']
         
-        query = {'is_public': True}
         if search:
-            query['$text'] = {'$search': search}
+            return Model3D.search_public_documents(search, page=page, per_page=per_page, projection=projection)
         
+        query = {'is_public': True}
         total = db.models.count_documents(query)
         
-        models = list(db.models.find(query)
-                     .sort('upload_date', -1)
-                     .skip((page - 1) * per_page)
-                     .limit(per_page))
+        documents = list(db.models.find(query, projection)
+                         .sort('upload_date', -1)
+                         .skip((page - 1) * per_page)
+                         .limit(per_page))
         
-        model_objects = []
-        for model_data in models:
-            model_objects.append(Model3D(
-                name=model_data['name'],
-                description=model_data['description'],
-                file_format=model_data['file_format'],
-                file_size=model_data['file_size'],
-                original_filename=model_data['original_filename'],
-                user_id=model_data['user_id'],
-                is_public=model_data['is_public'],
-                _id=model_data['_id'],
-                upload_date=model_data.get('upload_date'),
-                download_count=model_data.get('download_count', 0),
-                gridfs_file_id=model_data.get('gridfs_file_id')
-            ))
+        return documents, total
+    
+    @staticmethod
+    def search_public_models(search, page=1, per_page=20):
+        """Search public models through the in-memory index, ranked by relevance"""
+        documents, total = Model3D.search_public_documents(search, page=page, per_page=per_page)
+        model_objects = [Model3D.from_document(model_data) for model_data in documents]
         
         return model_objects, total
     
     @staticmethod
-    def get_user_models(user_id, page=1, per_page=20):
-        """Get user's models with pagination"""
+    def search_public_documents(search, page=1, per_page=20, projection=None):
+        """Search raw public model documents, ranked by relevance"""
         db = current_app.config['MONGODB_DB']
         
-        query = {'user_id': user_id}
-        total = db.models.count_documents(query)
+        search_index.ensure_built()
+        ranked_ids = search_index.search(search)
+        total = len(ranked_ids)
         
-        models = list(db.models.find(query)
-                     .sort('upload_date', -1)
-                     .skip((page - 1) * per_page)
-                     .limit(per_page))
+        page_ids = ranked_ids[(page - 1) * per_page:page * per_page]
+        if not page_ids:
+            return [], total
+        
+        by_id = {
+            str(model_data['_id']): model_data
+            for model_data in db.models.find({'_id': {'$in': [ObjectId(model_id) for model_id in page_ids]}}, projection)
+        }
+        documents = [by_id[model_id] for model_id in page_ids if model_id in by_id]
+        
+        return documents, total
+    
+    @staticmethod
+    def browse_public_models(filters=None, search=None, page=1, per_page=12, cache_key=None):
+        """Faceted browse of public models in a single aggregation.
+        
+        Returns ``(models, total, facets)``; each model carries ``owner_username``.
+        With ``cache_key`` the query result goes through the response cache.
+        """
+        def run():
+            ranked_ids = None
+            if search:
+                search_index.ensure_built()
+                ranked_ids = search_index.search(search)
+            
+            documents, total, facet_counts, usernames = facets.browse(
+                filters or {}, page=page, per_page=per_page, ranked_ids=ranked_ids
+            )
+            return {'documents': documents, 'total': total, 'facets': facet_counts, 'usernames': usernames}
+        
+        result = response_cache.get_or_set(cache_key, run) if cache_key else run()
         
         model_objects = []
-        for model_data in models:
-            model_objects.append(Model3D(
-                name=model_data['name'],
-                description=model_data['description'],
-                file_format=model_data['file_format'],
-                file_size=model_data['file_size'],
-                original_filename=model_data['original_filename'],
-                user_id=model_data['user_id'],
-                is_public=model_data['is_public'],
-                _id=model_data['_id'],
-                upload_date=model_data.get('upload_date'),
-                download_count=model_data.get('download_count', 0),
-                gridfs_file_id=model_data.get('gridfs_file_id')
-            ))
+        for model_data in result['documents']:
+            model = Model3D.from_document(model_data)
+            model.owner_username = result['usernames'].get(model.user_id, 'Unknown')
+            model_objects.append(model)
+        
+        return model_objects, result['total'], result['facets']
+    
+    @staticmethod
+    def get_user_models(user_id, page=1, per_page=20):
+        """Get user's models with pagination"""
+        documents, total = Model3D.get_user_documents(user_id, page=page, per_page=per_page)
+        model_objects = [Model3D.from_document(model_data) for model_data in documents]
         
         return model_objects, total
     
     @staticmethod
-    def get_stats():
-        """Get database statistics"""
+    def get_user_documents(user_id, page=1, per_page=20, projection=None):
+        """Get a user's raw model documents with pagination, optionally projected"""
         db = current_app.config['MONGODB_DB']
         
-        total_models = db.models.count_documents({})
-        public_models = db.models.count_documents({'is_public': True})
-        total_users = db.users.count_documents({})
+        query = {'user_id': user_id}
+        total = db.models.count_documents(query)
         
-        # Total downloads
-        pipeline = [
-            {'$group': {'_id': None, 'total_downloads': {'$sum': '$download_count'}}}
-        ]
-        download_result = list(db.models.aggregate(pipeline))
-        total_downloads = download_result[0]['total_downloads'] if download_result else 0
+        documents = list(db.models.find(query, projection)
+                         .sort('upload_date', -1)
+                         .skip((page - 1) * per_page)
+                         .limit(per_page))
         
-        return {
-            'total_models': total_models,
-            'public_models': public_models,
-            'total_users': total_users,
-            'total_downloads': total_downloads
-        }
+        return documents, total
+    
+    @staticmethod
+    def iter_user_models(user_id, batch_size=100):
+        """Iterate over all of a user's models from a single cursor"""
+        db = current_app.config['MONGODB_DB']
+        cursor = db.models.find({'user_id': user_id}).sort('upload_date', 1).batch_size(batch_size)
+        for model_data in cursor:
+            yield Model3D.from_document(model_data)
+    
+    @staticmethod
+    def iter_public_documents(projection=None, batch_size=500):
+        """Iterate over every public model document from a single cursor"""
+        db = current_app.config['MONGODB_DB']
+        cursor = db.models.find({'is_public': True}, projection).sort('_id', 1).batch_size(batch_size)
+        yield from cursor
+    
+    @staticmethod
+    def get_stats():
+        """Get database statistics from the materialized stats document"""
+        return stats.get_platform_stats()
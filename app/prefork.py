@@ -0,0 +1,31 @@
+"""Helpers for running under a preforking WSGI server (see gunicorn.conf.py).
+
+The master process imports and configures the app once and compiles every
+template, so workers share that memory copy-on-write. Anything that must not
+cross a fork (the Mongo client, the download counter buffer, the invalidation
+listener) is recreated in each worker by ``post_fork``. They are also reset by
+``os.register_at_fork`` hooks, so other prefork servers are covered as well.
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def preload(app):
+    """Compile every template in the master process"""
+    with app.config['STARTUP_REPORT'].phase('templates'):
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+    return app
+
+
+def post_fork(app):
+    """Give a freshly forked worker its own Mongo client and counter buffer"""
+    from app.counters import download_counter
+    from app.invalidation import invalidation_bus
+
+    app.config['MONGODB_CONNECTION'].after_fork()
+    download_counter.after_fork()
+    invalidation_bus.after_fork()
+    logger.info("Worker ready", extra={'pid': os.getpid(), 'max_pool_size': app.config['MONGO_MAX_POOL_SIZE']})
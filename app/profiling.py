@@ -0,0 +1,198 @@
+"""Opt-in profiling of single requests.
+
+An admin adds ``X-Profile: 1`` (or ``?_profile=1``) to a request and it runs
+under ``cProfile`` and ``tracemalloc``. The result - the slowest functions by
+cumulative time, the largest allocation sites, peak traced memory and the
+MongoDB commands issued - is stored in the ``request_profiles`` capped
+collection and its id returned in the ``X-Profile-Id`` header. Profiles are
+listed at ``/api/admin/profiles``.
+
+Requests without the flag only pay for a header lookup; the flag from
+non-admins is ignored. One request per process is profiled at a time (both
+tools are process-wide); a tagged request arriving meanwhile is answered with
+``X-Profile: busy``. Streamed bodies (downloads, exports) are profiled up to
+the point the response is returned, not while the stream is sent.
+"""
+import cProfile
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_login import current_user
+
+from app import log
+
+logger = logging.getLogger(__name__)
+
+PROFILES_COLLECTION = 'request_profiles'
+TRACEBACK_FRAMES = 1
+
+_busy = threading.Lock()
+
+
+def _requested():
+    flag = request.headers.get('X-Profile') or request.args.get('_profile')
+    return flag is not None and flag.lower() in ('1', 'true', 'yes', 'on')
+
+
+def _location(filename, lineno, function):
+    if filename == '~':
+        return function  # built-in
+    return f'{function} ({os.path.basename(filename)}:{lineno})'
+
+
+def top_functions(profiler, limit):
+    """The ``limit`` functions with the highest cumulative time"""
+    import pstats  # only needed once a request has been profiled
+
+    entries = []
+    for (filename, lineno, function), (primitive, calls, own, cumulative, _) in pstats.Stats(profiler).stats.items():
+        entries.append({
+            'function': _location(filename, lineno, function),
+            'calls': calls,
+            'primitive_calls': primitive,
+            'own_ms': round(own * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        })
+    entries.sort(key=lambda entry: entry['cumulative_ms'], reverse=True)
+    return entries[:limit]
+
+
+def top_allocations(before, after, limit):
+    """The ``limit`` source lines that allocated the most memory still held"""
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    differences = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+    sites = []
+    for stat in differences:
+        if stat.size_diff <= 0:
+            continue
+        frame = stat.traceback[0]
+        sites.append({
+            'site': f'{frame.filename}:{frame.lineno}',
+            'size_kb': round(stat.size_diff / 1024, 1),
+            'count': stat.count_diff,
+        })
+        if len(sites) == limit:
+            break
+    return sites
+
+
+def _start():
+    if not _requested():
+        return
+    if not (current_user.is_authenticated and current_user.is_admin):
+        return
+    if not _busy.acquire(blocking=False):
+        g.profile_busy = True
+        return
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(TRACEBACK_FRAMES)
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    g.profile = {
+        'profiler': profiler,
+        'started_tracing': started_tracing,
+        'snapshot': tracemalloc.take_snapshot(),
+        'mongo': log.mongo_usage(),
+        'started': time.perf_counter(),
+    }
+    profiler.enable()
+
+
+def _stop():
+    """Stop both tools; returns the raw measurements or None"""
+    state = g.pop('profile', None)
+    if state is None:
+        return None
+    state['profiler'].disable()
+    try:
+        state['duration'] = time.perf_counter() - state['started']
+        state['after'] = tracemalloc.take_snapshot()
+        state['current'], state['peak'] = tracemalloc.get_traced_memory()
+        if state['started_tracing']:
+            tracemalloc.stop()
+    finally:
+        _busy.release()
+    return state
+
+
+def _finish(response):
+    if g.pop('profile_busy', False):
+        response.headers['X-Profile'] = 'busy'
+        return response
+
+    state = _stop()
+    if state is None:
+        return response
+
+    config = current_app.config
+    limit = config['PROFILE_TOP_N']
+    calls, micros = log.mongo_usage()
+    document = {
+        'created_at': datetime.utcnow(),
+        'method': request.method,
+        'path': request.path,
+        'query': request.query_string.decode('utf-8', 'replace'),
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'user': current_user.username,
+        'pid': os.getpid(),
+        'duration_ms': round(state['duration'] * 1000, 2),
+        'mongo_calls': calls - state['mongo'][0],
+        'mongo_ms': round((micros - state['mongo'][1]) / 1000, 2),
+        'memory': {
+            'peak_kb': round(state['peak'] / 1024, 1),
+            'retained_kb': round(state['current'] / 1024, 1),
+        },
+        'functions': top_functions(state['profiler'], limit),
+        'allocations': top_allocations(state['snapshot'], state['after'], limit),
+    }
+    try:
+        result = _collection(config['MONGODB_DB']).insert_one(document)
+        response.headers['X-Profile-Id'] = str(result.inserted_id)
+    except Exception as e:
+        logger.error("Profile store error: %s", e)
+    return response
+
+
+def _discard(exc=None):
+    # A request that never reached after_request must not keep the tools running
+    if 'profile' in g:
+        _stop()
+
+
+def _collection(db):
+    from pymongo.errors import CollectionInvalid
+
+    if PROFILES_COLLECTION not in db.list_collection_names():
+        try:
+            db.create_collection(PROFILES_COLLECTION, capped=True,
+                                 size=current_app.config['PROFILE_STORE_SIZE'])
+        except CollectionInvalid:
+            pass
+    return db[PROFILES_COLLECTION]
+
+
+def recent(limit=50):
+    """Summaries of the newest profiles, newest first"""
+    db = current_app.config['MONGODB_DB']
+    cursor = db[PROFILES_COLLECTION].find({}, {'functions': 0, 'allocations': 0})
+    return list(cursor.sort('$natural', -1).limit(limit))
+
+
+def get(profile_id):
+    return current_app.config['MONGODB_DB'][PROFILES_COLLECTION].find_one({'_id': profile_id})
+
+
+def init_app(app):
+    if not app.config['PROFILING_ENABLED']:
+        return
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_discard)
@@ -0,0 +1,360 @@
+"""In-memory catalog search.
+
+Public models are indexed in an inverted index over name, description, file
+format and owner username. Queries are ranked with BM25; the last query term is
+also matched as a prefix (for autocomplete) and terms with no match fall back to
+near spellings found through a trigram index of the vocabulary.
+
+The index is built from a projected scan on first use and kept current by
+``Model3D.save()`` / ``Model3D.delete()``. Because each process holds its own
+copy, it is rebuilt once it is older than ``SEARCH_INDEX_MAX_AGE`` seconds so
+changes made by other workers show up eventually.
+
+A rebuild fills a fresh index without holding the lock and swaps it in at the
+end, so searches keep using the old index in the meantime; changes made during
+the build are replayed onto the new one before the swap.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'file_format': 2.0,
+    'owner': 1.5,
+    'description': 1.0
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+PREFIX_PENALTY = 0.8
+FUZZY_PENALTY = 0.6
+MAX_EXPANSIONS = 50
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Attributes holding the index itself, swapped in as a whole after a rebuild
+INDEX_STATE = ('built_at', '_docs', '_doc_terms', '_postings', '_trigram_terms',
+               '_sorted_terms', '_terms_dirty', '_total_length')
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens of a string"""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def _trigrams(term):
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _within_edit_distance(a, b, limit):
+    """True if the Levenshtein distance between a and b is at most limit"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def _fields(row, owner):
+    return {
+        'name': row.get('name'),
+        'description': row.get('description'),
+        'file_format': row.get('file_format'),
+        'owner': owner,
+        'upload_date': row.get('upload_date')
+    }
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        # (doc id, fields or None) changed while a build runs
+        self._pending = None
+        self._expired = False
+        self._reset()
+
+    def _reset(self):
+        self.built_at = None
+        self._docs = {}
+        self._doc_terms = {}
+        self._postings = defaultdict(dict)
+        self._trigram_terms = defaultdict(set)
+        self._sorted_terms = []
+        self._terms_dirty = False
+        self._total_length = 0.0
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def build(self):
+        """Rebuild the index from a projected scan of public models"""
+        with self._build_lock:
+            self._build()
+
+    def _build(self):
+        db = current_app.config['MONGODB_DB']
+        started = time.perf_counter()
+
+        with self._lock:
+            self._pending = []
+        try:
+            rows = list(db.models.find(
+                {'is_public': True},
+                {'name': 1, 'description': 1, 'file_format': 1, 'user_id': 1, 'upload_date': 1}
+            ))
+
+            user_ids = {row['user_id'] for row in rows if row.get('user_id')}
+            owners = {}
+            if user_ids:
+                object_ids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+                for user in db.users.find({'_id': {'$in': object_ids}}, {'username': 1}):
+                    owners[str(user['_id'])] = user['username']
+
+            fresh = SearchIndex()
+            for row in rows:
+                fresh._add(str(row['_id']), **_fields(row, owners.get(row.get('user_id'))))
+
+            with self._lock:
+                for doc_id, fields in self._pending:
+                    fresh._remove(doc_id)
+                    if fields is not None:
+                        fresh._add(doc_id, **fields)
+                fresh.built_at = time.monotonic()
+                for name in INDEX_STATE:
+                    setattr(self, name, getattr(fresh, name))
+                self._expired = False
+        finally:
+            with self._lock:
+                self._pending = None
+
+        elapsed = (time.perf_counter() - started) * 1000
+        logger.info("Search index built", extra={'models': len(rows), 'elapsed_ms': round(elapsed, 1)})
+
+    def _is_stale(self):
+        max_age = current_app.config.get('SEARCH_INDEX_MAX_AGE', 300)
+        return self._expired or time.monotonic() - self.built_at > max_age
+
+    def ensure_built(self):
+        """Build the index if missing; rebuild it when stale, serving the old one meanwhile"""
+        if self.is_built and not self._is_stale():
+            return
+        if self.is_built:
+            # Another thread is already rebuilding: keep answering from the current index
+            if not self._build_lock.acquire(blocking=False):
+                return
+        else:
+            self._build_lock.acquire()
+        try:
+            if not self.is_built or self._is_stale():
+                self._build()
+        finally:
+            self._build_lock.release()
+
+    def invalidate(self):
+        """Mark the index stale; the next search rebuilds it"""
+        self._expired = True
+
+    def reload_model(self, model_id):
+        """Re-read one model after another process changed or deleted it"""
+        if not (self.is_built or self._pending is not None) or not ObjectId.is_valid(model_id):
+            return
+        db = current_app.config['MONGODB_DB']
+        row = db.models.find_one(
+            {'_id': ObjectId(model_id), 'is_public': True},
+            {'name': 1, 'description': 1, 'file_format': 1, 'user_id': 1, 'upload_date': 1}
+        )
+        owner = None
+        if row and row.get('user_id') and ObjectId.is_valid(row['user_id']):
+            owner = db.users.find_one({'_id': ObjectId(row['user_id'])}, {'username': 1})
+
+        with self._lock:
+            self._replace(model_id, _fields(row, owner['username'] if owner else None) if row else None)
+
+    def add_model(self, model, owner_username=None):
+        """Index or re-index a model; private models are removed"""
+        fields = None
+        if model.is_public:
+            fields = {
+                'name': model.name,
+                'description': model.description,
+                'file_format': model.file_format,
+                'owner': owner_username,
+                'upload_date': model.upload_date
+            }
+        with self._lock:
+            self._replace(model.id, fields)
+
+    def remove_model(self, model_id):
+        with self._lock:
+            self._replace(model_id, None)
+
+    def _replace(self, doc_id, fields):
+        # Caller holds the lock; ``fields`` None removes the document
+        if self._pending is not None:
+            self._pending.append((doc_id, fields))
+        if self.is_built:
+            self._remove(doc_id)
+            if fields is not None:
+                self._add(doc_id, **fields)
+
+    def _add(self, doc_id, upload_date=None, **fields):
+        weighted_tf = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(field)):
+                weighted_tf[token] += weight
+
+        length = sum(weighted_tf.values())
+        self._docs[doc_id] = {
+            'name': fields.get('name'),
+            'length': length,
+            'upload_date': upload_date or datetime.min
+        }
+        self._doc_terms[doc_id] = set(weighted_tf)
+        self._total_length += length
+
+        for term, tf in weighted_tf.items():
+            if term not in self._postings:
+                self._terms_dirty = True
+                for trigram in _trigrams(term):
+                    self._trigram_terms[trigram].add(term)
+            self._postings[term][doc_id] = tf
+
+    def _remove(self, doc_id):
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc['length']
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                self._terms_dirty = True
+                for trigram in _trigrams(term):
+                    self._trigram_terms[trigram].discard(term)
+
+    def _prefix_terms(self, prefix):
+        if self._terms_dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._terms_dirty = False
+        start = bisect_left(self._sorted_terms, prefix)
+        matches = []
+        for term in self._sorted_terms[start:]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def _fuzzy_terms(self, token):
+        if len(token) < 4:
+            return []
+        limit = 1 if len(token) < 8 else 2
+        candidates = set()
+        for trigram in _trigrams(token):
+            candidates.update(self._trigram_terms.get(trigram, ()))
+        return [term for term in candidates if _within_edit_distance(token, term, limit)]
+
+    def _expand(self, token, allow_prefix):
+        """Map a query token to (term, penalty) pairs"""
+        expansions = {}
+        if token in self._postings:
+            expansions[token] = 1.0
+        if allow_prefix:
+            prefixed = self._prefix_terms(token)
+            prefixed.sort(key=lambda term: -len(self._postings[term]))
+            for term in prefixed[:MAX_EXPANSIONS]:
+                expansions.setdefault(term, PREFIX_PENALTY)
+        if not expansions:
+            for term in self._fuzzy_terms(token)[:MAX_EXPANSIONS]:
+                expansions[term] = FUZZY_PENALTY
+        return expansions
+
+    def search(self, query, limit=None):
+        """Return model ids ranked by BM25 relevance"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            doc_count = len(self._docs)
+            if not doc_count:
+                return []
+            avg_length = self._total_length / doc_count or 1.0
+
+            scores = defaultdict(float)
+            for position, token in enumerate(tokens):
+                allow_prefix = position == len(tokens) - 1
+                token_scores = {}
+                for term, penalty in self._expand(token, allow_prefix).items():
+                    postings = self._postings[term]
+                    df = len(postings)
+                    idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                    for doc_id, tf in postings.items():
+                        length = self._docs[doc_id]['length']
+                        norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                        score = penalty * idf * tf * (BM25_K1 + 1) / norm
+                        if score > token_scores.get(doc_id, 0.0):
+                            token_scores[doc_id] = score
+                for doc_id, score in token_scores.items():
+                    scores[doc_id] += score
+
+            # Newest first, then a stable sort by score so newer uploads win ties
+            ranked = sorted(scores, key=lambda doc_id: self._docs[doc_id]['upload_date'], reverse=True)
+            ranked.sort(key=lambda doc_id: scores[doc_id], reverse=True)
+
+        return ranked[:limit] if limit else ranked
+
+    def suggest(self, prefix, limit=8):
+        """Return completion terms and best-matching model names for a prefix"""
+        tokens = tokenize(prefix)
+        if not tokens:
+            return {'terms': [], 'models': []}
+
+        with self._lock:
+            last = tokens[-1]
+            terms = self._prefix_terms(last)
+            terms.sort(key=lambda term: -len(self._postings[term]))
+            lead = ' '.join(tokens[:-1])
+            completions = [f'{lead} {term}'.strip() for term in terms[:limit]]
+
+            models = [
+                {'id': doc_id, 'name': self._docs[doc_id]['name']}
+                for doc_id in self.search(prefix, limit=limit)
+            ]
+
+        return {'terms': completions, 'models': models}
+
+
+search_index = SearchIndex()
@@ -0,0 +1,108 @@
+"""JSON serialization of models for the API.
+
+One place turns model documents into API dicts. ``?fields=`` sparse fieldsets
+select which keys are returned and also become the Mongo projection, so
+unneeded fields are never read. Responses are encoded with orjson when it is
+installed (``JSON_BACKEND='auto'``) and with the standard library otherwise;
+both write datetimes as ISO 8601 and ObjectIds as strings, so documents need
+no per-item conversion.
+"""
+import json
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from flask import current_app, request
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+MODEL_FIELDS = (
+    'id', 'name', 'description', 'file_format', 'file_size', 'original_filename',
+    'is_public', 'upload_date', 'download_count', 'owner'
+)
+
+# Document keys each API field is read from
+_SOURCE_KEYS = {
+    'id': '_id',
+    'owner': 'user_id',
+}
+
+
+def parse_fields(value, default=MODEL_FIELDS, allowed=MODEL_FIELDS):
+    """Parse a ``fields=a,b,c`` argument into a tuple of known fields (always with id)"""
+    if not value:
+        return tuple(default)
+    requested = {field.strip() for field in value.split(',')}
+    fields = tuple(field for field in allowed if field in requested or field == 'id')
+    return fields
+
+
+def projection(fields):
+    """Mongo projection reading only what ``fields`` need"""
+    return {_SOURCE_KEYS.get(field, field): 1 for field in fields if field != 'id'}
+
+
+def serialize_model(document, fields=MODEL_FIELDS, owners=None):
+    """API dict for a models collection document (or a Model3D)"""
+    if not isinstance(document, dict):
+        document = dict(document.to_document(), _id=document.id)
+
+    data = {}
+    for field in fields:
+        if field == 'id':
+            data['id'] = str(document['_id'])
+        elif field == 'owner':
+            user_id = document.get('user_id')
+            known = owners is not None and user_id in owners
+            data['owner'] = {
+                'id': user_id if known else None,
+                'username': owners[user_id] if known else 'Unknown'
+            }
+        elif field == 'download_count':
+            data[field] = document.get(field, 0)
+        else:
+            data[field] = document.get(field)
+    return data
+
+
+def pagination(page, per_page, total):
+    total_pages = (total + per_page - 1) // per_page
+    return {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': total_pages,
+        'has_prev': page > 1,
+        'has_next': page < total_pages
+    }
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def encode(payload, backend='auto'):
+    """Encode to JSON bytes; ``backend`` is 'auto', 'orjson' or 'json'"""
+    if orjson is not None and backend in ('auto', 'orjson'):
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(payload):
+    """Encode to JSON bytes with the app's configured backend"""
+    return encode(payload, current_app.config.get('JSON_BACKEND', 'auto'))
+
+
+def json_response(payload, status=200):
+    """Flask response with a JSON body from ``dumps``; 200s get an ETag and honour If-None-Match"""
+    response = current_app.response_class(dumps(payload), status=status, mimetype='application/json')
+    if status == 200:
+        response.add_etag()
+        response.make_conditional(request)
+    return response
@@ -0,0 +1,81 @@
+"""Signed, expiring URLs for model files.
+
+``/api/view/<id>`` and ``/api/download/<id>`` accept ``?f=<file id>&e=<expiry>
+&s=<signature>``, an HMAC-SHA256 over the model id, GridFS file id and expiry.
+A request carrying a valid signature is served straight from GridFS: no model
+lookup, no permission check and no session, so the response is the same for
+everyone holding the URL and is marked cacheable by shared caches (a CDN keys
+it on the URL) until the link expires. GridFS files are never rewritten, so the
+file id doubles as the ETag.
+
+Expiry times are rounded up to a multiple of ``SIGNED_URL_BUCKET`` seconds, so
+every page rendered within one bucket links the same URL and a fronting cache
+sees one URL per file rather than one per page view. A link stays valid for
+between ``SIGNED_URL_TTL`` and ``SIGNED_URL_TTL + SIGNED_URL_BUCKET`` seconds,
+including after the model is made private; deleting the model removes the file
+and ends it at once.
+"""
+import base64
+import hashlib
+import hmac
+import time
+
+from flask import current_app, url_for
+
+
+def _signing_key():
+    secret = current_app.config['SIGNED_URL_SECRET'] or current_app.config['SECRET_KEY']
+    return hmac.new(secret.encode('utf-8'), b'signed-url-v1', hashlib.sha256).digest()
+
+
+def signature(model_id, file_id, expires):
+    message = f'{model_id}:{file_id}:{expires}'.encode('utf-8')
+    digest = hmac.new(_signing_key(), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode('ascii')
+
+
+def expiry(now=None):
+    """Expiry timestamp for links issued now (stable within a bucket)"""
+    config = current_app.config
+    bucket = config['SIGNED_URL_BUCKET']
+    deadline = int(now if now is not None else time.time()) + config['SIGNED_URL_TTL']
+    return -(-deadline // bucket) * bucket
+
+
+def file_url(model, endpoint='api.view_model', **values):
+    """Signed URL of a model's file for ``api.view_model`` or ``api.download_model``"""
+    if not model.gridfs_file_id:
+        return url_for(endpoint, model_id=model.id, **values)
+    expires = expiry()
+    return url_for(endpoint, model_id=model.id, f=model.gridfs_file_id, e=expires,
+                   s=signature(model.id, model.gridfs_file_id, expires), **values)
+
+
+def verify(model_id, args):
+    """(file id, seconds left) for valid signed query args, (None, 0) otherwise"""
+    file_id = args.get('f', '')
+    signed = args.get('s', '')
+    try:
+        expires = int(args.get('e', ''))
+    except ValueError:
+        return None, 0
+    remaining = expires - int(time.time())
+    if not file_id or remaining <= 0:
+        return None, 0
+    # Bytes on both sides: compare_digest rejects non-ASCII str with TypeError
+    expected = signature(model_id, file_id, expires).encode('ascii')
+    if not hmac.compare_digest(signed.encode('utf-8'), expected):
+        return None, 0
+    return file_id, remaining
+
+
+SIGNED_PARAMS = ('f', 'e', 's')
+
+
+def is_signed(args):
+    """True if the query carries a complete signed-link parameter set"""
+    return all(args.get(name) for name in SIGNED_PARAMS)
+
+
+def init_app(app):
+    app.jinja_env.globals['signed_file_url'] = file_url
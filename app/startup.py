@@ -0,0 +1,44 @@
+"""Cold-start timing report.
+
+``create_app()`` times each initialization phase and the serverless entry
+point adds the time spent importing the package, so a cold start can be broken
+down into import time versus init time. The report is printed once and kept in
+``app.config['STARTUP_REPORT']``.
+
+Only the MongoDB connection (and, in lazy mode, the index check) is deferred
+past startup. The view modules are still imported by ``create_app()``, so the
+``blueprints`` phase is mostly the import of ``app.api``, ``app.main`` and the
+modules they use.
+"""
+import time
+from contextlib import contextmanager
+
+
+class StartupReport:
+    def __init__(self):
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.phases.append((name, seconds * 1000))
+
+    @property
+    def total_ms(self):
+        return sum(ms for _, ms in self.phases)
+
+    def as_dict(self):
+        return {
+            'phases_ms': {name: round(ms, 2) for name, ms in self.phases},
+            'total_ms': round(self.total_ms, 2)
+        }
+
+    def summary(self):
+        parts = ', '.join(f'{name} {ms:.1f}' for name, ms in self.phases)
+        return f"⏱️ Startup {self.total_ms:.1f} ms ({parts})"
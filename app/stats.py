@@ -0,0 +1,152 @@
+"""Materialized platform statistics.
+
+The counters live in a single document of the ``platform_stats`` collection and
+are updated with ``$inc`` as users and models are created, deleted and
+downloaded. A reconciliation pass recomputes them from the source collections
+whenever the document is older than ``STATS_RECONCILE_INTERVAL`` seconds, and a
+short-TTL in-process cache sits in front of the read path.
+
+A due reconciliation is claimed with a conditional update of ``reconciled_at``,
+so only one reader recounts while the others keep serving the stored counters.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+STATS_DOC_ID = 'platform'
+STAT_FIELDS = ('total_models', 'public_models', 'total_users', 'total_downloads')
+
+_cache = {'value': None, 'expires': 0.0}
+_cache_lock = threading.Lock()
+
+
+def _collection():
+    return current_app.config['MONGODB_DB'].platform_stats
+
+
+def invalidate_cache():
+    """Drop the cached stats so the next read hits MongoDB"""
+    with _cache_lock:
+        _cache['value'] = None
+        _cache['expires'] = 0.0
+
+
+def bump(**deltas):
+    """Apply counter deltas, e.g. ``bump(total_models=1, public_models=1)``; False on error"""
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return True
+
+    try:
+        _collection().update_one(
+            {'_id': STATS_DOC_ID},
+            {'$inc': deltas},
+            upsert=True
+        )
+    except Exception as e:
+        # Counters are repaired by the next reconciliation pass
+        logger.error("Stats update error: %s", e)
+        return False
+
+    with _cache_lock:
+        if _cache['value'] is not None:
+            for key, value in deltas.items():
+                _cache['value'][key] = _cache['value'].get(key, 0) + value
+    return True
+
+
+def reconcile(baseline=None):
+    """Recompute every counter from the source collections and store the result.
+
+    The stored counters are moved by the difference between the fresh counts
+    and ``baseline`` (the document as read before counting) with ``$inc``, so
+    increments that land while the collections are being counted are kept
+    instead of being overwritten.
+    """
+    from pymongo import ReturnDocument
+
+    db = current_app.config['MONGODB_DB']
+    if baseline is None:
+        baseline = _collection().find_one({'_id': STATS_DOC_ID}) or {}
+
+    total_models = db.models.count_documents({})
+    public_models = db.models.count_documents({'is_public': True})
+    total_users = db.users.count_documents({})
+
+    pipeline = [
+        {'$group': {'_id': None, 'total_downloads': {'$sum': '$download_count'}}}
+    ]
+    download_result = list(db.models.aggregate(pipeline))
+    total_downloads = download_result[0]['total_downloads'] if download_result else 0
+
+    counts = {
+        'total_models': total_models,
+        'public_models': public_models,
+        'total_users': total_users,
+        'total_downloads': total_downloads
+    }
+
+    doc = _collection().find_one_and_update(
+        {'_id': STATS_DOC_ID},
+        {
+            '$inc': {field: counts[field] - baseline.get(field, 0) for field in STAT_FIELDS},
+            '$set': {'reconciled_at': datetime.utcnow()}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    invalidate_cache()
+    return {field: doc.get(field, 0) for field in STAT_FIELDS}
+
+
+def _claim_reconcile(doc):
+    """Claim a due reconciliation; the document as of the claim, or None if another process has it"""
+    from pymongo import ReturnDocument
+    from pymongo.errors import DuplicateKeyError
+
+    seen = doc.get('reconciled_at') if doc else None
+    try:
+        # Only one reader moves reconciled_at off the value it saw; the rest keep serving the stored counters
+        return _collection().find_one_and_update(
+            {'_id': STATS_DOC_ID, 'reconciled_at': seen},
+            {'$set': {'reconciled_at': datetime.utcnow()}},
+            upsert=doc is None,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return None
+
+
+def get_platform_stats():
+    """Return platform counters from cache or the materialized document"""
+    now = time.monotonic()
+    with _cache_lock:
+        if _cache['value'] is not None and _cache['expires'] > now:
+            metrics.cache_lookup('stats', hit=True)
+            return dict(_cache['value'])
+    metrics.cache_lookup('stats', hit=False)
+
+    doc = _collection().find_one({'_id': STATS_DOC_ID})
+    interval = current_app.config.get('STATS_RECONCILE_INTERVAL', 3600)
+    reconciled_at = doc.get('reconciled_at') if doc else None
+
+    baseline = None
+    if reconciled_at is None or datetime.utcnow() - reconciled_at > timedelta(seconds=interval):
+        baseline = _claim_reconcile(doc)
+    if baseline is not None:
+        stats = reconcile(baseline)
+    else:
+        stats = {field: (doc or {}).get(field, 0) for field in STAT_FIELDS}
+
+    with _cache_lock:
+        _cache['value'] = dict(stats)
+        _cache['expires'] = now + current_app.config.get('STATS_CACHE_TTL', 30)
+
+    return stats
@@ -0,0 +1,181 @@
+"""Personal API tokens for scripted ``/api/*`` clients.
+
+A token is ``amt_<claims>.<signature>``: the claims (token id, user id,
+username, expiry) are base64url-encoded and signed with HMAC-SHA256 under a key
+derived from ``API_TOKEN_SECRET`` (``SECRET_KEY`` by default). Verifying one is
+a constant-time compare, so an authenticated request needs neither a password
+hash nor a user lookup; ``current_user`` is built from the claims.
+
+Each token also has a record in ``api_tokens`` holding only a SHA-256 hash of
+the token, for listing and revocation. Revoked ids are kept in an in-memory set
+per process, reloaded every ``API_TOKEN_REVOCATION_TTL`` seconds and at once
+when the invalidation bus reports a change to ``api_tokens``. A revoked token
+can therefore keep working in another worker for at most that long when the
+bus is off.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app, request
+
+from app.invalidation import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'amt_'
+COLLECTION = 'api_tokens'
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _signing_key():
+    secret = current_app.config['API_TOKEN_SECRET'] or current_app.config['SECRET_KEY']
+    # A derived key, so a leaked token signature says nothing about SECRET_KEY itself
+    return hmac.new(secret.encode('utf-8'), b'api-token-v1', hashlib.sha256).digest()
+
+
+def _sign(payload):
+    return _b64encode(hmac.new(_signing_key(), payload.encode('ascii'), hashlib.sha256).digest())
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def encode(token_id, user_id, username, expires_at=None):
+    expires = int(expires_at.replace(tzinfo=timezone.utc).timestamp()) if expires_at else 0
+    payload = _b64encode(f'{token_id}:{user_id}:{expires}:{username}'.encode('utf-8'))
+    return f'{PREFIX}{payload}.{_sign(payload)}'
+
+
+def decode(token):
+    """Claims dict of a validly signed, unexpired token, else None (revocation not checked)"""
+    if not token.startswith(PREFIX):
+        return None
+    payload, _, signature = token[len(PREFIX):].partition('.')
+    try:
+        # Bytes on both sides: compare_digest rejects non-ASCII str with TypeError
+        if not payload or not hmac.compare_digest(signature.encode('utf-8'), _sign(payload).encode('ascii')):
+            return None
+        token_id, user_id, expires, username = _b64decode(payload).decode('utf-8').split(':', 3)
+        expires = int(expires)
+    except (ValueError, UnicodeError, TypeError):
+        return None
+    if expires and expires <= time.time():
+        return None
+    return {'token_id': token_id, 'user_id': user_id, 'username': username, 'expires': expires}
+
+
+class RevocationList:
+    """Ids of revoked, not yet expired tokens, refreshed from Mongo periodically"""
+
+    def __init__(self):
+        self.max_age = 60
+        self._ids = frozenset()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, token_id):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+            self.refresh()
+        return token_id in self._ids
+
+    def refresh(self):
+        with self._lock:
+            try:
+                now = datetime.utcnow()
+                cursor = current_app.config['MONGODB_DB'][COLLECTION].find(
+                    {'revoked_at': {'$ne': None}, '$or': [{'expires_at': None}, {'expires_at': {'$gt': now}}]},
+                    {'_id': 1}
+                )
+                self._ids = frozenset(document['_id'] for document in cursor)
+            except Exception as e:
+                # Keep the previous set; try again on the next check
+                logger.error("API token revocation refresh error: %s", e)
+            self._loaded_at = time.monotonic()
+
+    def add(self, token_id):
+        self._ids = self._ids | {token_id}
+
+    def invalidate(self):
+        self._loaded_at = None
+
+
+revoked = RevocationList()
+
+
+def init_app(app):
+    revoked.max_age = app.config['API_TOKEN_REVOCATION_TTL']
+    revoked.invalidate()
+
+
+def create(user, name, expires_in_days=None):
+    """Store a new token record; returns (token, record). The token is not stored."""
+    token_id = secrets.token_hex(8)
+    now = datetime.utcnow()
+    expires_at = now + timedelta(days=expires_in_days) if expires_in_days else None
+    token = encode(token_id, user.id, user.username, expires_at)
+    record = {
+        '_id': token_id,
+        'user_id': user.id,
+        'name': name,
+        'token_hash': hash_token(token),
+        'created_at': now,
+        'expires_at': expires_at,
+        'revoked_at': None,
+    }
+    current_app.config['MONGODB_DB'][COLLECTION].insert_one(record)
+    return token, record
+
+
+def list_for_user(user_id):
+    cursor = current_app.config['MONGODB_DB'][COLLECTION].find({'user_id': user_id}, {'token_hash': 0})
+    return list(cursor.sort('created_at', -1))
+
+
+def revoke(user_id, token_id):
+    """Revoke one of ``user_id``'s tokens; False if there is no such active token"""
+    result = current_app.config['MONGODB_DB'][COLLECTION].update_one(
+        {'_id': token_id, 'user_id': user_id, 'revoked_at': None},
+        {'$set': {'revoked_at': datetime.utcnow()}}
+    )
+    if not result.modified_count:
+        return False
+    revoked.add(token_id)
+    invalidation_bus.publish(COLLECTION, 'update', token_id)
+    return True
+
+
+def user_from_request():
+    """The user named by a valid ``Authorization: Bearer`` token on an API request, else None"""
+    if request.blueprint != 'api':
+        return None
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    claims = decode(token.strip())
+    if claims is None or claims['token_id'] in revoked:
+        return None
+
+    from app.models import User
+    user = User(username=claims['username'], _id=claims['user_id'])
+    user.api_token_id = claims['token_id']
+    return user
+
+
+@invalidation_bus.register
+def _reload_revocations(event):
+    if event['op'] == 'reset' or event['collection'] == COLLECTION:
+        revoked.invalidate()
@@ -0,0 +1,11 @@
+# ASGI entry point: async /api/* handlers with the Flask app mounted behind them
+#   pip install -r requirements-server.txt
+#   uvicorn asgi:app --workers 4
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.asgi import create_asgi_app
+
+app = create_asgi_app()
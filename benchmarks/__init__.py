@@ -0,0 +1 @@
+"""Offline benchmarks and load generation for the asset manager"""
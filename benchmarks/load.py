@@ -0,0 +1,416 @@
+"""Synthetic load against a running deployment (standard library only).
+
+Virtual users replay a weighted mix of operations over keep-alive HTTP/1.1
+connections for a fixed duration, then the driver reports throughput, error
+rate and latency percentiles per operation and overall:
+
+* ``browse``    - anonymous ``/browse`` pages
+* ``models``    - anonymous ``/api/models`` pages
+* ``browse_cold``, ``models_cold`` - the same with a distinct query string
+  per request, so neither the response cache nor the page cache can answer
+* ``viewer``    - card viewer fetches of ``/api/view/<id>``
+* ``detail``    - anonymous ``/model/<id>`` pages
+* ``dashboard`` - a logged-in user's ``/dashboard``
+* ``upload``    - ``/api/upload`` of a procedural STL, OBJ or GLB mesh
+* ``download``  - ``/api/download/<id>``
+
+    python -m benchmarks.load --url http://localhost:8000 --concurrency 32 --duration 60
+    python -m benchmarks.load --mix browse=50,viewer=30,download=20 --json result.json
+
+For capacity planning, run it at increasing ``--concurrency`` against one
+worker and watch where p99 turns up while throughput stops growing; that is
+the per-worker ceiling to divide the expected peak rate by. Uploads create
+real models, so point it at a staging deployment. The cold operations fill the
+response cache with single-use entries; that is the point, but expect them to
+evict the warm ones in a memory cache.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import ssl
+import sys
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks import meshes
+from benchmarks.run import percentile
+
+DEFAULT_MIX = 'browse=35,viewer=25,detail=15,dashboard=10,download=10,upload=5'
+AUTHENTICATED = {'dashboard', 'upload'}
+NEEDS_MODEL = {'viewer', 'detail', 'download'}
+PASSWORD = 'load-test-password'
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection, reopened when the server closes it"""
+
+    def __init__(self, host, port, use_ssl):
+        self.host = host
+        self.port = port
+        self.ssl = ssl.create_default_context() if use_ssl else None
+        self.reader = None
+        self.writer = None
+
+    async def _open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        """(status, [(header, value)], body bytes)"""
+        for attempt in (1, 2):
+            reused = self.writer is not None
+            if not reused:
+                await self._open()
+            try:
+                return await self._exchange(method, path, headers or {}, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                # A kept-alive connection may have been closed by the server meanwhile
+                if not reused or attempt == 2:
+                    raise
+
+    async def _exchange(self, method, path, headers, body):
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}', f'Content-Length: {len(body)}']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b'\r\n')
+        parts = status_line.decode('latin-1').split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise HTTPError(f'Malformed status line: {status_line!r}')
+        status = int(parts[1])
+
+        response_headers = []
+        while True:
+            line = await self.reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers.append((name.strip().lower(), value.strip()))
+        fields = dict(response_headers)
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            payload = b''
+        elif fields.get('transfer-encoding', '').lower() == 'chunked':
+            payload = await self._read_chunked()
+        elif 'content-length' in fields:
+            payload = await self.reader.readexactly(int(fields['content-length']))
+        else:
+            payload = await self.reader.read()
+            self.close()
+            return status, response_headers, payload
+
+        if fields.get('connection', '').lower() == 'close' or parts[0] == 'HTTP/1.0':
+            self.close()
+        return status, response_headers, payload
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            if size == 0:
+                # Trailers, if any, end with an empty line
+                while await self.reader.readuntil(b'\r\n') != b'\r\n':
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+
+def multipart(fields, files):
+    """(content type, body) of a multipart/form-data request"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return f'multipart/form-data; boundary={boundary}', b''.join(parts)
+
+
+def form(fields):
+    return 'application/x-www-form-urlencoded', urlencode(fields).encode()
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'unknown operation "{name}" (choose from {", ".join(OPERATIONS)})')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class VirtualUser:
+    def __init__(self, index, target, shared, rng):
+        self.index = index
+        self.target = target
+        self.shared = shared
+        self.rng = rng
+        self.connection = Connection(target.hostname, target.port or (443 if target.scheme == 'https' else 80),
+                                     target.scheme == 'https')
+        self.cookies = {}
+        self.username = f'{shared["user_prefix"]}{index % shared["users"]}'
+
+    async def send(self, method, path, authenticated=False, content=None):
+        headers = {}
+        body = b''
+        if content is not None:
+            headers['Content-Type'], body = content
+        if authenticated and self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        status, response_headers, payload = await self.connection.request(method, path, headers, body)
+        if authenticated:
+            for name, value in response_headers:
+                if name == 'set-cookie':
+                    cookie_name, _, rest = value.partition('=')
+                    self.cookies[cookie_name] = rest.split(';', 1)[0]
+        return status, payload
+
+    async def log_in(self):
+        await self.send('POST', '/auth/register', True, form({
+            'username': self.username, 'email': f'{self.username}@example.com', 'password': PASSWORD,
+        }))
+        status, _ = await self.send('POST', '/auth/login', True, form({
+            'login_field': self.username, 'password': PASSWORD,
+        }))
+        # A successful login redirects; a failed one re-renders the form
+        if status != 302:
+            raise HTTPError(f'Could not log in as {self.username} (status {status})')
+
+    def model_id(self):
+        return self.rng.choice(self.shared['model_ids'])
+
+
+async def op_browse(user):
+    return await user.send('GET', f'/browse?page={user.rng.randint(1, user.shared["pages"])}')
+
+
+async def op_models(user):
+    return await user.send('GET', f'/api/models?page={user.rng.randint(1, user.shared["pages"])}&per_page=12')
+
+
+def _cache_buster(user):
+    # Views ignore the argument, but it is part of every cache key
+    return f'nocache={user.rng.getrandbits(64):016x}'
+
+
+async def op_browse_cold(user):
+    return await user.send('GET', f'/browse?page={user.rng.randint(1, user.shared["pages"])}&{_cache_buster(user)}')
+
+
+async def op_models_cold(user):
+    page = user.rng.randint(1, user.shared['pages'])
+    return await user.send('GET', f'/api/models?page={page}&per_page=12&{_cache_buster(user)}')
+
+
+async def op_viewer(user):
+    return await user.send('GET', f'/api/view/{user.model_id()}')
+
+
+async def op_detail(user):
+    return await user.send('GET', f'/model/{user.model_id()}')
+
+
+async def op_dashboard(user):
+    return await user.send('GET', '/dashboard', authenticated=True)
+
+
+async def op_download(user):
+    return await user.send('GET', f'/api/download/{user.model_id()}')
+
+
+async def op_upload(user):
+    filename, data = user.rng.choice(user.shared['meshes'])
+    status, payload = await user.send('POST', '/api/upload', True, multipart(
+        {'name': f'Load test {filename}', 'description': 'Procedural mesh', 'is_public': 'true'},
+        {'file': (filename, data)},
+    ))
+    if status == 201:
+        user.shared['model_ids'].append(json.loads(payload)['model']['id'])
+    return status, payload
+
+
+OPERATIONS = {
+    'browse': op_browse,
+    'browse_cold': op_browse_cold,
+    'models': op_models,
+    'models_cold': op_models_cold,
+    'viewer': op_viewer,
+    'detail': op_detail,
+    'dashboard': op_dashboard,
+    'download': op_download,
+    'upload': op_upload,
+}
+
+
+class Recorder:
+    """Per-operation latencies of requests started after ``measure_from``"""
+
+    def __init__(self, measure_from):
+        self.measure_from = measure_from
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, elapsed, status, started_at):
+        if started_at < self.measure_from:
+            return
+        self.latencies[name].append(elapsed)
+        self.statuses[name][status] += 1
+        if not isinstance(status, int) or status >= 300:
+            self.errors[name] += 1
+
+    def report(self, elapsed):
+        rows = {}
+        everything = []
+        for name, durations in sorted(self.latencies.items()):
+            everything.extend(durations)
+            rows[name] = self._row(durations, self.errors[name], elapsed)
+            rows[name]['statuses'] = {str(status): count for status, count in self.statuses[name].items()}
+        rows['total'] = self._row(everything, sum(self.errors.values()), elapsed)
+        return rows
+
+    @staticmethod
+    def _row(durations, errors, elapsed):
+        ordered = sorted(durations)
+        return {
+            'requests': len(ordered),
+            'errors': errors,
+            'error_rate': round(errors / len(ordered), 4) if ordered else 0.0,
+            'throughput_rps': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+            'p90_ms': round(percentile(ordered, 0.90) * 1000, 2),
+            'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+            'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        }
+
+
+async def discover(target, shared, catalog_pages):
+    """Public model ids and the number of browse pages"""
+    user = VirtualUser(0, target, shared, random.Random())
+    ids = []
+    total = 0
+    for page in range(1, catalog_pages + 1):
+        status, payload = await user.send('GET', f'/api/models?page={page}&per_page=100&fields=id')
+        if status != 200:
+            raise HTTPError(f'/api/models returned {status}')
+        listing = json.loads(payload)
+        ids.extend(model['id'] for model in listing['models'])
+        total = listing['pagination']['total']
+        if not listing['pagination']['has_next']:
+            break
+    user.connection.close()
+    shared['model_ids'] = ids
+    # /browse shows 12 models per page
+    shared['pages'] = max(1, math.ceil(total / 12))
+
+
+async def run_user(user, mix, deadline, think_time, recorder):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    try:
+        if AUTHENTICATED & set(names):
+            await user.log_in()
+        while time.monotonic() < deadline:
+            name = user.rng.choices(names, weights)[0]
+            if name in NEEDS_MODEL and not user.shared['model_ids']:
+                name = 'browse'
+            started_at = time.monotonic()
+            started = time.perf_counter()
+            try:
+                status, _ = await OPERATIONS[name](user)
+            except (OSError, asyncio.IncompleteReadError, HTTPError, ValueError) as e:
+                status = type(e).__name__
+                user.connection.close()
+            recorder.record(name, time.perf_counter() - started, status, started_at)
+            if think_time:
+                await asyncio.sleep(user.rng.expovariate(1 / think_time))
+    except HTTPError as e:
+        recorder.record('login', 0.0, str(e), recorder.measure_from)
+    finally:
+        user.connection.close()
+
+
+async def drive(args):
+    target = urlsplit(args.url)
+    rng = random.Random(args.seed)
+    shared = {'users': args.users, 'user_prefix': args.user_prefix}
+
+    print(f'Generating meshes ({", ".join(map(str, args.triangles))} triangles)...')
+    shared['meshes'] = [
+        (f'mesh-{triangles}-{seed}.{file_format}', meshes.make(file_format, triangles, seed))
+        for file_format in meshes.WRITERS for triangles in args.triangles for seed in range(2)
+    ]
+    await discover(target, shared, args.catalog_pages)
+    print(f'Found {len(shared["model_ids"])} public models; running {args.concurrency} users '
+          f'for {args.warmup}s warm-up + {args.duration}s')
+
+    # Requests during the warm-up (cold caches, new connections) are not recorded
+    measure_from = time.monotonic() + args.warmup
+    deadline = measure_from + args.duration
+    recorder = Recorder(measure_from)
+    users = [VirtualUser(index, target, shared, random.Random(rng.random())) for index in range(args.concurrency)]
+    await asyncio.gather(*(run_user(user, args.mix, deadline, args.think_time, recorder) for user in users))
+    return recorder.report(time.monotonic() - measure_from)
+
+
+def print_report(rows):
+    print(f'{"operation":12} {"requests":>9} {"req/s":>8} {"errors":>7} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9} {"max ms":>9}')
+    for name, row in rows.items():
+        print(f'{name:12} {row["requests"]:>9} {row["throughput_rps"]:>8.1f} {row["error_rate"]:>7.1%} '
+              f'{row["p50_ms"]:>9.1f} {row["p90_ms"]:>9.1f} {row["p99_ms"]:>9.1f} {row["max_ms"]:>9.1f}')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://localhost:5000', help='base URL of the deployment')
+    parser.add_argument('--concurrency', type=int, default=16, help='virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds before that')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'operation weights (default {DEFAULT_MIX})')
+    parser.add_argument('--think-time', type=float, default=0,
+                        help='mean pause between a user\'s requests in seconds (0 = closed loop)')
+    parser.add_argument('--users', type=int, default=10, help='distinct accounts for logged-in operations')
+    parser.add_argument('--user-prefix', default='loaduser')
+    parser.add_argument('--triangles', type=lambda value: [int(part) for part in value.split(',')],
+                        default=[1_000, 20_000], help='upload mesh sizes (comma-separated)')
+    parser.add_argument('--catalog-pages', type=int, default=5, help='pages of 100 public models to sample')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the report to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows = asyncio.run(drive(args))
+    print_report(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'url': args.url, 'concurrency': args.concurrency, 'duration': args.duration,
+                       'mix': args.mix, 'results': rows}, f, indent=2)
+    return 1 if rows['total']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Procedural meshes with an exact triangle count.
+
+A height field over a square grid: ``triangles`` / 2 quads, each split in two,
+with a deterministic wavy surface so files are not trivially compressible.
+File sizes are predictable - binary STL is 84 + 50 bytes per triangle.
+"""
+import json
+import math
+import struct
+
+# name -> triangle count; the largest binary STL stays under the 4 MB upload limit
+SIZES = {
+    'small': 1_000,
+    'medium': 20_000,
+    'large': 70_000,
+}
+
+
+def grid(triangles, seed=0):
+    """(vertices, faces) of a height field with exactly ``triangles`` faces"""
+    quads = math.ceil(triangles / 2)
+    columns = max(1, math.ceil(math.sqrt(quads)))
+    rows = math.ceil(quads / columns)
+    phase = seed * 0.37
+
+    vertices = []
+    for row in range(rows + 1):
+        for column in range(columns + 1):
+            x = column / columns
+            y = row / rows
+            z = 0.1 * math.sin(6.0 * x + phase) * math.cos(4.0 * y - phase)
+            vertices.append((x, y, z))
+
+    faces = []
+    stride = columns + 1
+    for row in range(rows):
+        for column in range(columns):
+            a = row * stride + column
+            b, c, d = a + 1, a + stride, a + stride + 1
+            faces.append((a, b, d))
+            faces.append((a, d, c))
+    return vertices, faces[:triangles]
+
+
+def _normal(p, q, r):
+    ux, uy, uz = q[0] - p[0], q[1] - p[1], q[2] - p[2]
+    vx, vy, vz = r[0] - p[0], r[1] - p[1], r[2] - p[2]
+    nx, ny, nz = uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx
+    length = math.sqrt(nx * nx + ny * ny + nz * nz) or 1.0
+    return nx / length, ny / length, nz / length
+
+
+def stl_binary(triangles, seed=0):
+    vertices, faces = grid(triangles, seed)
+    header = f'procedural grid {triangles} triangles'.encode('ascii').ljust(80, b' ')
+    parts = [header, struct.pack('<I', len(faces))]
+    record = struct.Struct('<12fH')
+    for a, b, c in faces:
+        p, q, r = vertices[a], vertices[b], vertices[c]
+        parts.append(record.pack(*_normal(p, q, r), *p, *q, *r, 0))
+    return b''.join(parts)
+
+
+def obj(triangles, seed=0):
+    vertices, faces = grid(triangles, seed)
+    lines = ['# procedural grid']
+    lines.extend('v {:.6f} {:.6f} {:.6f}'.format(*vertex) for vertex in vertices)
+    lines.extend(f'f {a + 1} {b + 1} {c + 1}' for a, b, c in faces)
+    return ('\n'.join(lines) + '\n').encode('ascii')
+
+
+def glb(triangles, seed=0):
+    """Binary glTF 2.0 with one indexed mesh (float positions, uint32 indices)"""
+    vertices, faces = grid(triangles, seed)
+    positions = b''.join(struct.pack('<3f', *vertex) for vertex in vertices)
+    indices = b''.join(struct.pack('<3I', *face) for face in faces)
+    binary = positions + indices
+
+    document = {
+        'asset': {'version': '2.0', 'generator': 'benchmarks.meshes'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}],
+        'meshes': [{'primitives': [{'attributes': {'POSITION': 0}, 'indices': 1}]}],
+        'buffers': [{'byteLength': len(binary)}],
+        'bufferViews': [
+            {'buffer': 0, 'byteOffset': 0, 'byteLength': len(positions), 'target': 34962},
+            {'buffer': 0, 'byteOffset': len(positions), 'byteLength': len(indices), 'target': 34963},
+        ],
+        'accessors': [
+            {'bufferView': 0, 'componentType': 5126, 'count': len(vertices), 'type': 'VEC3',
+             'min': [min(vertex[axis] for vertex in vertices) for axis in range(3)],
+             'max': [max(vertex[axis] for vertex in vertices) for axis in range(3)]},
+            {'bufferView': 1, 'componentType': 5125, 'count': len(faces) * 3, 'type': 'SCALAR'},
+        ],
+    }
+    json_chunk = json.dumps(document, separators=(',', ':')).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    binary += b'\0' * (-len(binary) % 4)
+    total = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    return b''.join([
+        struct.pack('<4sII', b'glTF', 2, total),
+        struct.pack('<II', len(json_chunk), 0x4E4F534A), json_chunk,
+        struct.pack('<II', len(binary), 0x004E4942), binary,
+    ])
+
+
+WRITERS = {
+    'stl': stl_binary,
+    'obj': obj,
+    'glb': glb,
+}
+
+
+def make(file_format, triangles, seed=0):
+    """File bytes for ``file_format`` ('stl', 'obj' or 'glb')"""
+    return WRITERS[file_format](triangles, seed)
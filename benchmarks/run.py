@@ -0,0 +1,318 @@
+"""Offline benchmarks of the hot request paths.
+
+Seeds a dedicated database with synthetic users and models, then drives the
+app through the Flask test client and reports throughput and p50/p99 latency
+per scenario. No network or HTTP server is involved, so the numbers track the
+application and database work only. The ``*_cold`` scenarios repeat a listing
+with the response, page, facet and card caches bypassed, so they measure the
+query and render path that every cache miss pays.
+
+    python -m benchmarks.run                          # local mongod
+    python -m benchmarks.run --in-process             # mongomock, if installed
+    python -m benchmarks.run --save-baseline          # write the baseline
+    python -m benchmarks.run --compare                # exit 1 on a regression
+
+The database named in ``--mongo-uri`` is dropped before seeding, so its name
+must contain "bench". Baselines are machine-specific; record one per machine
+(or CI runner) and compare against that.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks import meshes
+
+DEFAULT_URI = 'mongodb://localhost:27017/asset_manager_bench?directConnection=true'
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'local.json')
+PASSWORD = 'bench-password'
+
+# Scenario order matters: uploads change the catalog and run last
+SCENARIOS = ('api_models', 'api_models_cold', 'browse', 'browse_cold', 'api_stats', 'api_view',
+             'api_download', 'api_upload')
+
+# A regression is a latency increase or a throughput drop beyond the threshold
+LATENCY_KEYS = ('p50_ms', 'p99_ms')
+THROUGHPUT_KEY = 'throughput_rps'
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(durations, errors, elapsed):
+    ordered = sorted(durations)
+    return {
+        'requests': len(durations),
+        'errors': errors,
+        THROUGHPUT_KEY: round(len(durations) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+    }
+
+
+def _use_in_process_mongo():
+    try:
+        import mongomock
+        import mongomock.gridfs
+    except ImportError:
+        sys.exit('--in-process needs mongomock (pip install mongomock)')
+    import pymongo
+
+    mongomock.gridfs.enable_gridfs_integration()
+    client = mongomock.MongoClient()
+    # MongoConnection imports MongoClient from pymongo when it first connects
+    pymongo.MongoClient = lambda uri, **options: client
+
+
+def create_bench_app(args):
+    os.environ['MONGODB_URI'] = args.mongo_uri
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key')
+    # Only the request paths are measured: no listener threads, quiet logs
+    os.environ.setdefault('INVALIDATION_SOURCE', 'off')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['PROFILING_ENABLED'] = 'false'
+    if args.response_cache:
+        os.environ['RESPONSE_CACHE_BACKEND'] = args.response_cache
+    if args.in_process:
+        _use_in_process_mongo()
+
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+def seed(app, users, models, rng):
+    """Create ``users`` users owning ``models`` models in total; returns public model ids"""
+    from app.db import ensure_indexes
+    from app.models import Model3D, User
+
+    db = app.config['MONGODB_DB']
+    fs = app.config['GRIDFS']
+    if 'bench' not in db.name:
+        sys.exit(f'Refusing to drop database "{db.name}": its name must contain "bench"')
+    db.client.drop_database(db.name)
+    ensure_indexes(db)
+
+    # A few distinct meshes per size, shared between models like real duplicates would be
+    variants = {}
+    for size, triangles in meshes.SIZES.items():
+        for file_format in meshes.WRITERS:
+            for seed_value in range(3):
+                variants[(size, file_format, seed_value)] = meshes.make(file_format, triangles, seed_value)
+    weights = {'small': 0.7, 'medium': 0.25, 'large': 0.05}
+    sizes = list(weights)
+
+    owners = []
+    for index in range(users):
+        user = User(username=f'bench{index}', email=f'bench{index}@example.com')
+        user.set_password(PASSWORD)
+        user.save()
+        owners.append(user)
+
+    pending = []
+    for index in range(models):
+        owner = owners[index % len(owners)]
+        size = rng.choices(sizes, [weights[name] for name in sizes])[0]
+        file_format = rng.choice(list(meshes.WRITERS))
+        data = variants[(size, file_format, rng.randrange(3))]
+        filename = f'{size}-{index}.{file_format}'
+        file_id = fs.put(data, filename=filename, content_type='application/octet-stream',
+                         metadata={'original_filename': filename, 'uploaded_by': owner.id})
+        pending.append(Model3D(
+            name=f'{size.title()} mesh {index}',
+            description=f'Procedural {meshes.SIZES[size]} triangle {file_format.upper()} grid',
+            file_format=file_format,
+            file_size=len(data),
+            original_filename=filename,
+            user_id=owner.id,
+            is_public=rng.random() < 0.8,
+            gridfs_file_id=str(file_id)
+        ))
+    for start in range(0, len(pending), 500):
+        Model3D.insert_many(pending[start:start + 500])
+    return [model.id for model in pending if model.is_public]
+
+
+def _login(client, username):
+    client.post('/auth/login', data={'login_field': username, 'password': PASSWORD})
+
+
+def _uncached(issue):
+    """Wrap ``issue`` so every request misses the in-process caches"""
+    from app import facets, fragments
+    from app.cache import response_cache
+
+    def cold():
+        backend, response_cache.backend = response_cache.backend, None
+        facets.invalidate_cache()
+        fragments._fragments.clear()
+        try:
+            return issue()
+        finally:
+            response_cache.backend = backend
+    return cold
+
+
+def _requests(name, app, model_ids, users, models, rng):
+    """A callable issuing one request of the scenario"""
+    if name.endswith('_cold'):
+        return _uncached(_requests(name[:-len('_cold')], app, model_ids, users, models, rng))
+
+    client = app.test_client()
+    pages = max(1, models // 12)
+
+    if name == 'api_models':
+        return lambda: client.get(f'/api/models?page={rng.randint(1, pages)}&per_page=12')
+    if name == 'browse':
+        return lambda: client.get(f'/browse?page={rng.randint(1, pages)}')
+    if name == 'api_stats':
+        return lambda: client.get('/api/stats')
+    if name == 'api_view':
+        return lambda: client.get(f'/api/view/{rng.choice(model_ids)}')
+    if name == 'api_download':
+        return lambda: client.get(f'/api/download/{rng.choice(model_ids)}')
+    if name == 'api_upload':
+        _login(client, f'bench{rng.randrange(users)}')
+        data = meshes.make('stl', meshes.SIZES['small'], seed=rng.randrange(1000))
+
+        def upload():
+            return client.post('/api/upload', data={
+                'name': 'Benchmark upload',
+                'description': 'Procedural grid',
+                'is_public': 'true',
+                'file': (io.BytesIO(data), 'bench.stl'),
+            }, content_type='multipart/form-data')
+        return upload
+    raise ValueError(f'Unknown scenario: {name}')
+
+
+def run_scenario(issue, iterations, warmup):
+    for _ in range(warmup):
+        issue().close()
+
+    durations = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        request_started = time.perf_counter()
+        response = issue()
+        response.get_data()  # drain streamed bodies
+        durations.append(time.perf_counter() - request_started)
+        if response.status_code >= 400:
+            errors += 1
+        response.close()
+    return summarize(durations, errors, time.perf_counter() - started)
+
+
+def compare(results, baseline, threshold):
+    """Human-readable regressions of ``results`` against ``baseline``"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for key in LATENCY_KEYS:
+            if previous[key] and current[key] > previous[key] * (1 + threshold):
+                regressions.append(f'{name}: {key} {previous[key]} -> {current[key]}')
+        if previous[THROUGHPUT_KEY] and current[THROUGHPUT_KEY] < previous[THROUGHPUT_KEY] * (1 - threshold):
+            regressions.append(f'{name}: {THROUGHPUT_KEY} {previous[THROUGHPUT_KEY]} -> {current[THROUGHPUT_KEY]}')
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mongo-uri', default=os.environ.get('BENCH_MONGODB_URI', DEFAULT_URI))
+    parser.add_argument('--in-process', action='store_true', help='use mongomock instead of a server')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--models', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help='run only these scenarios (repeatable)')
+    parser.add_argument('--response-cache', choices=('memory', 'mongo', 'none'),
+                        help='override RESPONSE_CACHE_BACKEND')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help='exit 1 on a regression')
+    parser.add_argument('--threshold', type=float, default=0.20,
+                        help='allowed relative change before flagging (default 0.20)')
+    parser.add_argument('--output', help='also write the results JSON here')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    app = create_bench_app(args)
+
+    with app.app_context():
+        seed_started = time.perf_counter()
+        model_ids = seed(app, args.users, args.models, rng)
+        print(f'Seeded {args.users} users and {args.models} models in {time.perf_counter() - seed_started:.1f}s')
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        issue = _requests(name, app, model_ids, args.users, args.models, rng)
+        results[name] = run_scenario(issue, args.iterations, args.warmup)
+        row = results[name]
+        print(f"{name:14} {row[THROUGHPUT_KEY]:>9.1f} req/s  p50 {row['p50_ms']:>8.2f} ms  "
+              f"p99 {row['p99_ms']:>8.2f} ms  errors {row['errors']}")
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'mongo': 'in-process' if args.in_process else 'server',
+            'users': args.users,
+            'models': args.models,
+            'iterations': args.iterations,
+            'response_cache': app.config['RESPONSE_CACHE_BACKEND'],
+            'json_backend': app.config['JSON_BACKEND'],
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            sys.exit(f'No baseline at {args.baseline}; run with --save-baseline first')
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != report['config']:
+            print('Warning: baseline was recorded with a different configuration')
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            status = 1
+        else:
+            print(f'No regressions beyond {args.threshold:.0%}')
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Baseline written to {args.baseline}')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
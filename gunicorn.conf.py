@@ -0,0 +1,34 @@
+# Gunicorn configuration for running outside Vercel:
+#   pip install -r requirements-server.txt
+#   gunicorn -c gunicorn.conf.py
+#
+# The app is preloaded in the master process (config, blueprints, compiled
+# templates) and shared copy-on-write; each worker then creates its own Mongo
+# client on first use. MONGO_MAX_POOL_SIZE / MONGO_MIN_POOL_SIZE apply per worker.
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    from app.prefork import post_fork as reset_worker
+    reset_worker(worker.app.wsgi())
+
+
+def worker_exit(server, worker):
+    # Write out buffered download counts before the worker goes away
+    from app.counters import download_counter
+    download_counter.flush()
@@ -0,0 +1,91 @@
+import os
+import sys
+
+import pytest
+from flask import Blueprint, Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app():
+    """A bare Flask app with the settings the unit-tested modules read"""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY='test-secret',
+        API_TOKEN_SECRET=None,
+        API_TOKEN_REVOCATION_TTL=60,
+        SIGNED_URL_SECRET=None,
+        SIGNED_URL_TTL=3600,
+        SIGNED_URL_BUCKET=600,
+        JSON_BACKEND='json',
+    )
+
+    api = Blueprint('api', __name__)
+
+    @api.route('/ping')
+    def ping():
+        return 'pong'
+
+    @api.route('/view/<model_id>')
+    def view_model(model_id):
+        return model_id
+
+    @api.route('/download/<model_id>')
+    def download_model(model_id):
+        return model_id
+
+    app.register_blueprint(api, url_prefix='/api')
+
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def db(app):
+    """An in-memory database as MONGODB_DB (skips without mongomock)"""
+    mongomock = pytest.importorskip('mongomock')
+    database = mongomock.MongoClient()['unit_tests']
+    app.config['MONGODB_DB'] = database
+    return database
+
+
+@pytest.fixture
+def site(monkeypatch):
+    """The full application from ``create_app()`` on an in-memory database"""
+    mongomock = pytest.importorskip('mongomock')
+    import mongomock.gridfs
+    import gridfs
+
+    monkeypatch.setenv('MONGODB_URI', 'mongodb://localhost/site_tests?retryWrites=true')
+    monkeypatch.setenv('LAZY_INIT', 'true')
+    monkeypatch.setenv('DOWNLOAD_FLUSH_PER_REQUEST', 'true')
+    monkeypatch.setenv('LOG_LEVEL', 'WARNING')
+    mongomock.gridfs.enable_gridfs_integration()
+
+    from app import create_app, facets, stats
+    from app.search import search_index
+
+    app = create_app()
+    app.config['TESTING'] = True
+
+    # Hand the lazy connection an in-memory client instead of connecting
+    client = mongomock.MongoClient()
+    database = client['site_tests']
+    connection = app.config['MONGODB_CONNECTION']
+    connection._client, connection._db, connection._fs = client, database, gridfs.GridFS(database)
+
+    facets.invalidate_cache()
+    stats.invalidate_cache()
+    search_index.invalidate()
+    yield app
+    connection.reset()
+
+
+def login(client, username='alice', password='secret'):
+    """Register (if needed) and log in ``username`` through the auth views"""
+    client.post('/auth/register', data={'username': username, 'email': f'{username}@example.com',
+                                        'password': password})
+    client.post('/auth/login', data={'login_field': username, 'password': password})
+    return client
@@ -0,0 +1,32 @@
+import io
+
+import pytest
+
+from tests.conftest import login
+
+
+def _upload(client, name, data=b'solid part\nendsolid part\n', filename='part.stl', is_public=True):
+    response = client.post('/api/upload', data={
+        'name': name, 'is_public': 'true' if is_public else 'false', 'file': (io.BytesIO(data), filename)
+    }, content_type='multipart/form-data')
+    assert response.status_code == 201
+    return response.get_json()['model']['id']
+
+
+@pytest.mark.parametrize('fields', ['name,file_size', ['name', 'file_size']])
+def test_batch_accepts_fields_as_string_or_list(site, fields):
+    client = login(site.test_client())
+    model_id = _upload(client, 'Bracket')
+
+    response = client.post('/api/models/batch', json={'ids': [model_id], 'fields': fields})
+    assert response.status_code == 200
+    assert response.get_json()['results'][0]['model'] == {'id': model_id, 'name': 'Bracket', 'file_size': 25}
+
+
+@pytest.mark.parametrize('fields', [{'name': 1}, ['name', 3], 7])
+def test_batch_rejects_other_fields_values(site, fields):
+    client = login(site.test_client())
+    model_id = _upload(client, 'Bracket')
+
+    response = client.post('/api/models/batch', json={'ids': [model_id], 'fields': fields})
+    assert response.status_code == 400
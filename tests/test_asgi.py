@@ -0,0 +1,38 @@
+import io
+import zipfile
+
+import pytest
+
+pytest.importorskip('motor')
+pytest.importorskip('starlette')
+pytest.importorskip('httpx')
+
+from starlette.testclient import TestClient
+
+from app.asgi import create_asgi_app
+from tests.conftest import login
+
+
+def _upload(client, name, data, filename):
+    response = client.post('/api/upload', data={
+        'name': name, 'is_public': 'true', 'file': (io.BytesIO(data), filename)
+    }, content_type='multipart/form-data')
+    assert response.status_code == 201
+    return response.get_json()['model']['id']
+
+
+def test_bundle_downloads_go_to_the_flask_view(site):
+    owner = login(site.test_client())
+    ids = [_upload(owner, 'Bracket', b'solid bracket\nendsolid bracket\n', 'bracket.stl'),
+           _upload(owner, 'Gear', b'v 0 0 0\n' * 100, 'gear.obj')]
+    client = TestClient(create_asgi_app(site))
+
+    response = client.get('/api/download/bundle', params={'ids': ','.join(ids)})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.read('gear.obj') == b'v 0 0 0\n' * 100
+    assert sorted(archive.namelist()) == ['bracket.stl', 'gear.obj']
+
+    posted = client.post('/api/download/bundle', json={'ids': ids[:1]})
+    assert zipfile.ZipFile(io.BytesIO(posted.content)).namelist() == ['bracket.stl']
@@ -0,0 +1,92 @@
+import pytest
+from flask import jsonify
+
+from app.cache import MemoryBackend, MongoBackend, cached_response, etag_for, response_cache
+
+
+@pytest.fixture
+def cache(app):
+    app.config.update(RESPONSE_CACHE_BACKEND='memory', RESPONSE_CACHE_MAX_ENTRIES=16, RESPONSE_CACHE_TTL=30)
+    response_cache.init_app(app)
+    yield response_cache
+    response_cache.backend = None
+
+
+@pytest.fixture
+def client(app, cache):
+    calls = []
+
+    @app.route('/listing')
+    @cached_response('listing')
+    def listing():
+        calls.append(1)
+        return jsonify({'items': [1, 2, 3]})
+
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+
+def test_miss_sets_etag_and_answers_conditional_requests(client):
+    first = client.get('/listing')
+    assert first.headers['X-Cache'] == 'MISS'
+    etag = first.headers['ETag']
+    assert etag == f'"{etag_for(first.data)}"'
+
+    hit = client.get('/listing')
+    assert hit.headers['X-Cache'] == 'HIT'
+    assert hit.headers['ETag'] == etag
+
+    assert client.get('/listing', headers={'If-None-Match': etag}).status_code == 304
+    assert len(client.calls) == 1
+
+
+def test_miss_with_matching_validator_is_304(client, cache):
+    etag = client.get('/listing').headers['ETag']
+    cache.bump()
+    revalidated = client.get('/listing', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['X-Cache'] == 'MISS'
+    assert len(client.calls) == 2
+
+
+def test_bump_invalidates_entries(cache):
+    value, version = cache.get('key')
+    cache.set('key', 'first', version)
+    assert cache.get('key')[0] == 'first'
+    cache.bump()
+    assert cache.get('key')[0] is None
+
+
+def test_value_computed_before_a_bump_is_not_served_after_it():
+    backend = MemoryBackend()
+    _, version = backend.get('key')
+    backend.bump()
+    backend.set('key', 'stale', 30, version)
+    assert backend.get('key')[0] is None
+
+
+def test_mongo_backend_reads_entry_and_version_in_one_query(app, db, monkeypatch):
+    backend = MongoBackend()
+    _, version = backend.get('key')
+    backend.set('key', {'body': b'x'}, 30, version)
+
+    queries = []
+    real_find = db.response_cache.find
+    monkeypatch.setattr(db.response_cache, 'find', lambda *args, **kwargs: queries.append(args) or real_find(*args, **kwargs))
+    monkeypatch.setattr(db.response_cache, 'find_one', None)
+
+    assert backend.get('key') == ({'body': b'x'}, 0)
+    assert len(queries) == 1
+
+
+def test_mongo_backend_ignores_other_versions_and_expired_entries(app, db):
+    backend = MongoBackend()
+    backend.set('old', 'value', 30, 0)
+    backend.set('expired', 'value', -1, 0)
+    backend.bump()
+
+    assert backend.get('old') == (None, 1)
+    backend.set('old', 'fresh', 30, 1)
+    assert backend.get('old') == ('fresh', 1)
+    assert backend.get('expired') == (None, 1)
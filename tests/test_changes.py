@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import changes
+from app.models import Model3D
+
+
+@pytest.fixture
+def feed(site):
+    site.config['CHANGES_SETTLE_SECONDS'] = 0
+    client = site.test_client()
+
+    def read(since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = client.get('/api/models/changes', query_string=params)
+        assert response.status_code == 200
+        return response.get_json()
+
+    with site.app_context():
+        yield read
+
+
+def _model(name, is_public=True):
+    return Model3D(name=name, file_format='stl', file_size=10, user_id='u1', is_public=is_public).save()
+
+
+def _ops(page):
+    return [(change['op'], change['id']) for change in page['changes']]
+
+
+def test_changes_come_in_sequence_order_with_a_resume_token(feed):
+    first, second, third = _model('First'), _model('Second'), _model('Third')
+
+    page = feed(limit=2)
+    assert _ops(page) == [('upsert', first.id), ('upsert', second.id)]
+    assert [change['seq'] for change in page['changes']] == [first.change_seq, second.change_seq]
+    assert page['next'] == str(second.change_seq)
+    assert page['has_more'] is True
+
+    page = feed(page['next'], limit=2)
+    assert _ops(page) == [('upsert', third.id)]
+    assert page['has_more'] is False
+
+    # Nothing new: the token stays where it was
+    assert feed(page['next']) == {'changes': [], 'next': page['next'], 'has_more': False}
+
+
+def test_an_update_moves_a_model_to_the_end_of_the_feed(feed):
+    first, second = _model('First'), _model('Second')
+    first.name = 'Renamed'
+    first.save()
+
+    page = feed()
+    assert _ops(page) == [('upsert', second.id), ('upsert', first.id)]
+    assert page['changes'][-1]['model']['name'] == 'Renamed'
+
+
+def test_deleting_a_public_model_leaves_a_tombstone(feed):
+    model = _model('Gone')
+    token = feed()['next']
+    model.delete()
+
+    assert _ops(feed(token)) == [('delete', model.id)]
+    assert _ops(feed()) == [('delete', model.id)]
+
+
+def test_private_models_are_never_listed(feed):
+    _model('Hidden', is_public=False).delete()
+    assert feed()['changes'] == []
+
+
+def test_going_private_and_public_again(feed):
+    model = _model('Flip')
+    token = feed()['next']
+
+    model.is_public = False
+    model.save()
+    page = feed(token)
+    assert _ops(page) == [('delete', model.id)]
+
+    model.is_public = True
+    model.save()
+    page = feed(page['next'])
+    assert _ops(page) == [('upsert', model.id)]
+    assert page['changes'][0]['model']['name'] == 'Flip'
+
+
+def test_recent_changes_are_held_back_until_they_settle(feed, site):
+    old, recent = _model('Old'), _model('Recent')
+    site.config['MONGODB_DB'].models.update_one(
+        {'name': 'Old'}, {'$set': {'updated_at': datetime.utcnow() - timedelta(seconds=30)}}
+    )
+    site.config['CHANGES_SETTLE_SECONDS'] = 10
+
+    page = feed()
+    assert _ops(page) == [('upsert', old.id)]
+    # More may follow once the recent write settles
+    assert page['has_more'] is True
+    assert page['next'] == str(old.change_seq)
+
+    site.config['CHANGES_SETTLE_SECONDS'] = 0
+    assert _ops(feed(page['next'])) == [('upsert', recent.id)]
+
+
+def test_invalid_tokens_are_rejected(site):
+    client = site.test_client()
+    assert client.get('/api/models/changes?since=abc').status_code == 400
+    assert client.get('/api/models/changes?since=-1').status_code == 400
+
+
+def test_backfill_stamps_models_without_a_sequence(feed, site):
+    db = site.config['MONGODB_DB']
+    db.models.insert_many([{'name': 'Legacy', 'is_public': True}, {'name': 'Legacy 2', 'is_public': True}])
+
+    assert changes.backfill(batch_size=1) == 2
+    assert [change['model']['name'] for change in feed()['changes']] == ['Legacy', 'Legacy 2']
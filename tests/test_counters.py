@@ -0,0 +1,143 @@
+import pytest
+from bson.objectid import ObjectId
+
+from app import stats
+from app.counters import DownloadCounterBuffer
+
+
+@pytest.fixture
+def buffer(app, db):
+    stats.invalidate_cache()
+    counter = DownloadCounterBuffer()
+    counter.app = app
+    # Flushes are driven by the tests, never by the background thread
+    counter.per_request = True
+    return counter
+
+
+@pytest.fixture
+def owner(db):
+    return str(db.users.insert_one({'username': 'alice', 'stats': {'total_downloads': 0}}).inserted_id)
+
+
+def _model(db, owner_id):
+    return str(db.models.insert_one({'user_id': owner_id, 'download_count': 0}).inserted_id)
+
+
+def _platform_downloads(db):
+    document = db.platform_stats.find_one({'_id': stats.STATS_DOC_ID}) or {}
+    return document.get('total_downloads', 0)
+
+
+def test_flush_applies_all_stages(buffer, db, owner):
+    first, second = _model(db, owner), _model(db, owner)
+    buffer.increment(first, owner_id=owner)
+    buffer.increment(first, owner_id=owner)
+    buffer.increment(second, owner_id=owner)
+
+    assert buffer.flush() == 2
+    assert db.models.find_one({'_id': ObjectId(first)})['download_count'] == 2
+    assert db.models.find_one({'_id': ObjectId(second)})['download_count'] == 1
+    assert db.users.find_one({'_id': ObjectId(owner)})['stats']['total_downloads'] == 3
+    assert _platform_downloads(db) == 3
+    assert buffer.pending(first) == 0
+
+
+def test_deleted_models_are_dropped_everywhere(buffer, db, owner):
+    kept, deleted = _model(db, owner), _model(db, owner)
+    buffer.increment(kept, owner_id=owner)
+    buffer.increment(deleted, amount=5, owner_id=owner)
+    db.models.delete_one({'_id': ObjectId(deleted)})
+
+    assert buffer.flush() == 1
+    assert db.users.find_one({'_id': ObjectId(owner)})['stats']['total_downloads'] == 1
+    assert _platform_downloads(db) == 1
+    assert buffer.pending(deleted) == 0
+    assert buffer.flush() == 0
+
+
+def test_partial_bulk_write_failure_retries_only_failed_models(buffer, db, owner, monkeypatch):
+    from pymongo.errors import BulkWriteError
+
+    good, bad = _model(db, owner), _model(db, owner)
+    buffer.increment(good, owner_id=owner)
+    buffer.increment(bad, amount=2, owner_id=owner)
+
+    real_bulk_write = db.models.bulk_write
+
+    def failing_bulk_write(operations, ordered=True):
+        # Apply every operation except the one for ``bad``, as the server would
+        applied, errors = [], []
+        for index, operation in enumerate(operations):
+            if operation._filter['_id'] == ObjectId(bad):
+                errors.append({'index': index, 'code': 1, 'errmsg': 'simulated'})
+            else:
+                applied.append(operation)
+        real_bulk_write(applied, ordered=ordered)
+        raise BulkWriteError({'writeErrors': errors, 'nModified': len(applied)})
+
+    monkeypatch.setattr(db.models, 'bulk_write', failing_bulk_write)
+    assert buffer.flush() == 1
+    assert buffer.pending(good) == 0
+    assert buffer.pending(bad) == 2
+    assert _platform_downloads(db) == 1
+
+    monkeypatch.setattr(db.models, 'bulk_write', real_bulk_write)
+    assert buffer.flush() == 1
+    assert db.models.find_one({'_id': ObjectId(good)})['download_count'] == 1
+    assert db.models.find_one({'_id': ObjectId(bad)})['download_count'] == 2
+    assert db.users.find_one({'_id': ObjectId(owner)})['stats']['total_downloads'] == 3
+    assert _platform_downloads(db) == 3
+
+
+def test_owner_stage_failure_does_not_reapply_model_increments(buffer, db, owner, monkeypatch):
+    model_id = _model(db, owner)
+    buffer.increment(model_id, amount=3, owner_id=owner)
+
+    real_bulk_write = db.users.bulk_write
+
+    def unavailable(operations, ordered=True):
+        raise RuntimeError('users unavailable')
+
+    monkeypatch.setattr(db.users, 'bulk_write', unavailable)
+    buffer.flush()
+    assert db.models.find_one({'_id': ObjectId(model_id)})['download_count'] == 3
+    assert _platform_downloads(db) == 3
+    assert buffer.pending(model_id) == 0
+
+    monkeypatch.setattr(db.users, 'bulk_write', real_bulk_write)
+    buffer.flush()
+    assert db.models.find_one({'_id': ObjectId(model_id)})['download_count'] == 3
+    assert db.users.find_one({'_id': ObjectId(owner)})['stats']['total_downloads'] == 3
+    assert _platform_downloads(db) == 3
+
+
+def test_platform_stage_failure_is_retried(buffer, db, owner, monkeypatch):
+    model_id = _model(db, owner)
+    buffer.increment(model_id, owner_id=owner)
+
+    monkeypatch.setattr(stats, 'bump', lambda **deltas: False)
+    buffer.flush()
+    assert _platform_downloads(db) == 0
+
+    monkeypatch.undo()
+    buffer.flush()
+    assert db.models.find_one({'_id': ObjectId(model_id)})['download_count'] == 1
+    assert db.users.find_one({'_id': ObjectId(owner)})['stats']['total_downloads'] == 1
+    assert _platform_downloads(db) == 1
+
+
+def test_per_request_flush(app, db, owner):
+    counter = DownloadCounterBuffer()
+    app.config['DOWNLOAD_FLUSH_PER_REQUEST'] = True
+    counter.init_app(app)
+    model_id = _model(db, owner)
+
+    @app.route('/fetch/<model_id>')
+    def fetch(model_id):
+        counter.increment(model_id, owner_id=owner)
+        return ''
+
+    app.test_client().get(f'/fetch/{model_id}')
+    assert counter._thread is None
+    assert db.models.find_one({'_id': ObjectId(model_id)})['download_count'] == 1
@@ -0,0 +1,91 @@
+import io
+import json
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from app import export
+from app.models import Model3D
+
+
+@pytest.fixture
+def store(site):
+    with site.app_context():
+        fs = site.config['GRIDFS']
+
+        def model(filename, data, file_format=None, **fields):
+            file_format = file_format or filename.rsplit('.', 1)[-1]
+            return Model3D(name=filename, file_format=file_format, file_size=len(data), original_filename=filename,
+                           user_id='u1', gridfs_file_id=str(fs.put(data, filename=filename)),
+                           upload_date=datetime(2026, 5, 6, 7, 8, 10), **fields)
+
+        yield model
+
+
+def _archive(models):
+    return zipfile.ZipFile(io.BytesIO(b''.join(export.stream_zip(models))))
+
+
+def test_zip_round_trip_stores_compressed_formats_and_deflates_the_rest(store):
+    mesh = b'v 0 0 0\n' * 5000
+    binary = bytes(range(256)) * 2000  # spans several GridFS chunks
+    archive = _archive([store('mesh.obj', mesh), store('scene.glb', binary), store('rig.fbx', b'Kaydara FBX Binary')])
+
+    assert archive.testzip() is None
+    info = {entry.filename: entry for entry in archive.infolist()}
+    assert info['mesh.obj'].compress_type == zipfile.ZIP_DEFLATED
+    assert info['mesh.obj'].compress_size < len(mesh)
+    assert info['scene.glb'].compress_type == zipfile.ZIP_STORED
+    assert info['rig.fbx'].compress_type == zipfile.ZIP_STORED
+    assert info['mesh.obj'].date_time == (2026, 5, 6, 7, 8, 10)
+    assert archive.read('mesh.obj') == mesh
+    assert archive.read('scene.glb') == binary
+
+
+def test_zip_names_are_deduplicated_and_sanitized(store):
+    archive = _archive([
+        store('part.stl', b'one'),
+        store('part.stl', b'two'),
+        store('part.stl', b'three'),
+        store('../../etc/part', b'four', file_format='stl'),
+    ])
+
+    assert archive.namelist() == ['part.stl', 'part-2.stl', 'part-3.stl', 'etc_part']
+    assert [archive.read(name) for name in archive.namelist()] == [b'one', b'two', b'three', b'four']
+
+
+def test_zip_skips_models_whose_file_is_missing(store):
+    missing = store('gone.stl', b'x')
+    missing.gridfs_file_id = '64b000000000000000000001'
+    no_file = store('none.stl', b'y')
+    no_file.gridfs_file_id = None
+
+    assert _archive([missing, no_file, store('kept.stl', b'z')]).namelist() == ['kept.stl']
+
+
+def test_ndjson_round_trip(site):
+    with site.app_context():
+        owner = site.config['MONGODB_DB'].users.insert_one({'username': 'alice'}).inserted_id
+        documents = [{'_id': f'id{index}', 'name': f'Model {index}', 'user_id': str(owner),
+                      'upload_date': datetime(2026, 1, 1)} for index in range(5)]
+        chunks = list(export.stream_ndjson(documents, ('id', 'name', 'upload_date', 'owner'), batch_size=2))
+
+    # One chunk per batch, one line per document
+    assert len(chunks) == 3
+    lines = b''.join(chunks).decode('utf-8').splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'id': f'id{index}', 'name': f'Model {index}', 'upload_date': '2026-01-01T00:00:00',
+         'owner': {'id': str(owner), 'username': 'alice'}}
+        for index in range(5)
+    ]
+
+
+def test_catalog_export_endpoint_streams_public_models(site):
+    with site.app_context():
+        Model3D(name='Shown', file_format='stl', user_id='u1').save()
+        Model3D(name='Hidden', file_format='stl', user_id='u1', is_public=False).save()
+
+    response = site.test_client().get('/api/models/export.ndjson?fields=name')
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line)['name'] for line in response.data.splitlines()] == ['Shown']
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson.objectid import ObjectId
+
+from app import facets
+
+
+def test_parse_filters_keeps_known_non_empty_keys():
+    args = {'format': ' STL ', 'size': 'small', 'period': '', 'owner': 'abc', 'sort': 'name'}
+    assert facets.parse_filters(args) == {'format': 'stl', 'size': 'small', 'owner': 'abc'}
+
+
+def test_build_match_without_filters():
+    assert facets.build_match({}) == {'is_public': True}
+
+
+def test_build_match_translates_each_filter():
+    match = facets.build_match({'format': 'obj', 'size': 'medium', 'period': 'week', 'owner': 'u1'})
+
+    assert match['is_public'] is True
+    assert match['file_format'] == 'obj'
+    assert match['file_size'] == {'$gte': 100 * 1024, '$lt': 1024 * 1024}
+    assert match['user_id'] == 'u1'
+    cutoff = match['upload_date']['$gte']
+    assert abs((datetime.utcnow() - timedelta(days=7) - cutoff).total_seconds()) < 5
+
+
+def test_build_match_open_ended_size_bucket():
+    assert facets.build_match({'size': 'huge'})['file_size'] == {'$gte': 4 * 1024 * 1024}
+
+
+def test_build_match_ignores_unknown_buckets():
+    assert facets.build_match({'size': 'enormous', 'period': 'decade'}) == {'is_public': True}
+
+
+def test_build_match_restricts_to_ranked_ids():
+    ids = [str(ObjectId()), str(ObjectId())]
+    match = facets.build_match({}, ranked_ids=ids)
+    assert match['_id'] == {'$in': [ObjectId(model_id) for model_id in ids]}
+
+
+@pytest.fixture
+def catalog(db):
+    facets.invalidate_cache()
+    now = datetime.utcnow()
+    ids = []
+    for index in range(30):
+        ids.append(str(db.models.insert_one({
+            'name': f'model {index}',
+            'file_format': 'stl' if index % 3 else 'obj',
+            'file_size': 1000,
+            'user_id': 'owner',
+            'is_public': index != 5,
+            'upload_date': now - timedelta(minutes=index),
+        }).inserted_id))
+    return ids
+
+
+def test_search_pages_follow_ranking_and_filters(catalog):
+    ranked = list(reversed(catalog))
+    documents, total, _, _ = facets.browse({'format': 'stl'}, page=2, per_page=4, ranked_ids=ranked)
+
+    expected = [model_id for index, model_id in reversed(list(enumerate(catalog)))
+                if index % 3 and index != 5]
+    assert total == len(expected)
+    assert [str(document['_id']) for document in documents] == expected[4:8]
+
+
+def test_search_considers_only_the_top_results(catalog, monkeypatch):
+    monkeypatch.setattr(facets, 'MAX_SEARCH_RESULTS', 10)
+    documents, total, facet_counts, _ = facets.browse({}, page=1, per_page=50, ranked_ids=catalog)
+
+    # catalog[5] is private, so 9 of the first 10 ranked ids match
+    assert total == 9
+    assert [str(document['_id']) for document in documents] == catalog[:5] + catalog[6:10]
+    assert sum(entry['count'] for entry in facet_counts['format']) == 9
+
+
+def test_search_past_the_last_page(catalog):
+    documents, total, _, _ = facets.browse({}, page=99, per_page=12, ranked_ids=catalog)
+    assert documents == []
+    assert total == 29
@@ -0,0 +1,68 @@
+import pytest
+
+from app import fragments
+from app.models import Model3D
+from tests.conftest import login
+
+
+@pytest.fixture
+def model(site):
+    with site.app_context():
+        return Model3D(name='Dragon statue', file_format='stl', file_size=10, user_id='u1').save()
+
+
+@pytest.mark.parametrize('path', ['/', '/browse'])
+def test_anonymous_pages_are_cached(site, model, path):
+    client = site.test_client()
+    first = client.get(path)
+    assert first.headers['X-Cache'] == 'MISS'
+    assert b'Dragon statue' in first.data
+
+    second = client.get(path)
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.data == first.data
+    assert 'Cookie' in second.headers['Vary']
+
+
+def test_logged_in_visitors_bypass_the_page_cache(site, model):
+    site.test_client().get('/')
+    client = login(site.test_client())
+
+    response = client.get('/')
+    assert 'X-Cache' not in response.headers
+    assert b'Dragon statue' in response.data
+
+
+def test_saving_a_model_invalidates_cached_pages_and_its_card(site, model):
+    client = site.test_client()
+    client.get('/browse')
+    assert client.get('/browse').headers['X-Cache'] == 'HIT'
+
+    with site.app_context():
+        model.name = 'Wyvern statue'
+        model.save()
+
+    response = client.get('/browse')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert b'Wyvern statue' in response.data
+    assert b'Dragon statue' not in response.data
+
+
+def test_model_cards_are_rendered_once_per_version(site, model, monkeypatch):
+    renders = []
+    real_render = fragments.render_template
+
+    def render_template(*args, **kwargs):
+        renders.append(args[0])
+        return real_render(*args, **kwargs)
+
+    monkeypatch.setattr(fragments, 'render_template', render_template)
+
+    with site.test_request_context('/'):
+        first = fragments.model_card(model)
+        assert fragments.model_card(model) == first
+        assert len(renders) == 1
+
+        model.save()
+        fragments.model_card(model)
+        assert len(renders) == 2
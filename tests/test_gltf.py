@@ -0,0 +1,91 @@
+import base64
+import json
+import struct
+
+import pytest
+
+from app.gltf import CHUNK_BIN, CHUNK_JSON, GLB_MAGIC, GltfPackError, external_uris, pack_glb
+
+
+def _document(**overrides):
+    document = {
+        'asset': {'version': '2.0'},
+        'buffers': [{'uri': 'mesh.bin', 'byteLength': 6}],
+        'bufferViews': [{'buffer': 0, 'byteOffset': 2, 'byteLength': 4}],
+        'images': [{'uri': 'texture.png'}],
+    }
+    document.update(overrides)
+    return json.dumps(document).encode('utf-8')
+
+
+FILES = {'mesh.bin': b'abcdef', 'texture.png': b'\x89PNG-data'}
+
+
+def _unpack(glb):
+    magic, version, total = struct.unpack_from('<4sII', glb)
+    assert (magic, version, total) == (GLB_MAGIC, 2, len(glb))
+    json_length, json_type = struct.unpack_from('<II', glb, 12)
+    assert json_type == CHUNK_JSON
+    gltf = json.loads(glb[20:20 + json_length])
+    binary = b''
+    if len(glb) > 20 + json_length:
+        bin_length, bin_type = struct.unpack_from('<II', glb, 20 + json_length)
+        assert bin_type == CHUNK_BIN
+        binary = glb[28 + json_length:28 + json_length + bin_length]
+    return gltf, binary
+
+
+def test_pack_inlines_buffers_and_images():
+    gltf, binary = _unpack(pack_glb(_document(), FILES.get))
+
+    # The BIN chunk is padded to 4 bytes past the buffer's byteLength
+    assert 0 <= len(binary) - gltf['buffers'][0]['byteLength'] < 4
+    view, image_view = gltf['bufferViews']
+    assert binary[view['byteOffset']:view['byteOffset'] + view['byteLength']] == b'cdef'
+    assert image_view['byteOffset'] % 4 == 0
+    assert binary[image_view['byteOffset']:image_view['byteOffset'] + image_view['byteLength']] == FILES['texture.png']
+    assert gltf['images'] == [{'bufferView': 1, 'mimeType': 'image/png'}]
+    assert len(binary) % 4 == 0
+
+
+def test_pack_decodes_data_uris():
+    uri = 'data:application/octet-stream;base64,' + base64.b64encode(b'abcdef').decode('ascii')
+    gltf, binary = _unpack(pack_glb(_document(buffers=[{'uri': uri, 'byteLength': 6}], images=[]), {}.get))
+    assert binary[2:6] == b'cdef'
+
+
+def test_external_uris():
+    assert external_uris(json.loads(_document())) == ['mesh.bin', 'texture.png']
+
+
+def test_missing_companion_file():
+    with pytest.raises(GltfPackError, match='mesh.bin'):
+        pack_glb(_document(), {'texture.png': b''}.get)
+
+
+def test_truncated_companion_file():
+    with pytest.raises(GltfPackError, match='mesh.bin'):
+        pack_glb(_document(), dict(FILES, **{'mesh.bin': b'abc'}).get)
+
+
+@pytest.mark.parametrize('payload', [
+    b'not json',
+    b'\xff\xfe',
+    b'[1, 2, 3]',
+    _document(buffers={'uri': 'mesh.bin'}),
+    _document(buffers=['mesh.bin']),
+    _document(buffers=[{'uri': 7}]),
+    _document(buffers=[{'byteLength': 6}]),
+    _document(buffers=[{'uri': 'mesh.bin', 'byteLength': 'six'}]),
+    _document(buffers=[{'uri': 'data:;base64,@@not base64@@'}]),
+    _document(bufferViews=[{'byteLength': 4}]),
+    _document(bufferViews=[{'buffer': 3}]),
+    _document(bufferViews=[{'buffer': -1}]),
+    _document(bufferViews=[{'buffer': '0'}]),
+    _document(bufferViews=[{'buffer': 0, 'byteOffset': -4}]),
+    _document(bufferViews=[{'buffer': 0, 'byteOffset': None}]),
+    _document(images=[{'uri': 'texture.png', 'mimeType': 'image/png'}, 'texture.png']),
+])
+def test_malformed_gltf_raises_pack_error(payload):
+    with pytest.raises(GltfPackError):
+        pack_glb(payload, FILES.get)
@@ -0,0 +1,132 @@
+import io
+import json
+import zipfile
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from app import ingest
+
+GLTF = json.dumps({
+    'asset': {'version': '2.0'},
+    'buffers': [{'uri': 'mesh.bin', 'byteLength': 64}],
+    'bufferViews': [{'buffer': 0, 'byteLength': 64}],
+}).encode('utf-8')
+
+
+def _file(filename, data):
+    return FileStorage(io.BytesIO(data), filename=filename)
+
+
+@pytest.fixture
+def ctx(site):
+    with site.test_request_context('/'):
+        yield site
+
+
+def _by_name(results):
+    return {result['filename']: result for result in results}
+
+
+def test_gltf_companions_are_reported_packed_once_the_glb_is_stored(ctx):
+    entries = ingest.collect_entries([_file('scene.gltf', GLTF), _file('mesh.bin', b'x' * 64)])
+    results = _by_name(ingest.ingest(entries, 'u1'))
+
+    assert results['scene.glb']['status'] == 'created'
+    assert results['mesh.bin'] == {'filename': 'mesh.bin', 'source': None, 'into': 'scene.glb', 'status': 'packed'}
+
+
+def test_gltf_companions_of_a_rejected_glb_are_rejected_with_it(ctx):
+    # Both inputs fit, the packed GLB does not
+    ctx.config['BULK_MAX_FILE_SIZE'] = len(GLTF)
+    entries = ingest.collect_entries([_file('scene.gltf', GLTF), _file('mesh.bin', b'x' * 64)])
+    results = _by_name(ingest.ingest(entries, 'u1'))
+
+    assert results['scene.glb']['status'] == 'rejected'
+    assert results['mesh.bin']['status'] == 'rejected'
+    assert 'scene.glb' in results['mesh.bin']['error']
+    assert ctx.config['MONGODB_DB'].models.count_documents({}) == 0
+
+
+def test_gltf_with_a_truncated_companion_is_rejected(ctx):
+    entries = ingest.collect_entries([_file('scene.gltf', GLTF), _file('mesh.bin', b'x' * 10)])
+    results = _by_name(ingest.ingest(entries, 'u1'))
+
+    assert results['scene.gltf']['status'] == 'rejected'
+    assert 'mesh.bin' in results['scene.gltf']['error']
+    # Not consumed, so reported (and refused) as a file of its own
+    assert results['mesh.bin']['error'].startswith('File type not supported')
+
+
+def _zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _stored_files(app):
+    db = app.config['MONGODB_DB']
+    return db.fs.files.count_documents({}), db.fs.chunks.count_documents({})
+
+
+def test_archives_are_expanded_without_hidden_entries(ctx):
+    archive = _zip({
+        'parts/bracket.stl': b'solid bracket\nendsolid bracket\n',
+        'parts/.DS_Store': b'junk',
+        '__MACOSX/parts/._bracket.stl': b'junk',
+        'parts/nested/': b'',
+    })
+    entries = ingest.collect_entries([_file('kit.zip', archive), _file('gear.ply', b'ply\nformat ascii 1.0\n')])
+
+    assert [(entry.filename, entry.source, entry.path) for entry in entries] == [
+        ('bracket.stl', 'kit.zip', 'parts/bracket.stl'),
+        ('gear.ply', None, 'gear.ply'),
+    ]
+    results = ingest.ingest(entries, 'u1')
+    assert [result['status'] for result in results] == ['created', 'created']
+    assert ctx.config['MONGODB_DB'].models.count_documents({'user_id': 'u1'}) == 2
+
+
+def test_files_with_the_wrong_signature_are_rejected(ctx):
+    entries = ingest.collect_entries([_file('fake.glb', b'PK\x03\x04 not a glb'),
+                                      _file('fake.ply', b'solid x')])
+    results = ingest.ingest(entries, 'u1')
+
+    assert [result['error'] for result in results] == ['Not a valid GLB file.', 'Not a valid PLY file.']
+    assert _stored_files(ctx) == (0, 0)
+
+
+class _FailingStream:
+    """Yields a few chunks, then fails like a dropped connection"""
+
+    def __init__(self):
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        if self.reads > 3:
+            raise OSError('connection reset')
+        return b'x' * (size if size > 0 else 64)
+
+
+def test_a_failed_write_removes_the_partial_gridfs_file(ctx):
+    # Large enough that whole chunks were written before the failure
+    entry = ingest.IngestEntry('broken.stl', 2 * ingest.GRIDFS_WRITE_SIZE, _FailingStream)
+    results = ingest.ingest([entry], 'u1')
+
+    assert results[0]['status'] == 'failed'
+    assert _stored_files(ctx) == (0, 0)
+
+
+def test_files_are_removed_when_the_model_documents_cannot_be_written(ctx, monkeypatch):
+    def insert_many(models):
+        raise RuntimeError('write concern timeout')
+
+    monkeypatch.setattr(ingest.Model3D, 'insert_many', staticmethod(insert_many))
+    entries = ingest.collect_entries([_file('a.stl', b'solid a\nendsolid a\n'), _file('b.stl', b'solid b\n')])
+
+    with pytest.raises(RuntimeError):
+        ingest.ingest(entries, 'u1')
+    assert _stored_files(ctx) == (0, 0)
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from bson.objectid import ObjectId
+
+from app import invalidation
+from app.invalidation import InvalidationBus, event_from_change
+
+REPLICA_SET_URI = os.environ.get('TEST_REPLICA_SET_URI')
+
+
+def _change(op, collection='models', document_id=None, updated=None):
+    change = {'operationType': op, 'ns': {'db': 'test', 'coll': collection},
+              'documentKey': {'_id': document_id or ObjectId()}}
+    if updated is not None:
+        change['updateDescription'] = {'updatedFields': updated, 'removedFields': []}
+    return change
+
+
+def test_counter_only_updates_are_ignored():
+    assert event_from_change(_change('update', updated={'download_count': 3, 'change_seq': 9})) is None
+    assert event_from_change(_change('update', 'users', updated={'stats.total_downloads': 1})) is None
+
+
+def test_content_changes_become_events():
+    model_id = ObjectId()
+    assert event_from_change(_change('update', document_id=model_id, updated={'name': 'x'})) == {
+        'collection': 'models', 'op': 'update', 'id': str(model_id)
+    }
+    assert event_from_change(_change('insert', 'other')) is None
+    assert event_from_change(_change('drop'))['op'] == 'reset'
+
+
+@pytest.fixture
+def bus(app):
+    bus = InvalidationBus()
+    bus.app = app
+    bus.source = 'change_stream'
+    bus._mode = 'change_stream'
+    return bus
+
+
+class FakeDatabase:
+    def __init__(self, changes):
+        self.changes = changes
+
+    @contextmanager
+    def watch(self, pipeline):
+        yield iter(self.changes)
+
+
+def test_change_stream_skips_this_process_writes(app, bus):
+    own, foreign = ObjectId(), ObjectId()
+    bus.publish('models', 'update', own)
+    app.config['MONGODB_DB'] = FakeDatabase([
+        _change('update', document_id=own, updated={'name': 'mine'}),
+        _change('update', document_id=own, updated={'name': 'theirs'}),
+        _change('delete', document_id=foreign),
+    ])
+    seen = []
+    bus.register(seen.append)
+    bus._watch()
+
+    # Only the first event for ``own`` is masked; the later one came from elsewhere
+    assert [(event['op'], event['id']) for event in seen] == [('update', str(own)), ('delete', str(foreign))]
+
+
+def test_remembered_local_writes_expire(bus, monkeypatch):
+    monkeypatch.setattr(invalidation, 'LOCAL_WRITE_TTL', 0.0)
+    bus.publish('models', 'update', 'abc')
+    assert not bus.is_local({'collection': 'models', 'op': 'update', 'id': 'abc'})
+
+
+def test_local_writes_are_counted(bus):
+    for _ in range(2):
+        bus.publish('api_tokens', 'update', 'token')
+    event = {'collection': 'api_tokens', 'op': 'update', 'id': 'token'}
+    assert bus.is_local(event)
+    assert bus.is_local(event)
+    assert not bus.is_local(event)
+
+
+@pytest.mark.skipif(not REPLICA_SET_URI, reason='set TEST_REPLICA_SET_URI to a replica set (mongod --replSet rs0)')
+def test_replica_set_change_stream_skips_local_writes(app, bus):
+    from pymongo import MongoClient
+
+    client = MongoClient(REPLICA_SET_URI)
+    db = client['invalidation_bus_test']
+    app.config['MONGODB_DB'] = db
+    seen = []
+    bus.register(seen.append)
+
+    def listen():
+        try:
+            with app.app_context():
+                bus._watch()
+        except Exception:
+            pass  # the client is closed to stop the stream
+
+    threading.Thread(target=listen, daemon=True).start()
+    time.sleep(1)  # let the stream open
+
+    own, foreign = ObjectId(), ObjectId()
+    bus.publish('models', 'insert', own)
+    db.models.insert_one({'_id': own, 'name': 'mine'})
+    db.models.insert_one({'_id': foreign, 'name': 'theirs'})
+
+    deadline = time.monotonic() + 10
+    while not any(event['id'] == str(foreign) for event in seen) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    try:
+        assert [event['id'] for event in seen] == [str(foreign)]
+    finally:
+        client.drop_database(db.name)
+        client.close()
+
+
+@pytest.fixture
+def capped_bus(app, db):
+    bus = InvalidationBus()
+    bus.app = app
+    bus.source = 'capped'
+    bus._mode = 'capped'
+    return bus
+
+
+def test_bulk_changes_are_one_capped_log_event(capped_bus, db):
+    ids = [ObjectId() for _ in range(500)]
+    capped_bus.publish_many('models', 'insert', ids)
+
+    events = list(db[invalidation.EVENTS_COLLECTION].find())
+    assert len(events) == 1
+    assert events[0]['ids'] == [str(model_id) for model_id in ids]
+    assert events[0]['id'] is None
+
+
+def test_bulk_changes_are_remembered_per_document_in_change_stream_mode(bus, db):
+    ids = [ObjectId(), ObjectId()]
+    bus.publish_many('models', 'insert', ids)
+
+    assert db[invalidation.EVENTS_COLLECTION].count_documents({}) == 0
+    assert all(bus.is_local({'collection': 'models', 'op': 'insert', 'id': str(model_id)}) for model_id in ids)
+
+
+def test_a_batch_event_clears_caches_once_and_reloads_each_model(app, monkeypatch):
+    from app import stats
+    from app.search import search_index
+
+    cleared, reloaded = [], []
+    monkeypatch.setattr(stats, 'invalidate_cache', lambda: cleared.append(1))
+    monkeypatch.setattr(search_index, 'reload_model', reloaded.append)
+
+    invalidation._local_caches({'collection': 'models', 'op': 'insert', 'id': None, 'ids': ['a', 'b', 'c']})
+    assert cleared == [1]
+    assert reloaded == ['a', 'b', 'c']
+
+
+def test_bulk_insert_publishes_one_event(site, monkeypatch):
+    from app.invalidation import invalidation_bus
+    from app.models import Model3D
+
+    monkeypatch.setattr(invalidation_bus, 'source', 'capped')
+    monkeypatch.setattr(invalidation_bus, '_mode', 'capped')
+    with site.app_context():
+        Model3D.insert_many([Model3D(name=f'Part {index}', user_id='u1') for index in range(20)])
+        events = list(site.config['MONGODB_DB'][invalidation.EVENTS_COLLECTION].find())
+
+    assert [len(event['ids']) for event in events] == [20]
@@ -0,0 +1,76 @@
+import pytest
+from bson.objectid import ObjectId
+
+from app.models import Model3D, User
+
+
+@pytest.fixture
+def user(site):
+    with site.app_context():
+        user = User(username='alice', email='alice@example.com')
+        user.set_password('secret')
+        yield user.save()
+
+
+def _model(user, size=100, is_public=True, **fields):
+    return Model3D(name='Part', file_format='stl', file_size=size, user_id=user.id, is_public=is_public,
+                   **fields).save()
+
+
+def _stored(site, user):
+    return site.config['MONGODB_DB'].users.find_one({'_id': ObjectId(user.id)}).get('stats')
+
+
+def test_first_read_backfills_from_the_models(site, user):
+    db = site.config['MONGODB_DB']
+    db.models.insert_many([
+        {'user_id': user.id, 'is_public': True, 'download_count': 3, 'file_size': 100},
+        {'user_id': user.id, 'is_public': False, 'download_count': 1, 'file_size': 50},
+    ])
+
+    expected = {'model_count': 2, 'public_count': 1, 'total_downloads': 4, 'bytes_stored': 150}
+    assert User.get_stats(user.id) == expected
+    assert 'reconciled_at' in _stored(site, user)
+
+    # Later reads use the stored counters
+    db.models.delete_many({})
+    assert User.get_stats(user.id) == expected
+
+
+def test_writes_before_the_backfill_are_not_double_counted(site, user):
+    _model(user, size=10)
+    _model(user, size=20, is_public=False)
+    assert _stored(site, user)['model_count'] == 2
+
+    assert User.get_stats(user.id) == {'model_count': 2, 'public_count': 1, 'total_downloads': 0, 'bytes_stored': 30}
+
+
+def test_writes_during_the_backfill_are_kept(site, user, monkeypatch):
+    real_compute = User.compute_stats
+
+    def compute_then_upload(user_id):
+        stats = real_compute(user_id)
+        # An upload that lands between the aggregation and the stored update
+        _model(user, size=40)
+        return stats
+
+    monkeypatch.setattr(User, 'compute_stats', staticmethod(compute_then_upload))
+    assert User.get_stats(user.id)['model_count'] == 1
+    monkeypatch.undo()
+    assert User.get_stats(user.id) == {'model_count': 1, 'public_count': 1, 'total_downloads': 0, 'bytes_stored': 40}
+
+
+def test_counters_follow_visibility_and_deletes(site, user):
+    User.get_stats(user.id)
+    model = _model(user, size=100, download_count=5)
+    other = _model(user, size=30)
+
+    model.is_public = False
+    model.save()
+    assert User.get_stats(user.id) == {'model_count': 2, 'public_count': 1, 'total_downloads': 0, 'bytes_stored': 130}
+
+    # The stored download count comes off the owner's total with the model
+    User.bump_stats(user.id, total_downloads=5)
+    model.delete()
+    other.delete()
+    assert User.get_stats(user.id) == {'model_count': 0, 'public_count': 0, 'total_downloads': 0, 'bytes_stored': 0}
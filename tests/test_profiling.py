@@ -0,0 +1,53 @@
+import pytest
+
+from app import profiling
+from tests.conftest import login
+
+
+@pytest.fixture
+def admin(site):
+    site.config['ADMIN_USERNAMES'] = frozenset({'root'})
+    with site.app_context():
+        # mongomock has no capped collections; an existing one is used as is
+        site.config['MONGODB_DB'].create_collection(profiling.PROFILES_COLLECTION)
+    return login(site.test_client(), 'root')
+
+
+def test_admins_get_a_stored_profile(admin):
+    response = admin.get('/api/models', headers={'X-Profile': '1'})
+    assert response.status_code == 200
+    profile_id = response.headers['X-Profile-Id']
+
+    profile = admin.get(f'/api/admin/profiles/{profile_id}').get_json()
+    assert profile['id'] == profile_id
+    assert profile['path'] == '/api/models'
+    assert profile['user'] == 'root'
+    assert profile['status'] == 200
+    assert profile['functions'] and 'cumulative_ms' in profile['functions'][0]
+    assert 'peak_kb' in profile['memory']
+
+    summaries = admin.get('/api/admin/profiles').get_json()['profiles']
+    assert [summary['id'] for summary in summaries] == [profile_id]
+    assert 'functions' not in summaries[0]
+
+
+def test_query_flag_works_too(admin):
+    assert 'X-Profile-Id' in admin.get('/api/models?_profile=1').headers
+
+
+def test_flag_is_ignored_for_other_users(site, admin):
+    user = login(site.test_client(), 'alice')
+    anonymous = site.test_client()
+
+    for client in (user, anonymous):
+        response = client.get('/api/models', headers={'X-Profile': '1'})
+        assert response.status_code == 200
+        assert 'X-Profile-Id' not in response.headers
+    assert user.get('/api/admin/profiles').status_code == 403
+    assert anonymous.get('/api/admin/profiles').status_code == 401
+    assert admin.get('/api/admin/profiles').get_json()['profiles'] == []
+
+
+def test_unknown_profile(admin):
+    assert admin.get('/api/admin/profiles/nope').status_code == 404
+    assert admin.get('/api/admin/profiles/64b000000000000000000001').status_code == 404
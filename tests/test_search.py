@@ -0,0 +1,131 @@
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.search import SearchIndex, tokenize
+
+
+def _model(model_id, name, description='', file_format='stl', is_public=True, days_old=0):
+    return SimpleNamespace(id=model_id, name=name, description=description, file_format=file_format,
+                           is_public=is_public, upload_date=datetime(2026, 1, 1) - timedelta(days=days_old))
+
+
+@pytest.fixture
+def index(app, db):
+    index = SearchIndex()
+    index.build()
+    for model in (
+        _model('a', 'Dragon statue', 'A detailed dragon for printing'),
+        _model('b', 'Castle tower', 'Medieval tower with a dragon banner', days_old=1),
+        _model('c', 'Drone frame', 'Quadcopter frame', file_format='obj', days_old=2),
+        _model('d', 'Teapot', 'The classic teapot', days_old=3),
+    ):
+        index.add_model(model, owner_username='maker')
+    return index
+
+
+def test_tokenize():
+    assert tokenize('Hello, WORLD-42!') == ['hello', 'world', '42']
+    assert tokenize(None) == []
+
+
+def test_name_matches_outrank_description_matches(index):
+    assert index.search('dragon') == ['a', 'b']
+
+
+def test_rarer_terms_weigh_more(index):
+    # "frame" appears in one model, "dragon" in two
+    assert index.search('dragon frame')[0] == 'c'
+
+
+def test_last_term_matches_as_prefix(index):
+    assert index.search('tea') == ['d']
+    assert set(index.search('dr')) == {'a', 'b', 'c'}
+
+
+def test_misspellings_fall_back_to_near_terms(index):
+    assert index.search('dragun') == ['a', 'b']
+
+
+def test_format_and_owner_are_searchable(index):
+    assert index.search('obj') == ['c']
+    assert len(index.search('maker')) == 4
+
+
+def test_ties_prefer_newer_uploads(index):
+    index.add_model(_model('e', 'Teapot', 'The classic teapot', days_old=0), owner_username='maker')
+    assert index.search('teapot') == ['e', 'd']
+
+
+def test_private_and_removed_models_leave_the_index(index):
+    index.add_model(_model('a', 'Dragon statue', is_public=False))
+    index.remove_model('b')
+    assert index.search('dragon') == []
+
+
+def test_suggest(index):
+    suggestions = index.suggest('castle to')
+    assert suggestions['terms'] == ['castle tower']
+    assert suggestions['models'] == [{'id': 'b', 'name': 'Castle tower'}]
+
+
+def test_build_reads_public_models_and_owners(app, db):
+    owner = db.users.insert_one({'username': 'sculptor'}).inserted_id
+    db.models.insert_many([
+        {'name': 'Bust', 'is_public': True, 'user_id': str(owner), 'upload_date': datetime(2026, 1, 1)},
+        {'name': 'Secret bust', 'is_public': False, 'user_id': str(owner)},
+    ])
+    index = SearchIndex()
+    index.ensure_built()
+
+    assert len(index) == 1
+    assert len(index.search('sculptor')) == 1
+
+
+def test_stale_index_keeps_serving_while_another_thread_rebuilds(index, app, db, monkeypatch):
+    index.invalidate()
+    started, release = threading.Event(), threading.Event()
+    real_build = index._build
+
+    def slow_build():
+        started.set()
+        release.wait(5)
+        real_build()
+
+    monkeypatch.setattr(index, '_build', slow_build)
+
+    def rebuild():
+        with app.app_context():
+            index.ensure_built()
+
+    builder = threading.Thread(target=rebuild)
+    builder.start()
+    assert started.wait(5)
+
+    # Neither blocks on the rebuild in progress
+    index.ensure_built()
+    assert index.search('dragon') == ['a', 'b']
+
+    release.set()
+    builder.join(5)
+    assert not builder.is_alive()
+
+
+def test_changes_during_a_rebuild_are_kept(index, db, monkeypatch):
+    db.models.insert_one({'name': 'Scanned vase', 'is_public': True, 'upload_date': datetime(2026, 1, 1)})
+    real_find = db.models.find
+
+    def find_then_change(*args, **kwargs):
+        rows = real_find(*args, **kwargs)
+        # Saved by this process after the scan read the collection
+        index.add_model(_model('f', 'Glazed vase'))
+        return rows
+
+    monkeypatch.setattr(db.models, 'find', find_then_change)
+    index.build()
+
+    assert len(index.search('vase')) == 2
+    # The fixture's models were never stored, so the rebuilt index drops them
+    assert index.search('dragon') == []
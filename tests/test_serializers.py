@@ -0,0 +1,93 @@
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson.objectid import ObjectId
+
+from app import serializers
+
+BACKENDS = ['json'] + (['orjson'] if serializers.orjson is not None else [])
+
+
+def _document(**overrides):
+    document = {
+        '_id': ObjectId('64b000000000000000000001'),
+        'name': 'Bracket',
+        'description': 'Shelf bracket',
+        'file_format': 'stl',
+        'file_size': 1234,
+        'original_filename': 'bracket.stl',
+        'is_public': True,
+        'upload_date': datetime(2026, 3, 4, 5, 6, 7),
+        'user_id': 'u1',
+    }
+    document.update(overrides)
+    return document
+
+
+def test_parse_fields_defaults_and_always_includes_id():
+    assert serializers.parse_fields(None) == serializers.MODEL_FIELDS
+    assert serializers.parse_fields('name, file_size,bogus') == ('id', 'name', 'file_size')
+    assert serializers.parse_fields('', default=('id', 'name')) == ('id', 'name')
+
+
+def test_parse_fields_keeps_canonical_order():
+    assert serializers.parse_fields('owner,name') == ('id', 'name', 'owner')
+
+
+def test_projection_maps_fields_to_document_keys():
+    assert serializers.projection(('id', 'name', 'owner')) == {'name': 1, 'user_id': 1}
+    assert serializers.projection(('id',)) == {}
+
+
+def test_serialize_model_selects_fields():
+    data = serializers.serialize_model(_document(), ('id', 'name', 'download_count'))
+    assert data == {'id': '64b000000000000000000001', 'name': 'Bracket', 'download_count': 0}
+
+
+def test_serialize_model_resolves_owner():
+    assert serializers.serialize_model(_document(), ('id', 'owner'), {'u1': 'alice'})['owner'] == {
+        'id': 'u1', 'username': 'alice'
+    }
+    assert serializers.serialize_model(_document(), ('id', 'owner'), {})['owner'] == {
+        'id': None, 'username': 'Unknown'
+    }
+
+
+def test_serialize_model_accepts_model_objects():
+    model = SimpleNamespace(id='64b000000000000000000002', to_document=lambda: {'name': 'Gear'})
+    assert serializers.serialize_model(model, ('id', 'name')) == {'id': '64b000000000000000000002', 'name': 'Gear'}
+
+
+def test_pagination():
+    assert serializers.pagination(2, 10, 25) == {
+        'page': 2, 'per_page': 10, 'total': 25, 'pages': 3, 'has_prev': True, 'has_next': True
+    }
+    assert serializers.pagination(1, 10, 0)['pages'] == 0
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_encode_handles_datetimes_and_object_ids(backend):
+    payload = {'id': ObjectId('64b000000000000000000001'), 'at': datetime(2026, 3, 4, 5, 6, 7), 'n': [1, None]}
+    assert json.loads(serializers.encode(payload, backend)) == {
+        'id': '64b000000000000000000001', 'at': '2026-03-04T05:06:07', 'n': [1, None]
+    }
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_encode_rejects_unknown_types(backend):
+    with pytest.raises(TypeError):
+        serializers.encode({'value': object()}, backend)
+
+
+def test_json_response_sets_etag_and_honours_if_none_match(app):
+    with app.test_request_context('/'):
+        response = serializers.json_response({'ok': True})
+        assert response.mimetype == 'application/json'
+        etag, _ = response.get_etag()
+    assert etag
+
+    with app.test_request_context('/', headers={'If-None-Match': f'"{etag}"'}):
+        assert serializers.json_response({'ok': True}).status_code == 304
+        assert serializers.json_response({'error': 'x'}, status=400).status_code == 400
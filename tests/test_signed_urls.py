@@ -0,0 +1,90 @@
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from app import signed_urls
+
+MODEL_ID = '65a000000000000000000001'
+FILE_ID = '65a0000000000000000000ff'
+
+
+def _args(model_id=MODEL_ID, file_id=FILE_ID, expires=None):
+    expires = expires if expires is not None else int(time.time()) + 60
+    return MultiDict({'f': file_id, 'e': str(expires), 's': signature_for(model_id, file_id, expires)})
+
+
+def signature_for(model_id, file_id, expires):
+    return signed_urls.signature(model_id, file_id, expires)
+
+
+def test_valid_signature_verifies(app):
+    file_id, remaining = signed_urls.verify(MODEL_ID, _args())
+    assert file_id == FILE_ID
+    assert 0 < remaining <= 60
+
+
+def test_expired_link_is_rejected(app):
+    assert signed_urls.verify(MODEL_ID, _args(expires=int(time.time()) - 1)) == (None, 0)
+
+
+def test_signature_is_bound_to_model_and_file(app):
+    args = _args()
+    assert signed_urls.verify('65a000000000000000000002', args) == (None, 0)
+    args['f'] = '65a0000000000000000000fe'
+    assert signed_urls.verify(MODEL_ID, args) == (None, 0)
+
+
+def test_extended_expiry_is_rejected(app):
+    args = _args()
+    args['e'] = str(int(args['e']) + 3600)
+    assert signed_urls.verify(MODEL_ID, args) == (None, 0)
+
+
+@pytest.mark.parametrize('signature', ['é', '\xff' * 24, '', 'A' * 24])
+def test_bad_signature_is_rejected(app, signature):
+    args = _args()
+    args['s'] = signature
+    assert signed_urls.verify(MODEL_ID, args) == (None, 0)
+
+
+@pytest.mark.parametrize('expires', ['', 'soon', '1e9', 'é'])
+def test_malformed_expiry_is_rejected(app, expires):
+    args = _args()
+    args['e'] = expires
+    assert signed_urls.verify(MODEL_ID, args) == (None, 0)
+
+
+def test_is_signed_needs_every_parameter():
+    assert signed_urls.is_signed(MultiDict({'f': 'x', 'e': '1', 's': 'y'}))
+    assert not signed_urls.is_signed(MultiDict({'s': 'y'}))
+    assert not signed_urls.is_signed(MultiDict({'s': 'y', 'e': '1'}))
+    assert not signed_urls.is_signed(MultiDict({'f': '', 'e': '1', 's': 'y'}))
+    assert not signed_urls.is_signed(MultiDict())
+
+
+def test_expiry_is_bucketed(app):
+    now = 1_700_000_123
+    expires = signed_urls.expiry(now)
+    assert expires % app.config['SIGNED_URL_BUCKET'] == 0
+    assert now + app.config['SIGNED_URL_TTL'] <= expires < now + app.config['SIGNED_URL_TTL'] + app.config['SIGNED_URL_BUCKET']
+    # Every link issued within one bucket is identical
+    assert signed_urls.expiry(now + 1) == expires
+
+
+def test_file_url_round_trips(app):
+    model = SimpleNamespace(id=MODEL_ID, gridfs_file_id=FILE_ID)
+    with app.test_request_context():
+        url = signed_urls.file_url(model, 'api.download_model')
+    parts = urlsplit(url)
+    assert parts.path == f'/api/download/{MODEL_ID}'
+    args = MultiDict({key: values[0] for key, values in parse_qs(parts.query).items()})
+    assert signed_urls.verify(MODEL_ID, args)[0] == FILE_ID
+
+
+def test_file_url_without_file_is_unsigned(app):
+    model = SimpleNamespace(id=MODEL_ID, gridfs_file_id=None)
+    with app.test_request_context():
+        assert signed_urls.file_url(model) == f'/api/view/{MODEL_ID}'
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import stats
+
+
+@pytest.fixture
+def catalog(app, db):
+    stats.invalidate_cache()
+    app.config['STATS_RECONCILE_INTERVAL'] = 3600
+    db.users.insert_many([{'username': 'alice'}, {'username': 'bob'}])
+    db.models.insert_many([
+        {'is_public': True, 'download_count': 3},
+        {'is_public': False, 'download_count': 4},
+    ])
+    return db
+
+
+def _stored(db):
+    return db.platform_stats.find_one({'_id': stats.STATS_DOC_ID})
+
+
+def test_first_read_reconciles(catalog):
+    assert stats.get_platform_stats() == {
+        'total_models': 2, 'public_models': 1, 'total_users': 2, 'total_downloads': 7
+    }
+    assert _stored(catalog)['reconciled_at'] is not None
+
+
+def test_fresh_document_is_served_without_recounting(catalog):
+    stats.get_platform_stats()
+    catalog.models.insert_one({'is_public': True, 'download_count': 0})
+    stats.invalidate_cache()
+    assert stats.get_platform_stats()['total_models'] == 2
+
+
+def test_only_one_reader_claims_a_due_reconcile(catalog):
+    catalog.platform_stats.insert_one({
+        '_id': stats.STATS_DOC_ID, 'total_models': 9,
+        'reconciled_at': datetime.utcnow() - timedelta(hours=2)
+    })
+    doc = _stored(catalog)
+    assert stats._claim_reconcile(doc) is not None
+    # A second reader that saw the same stale document loses the claim
+    assert stats._claim_reconcile(doc) is None
+
+
+def test_reconcile_keeps_increments_made_during_the_count(catalog):
+    stats.bump(total_downloads=5)
+    baseline = _stored(catalog)
+    # A download lands between reading the baseline and writing the counts
+    stats.bump(total_downloads=1)
+
+    result = stats.reconcile(baseline)
+    assert result['total_downloads'] == 7 + 1
+    assert _stored(catalog)['total_downloads'] == 8
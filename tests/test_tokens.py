@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app import tokens
+
+
+@pytest.fixture(autouse=True)
+def fresh_revocations():
+    tokens.revoked._ids = frozenset()
+    tokens.revoked.invalidate()
+    yield
+    tokens.revoked._ids = frozenset()
+    tokens.revoked.invalidate()
+
+
+def _bearer(app, token):
+    return app.test_request_context('/api/ping', headers={'Authorization': f'Bearer {token}'})
+
+
+def test_valid_token_round_trips(app):
+    token = tokens.encode('abc123', 'user1', 'alice', datetime.utcnow() + timedelta(hours=1))
+    claims = tokens.decode(token)
+    assert claims['token_id'] == 'abc123'
+    assert claims['user_id'] == 'user1'
+    assert claims['username'] == 'alice'
+
+
+def test_username_may_contain_separator(app):
+    claims = tokens.decode(tokens.encode('abc123', 'user1', 'a:b:c'))
+    assert claims['username'] == 'a:b:c'
+    assert claims['expires'] == 0
+
+
+def test_expired_token_is_rejected(app):
+    token = tokens.encode('abc123', 'user1', 'alice', datetime.utcnow() - timedelta(seconds=1))
+    assert tokens.decode(token) is None
+
+
+@pytest.mark.parametrize('mutate', [
+    lambda token: token[:-2] + ('AA' if not token.endswith('AA') else 'BB'),
+    lambda token: token.replace('amt_', 'amt_x', 1),
+    lambda token: token.split('.')[0],
+    lambda token: 'amt_.' + token.split('.')[1],
+    lambda token: token.replace('amt_', 'xyz_', 1),
+])
+def test_tampered_token_is_rejected(app, mutate):
+    token = tokens.encode('abc123', 'user1', 'alice')
+    assert tokens.decode(mutate(token)) is None
+
+
+def test_token_signed_with_another_key_is_rejected(app):
+    token = tokens.encode('abc123', 'user1', 'alice')
+    app.config['API_TOKEN_SECRET'] = 'rotated'
+    assert tokens.decode(token) is None
+
+
+@pytest.mark.parametrize('token', ['amt_payload.é', 'amt_é.signature', 'amt_é', 'amt_\x00.\xff'])
+def test_non_ascii_token_is_rejected(app, token):
+    assert tokens.decode(token) is None
+
+
+def test_non_ascii_bearer_header_does_not_authenticate(app):
+    with _bearer(app, 'amt_abc.é'):
+        assert tokens.user_from_request() is None
+
+
+def test_bearer_header_builds_user_without_lookup(app, db):
+    token = tokens.encode('abc123', 'user1', 'alice')
+    with _bearer(app, token):
+        user = tokens.user_from_request()
+    assert user.id == 'user1'
+    assert user.username == 'alice'
+    assert user.api_token_id == 'abc123'
+
+
+def test_revoked_token_is_rejected(app, db):
+    owner = SimpleNamespace(id='user1', username='alice')
+    token, record = tokens.create(owner, 'ci')
+    with _bearer(app, token):
+        assert tokens.user_from_request() is not None
+
+    assert tokens.revoke('user1', record['_id'])
+    with _bearer(app, token):
+        assert tokens.user_from_request() is None
+
+    # Another process learns about it from the collection
+    tokens.revoked._ids = frozenset()
+    tokens.revoked.invalidate()
+    assert record['_id'] in tokens.revoked
+
+
+def test_revoke_only_affects_own_active_tokens(app, db):
+    owner = SimpleNamespace(id='user1', username='alice')
+    _, record = tokens.create(owner, 'ci')
+    assert not tokens.revoke('user2', record['_id'])
+    assert tokens.revoke('user1', record['_id'])
+    assert not tokens.revoke('user1', record['_id'])
+
+
+def test_stored_record_holds_only_a_hash(app, db):
+    owner = SimpleNamespace(id='user1', username='alice')
+    token, record = tokens.create(owner, 'ci')
+    stored = db.api_tokens.find_one({'_id': record['_id']})
+    assert token not in stored.values()
+    assert stored['token_hash'] == tokens.hash_token(token)
+
+
+def test_tokens_only_apply_to_api_routes(app):
+    token = tokens.encode('abc123', 'user1', 'alice')
+    with app.test_request_context('/elsewhere', headers={'Authorization': f'Bearer {token}'}):
+        assert tokens.user_from_request() is None
@@ -0,0 +1,11 @@
+# Production WSGI entry point for preforking servers (gunicorn -c gunicorn.conf.py)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.prefork import preload
+
+# Created once in the master process and shared with workers after fork
+app = preload(create_app())